@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+自适应轮询调度器
+按标签组统计变化率，有变化时加快扫描，空闲时逐步退避
+"""
+
+import time
+from collections import deque
+
+
+class TagGroupState:
+    """单个标签组的轮询状态"""
+
+    def __init__(self, name, tags, min_interval, window):
+        self.name = name
+        self.tags = list(tags)
+        self.interval = min_interval
+        self.next_due = 0.0
+        self.idle_scans = 0
+        self.history = deque(maxlen=window)  # 最近若干次扫描是否有变化
+        self.scale = 1.0                     # 过载降载时的周期放大倍数
+        self.suspended = False               # 过载降载时停止扫描
+
+    @property
+    def change_rate(self):
+        """最近窗口内的变化率（0-1）"""
+        if not self.history:
+            return 0.0
+        return sum(self.history) / len(self.history)
+
+
+class AdaptivePoller:
+    """自适应轮询调度器"""
+
+    def __init__(self, groups, min_interval=0.5, max_interval=10.0,
+                 backoff_factor=1.5, idle_scans=3, window=20):
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError(f"无效的轮询周期范围: {min_interval} - {max_interval}")
+
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff_factor = max(backoff_factor, 1.0)
+        self.idle_scans = idle_scans
+        self.groups = {
+            name: TagGroupState(name, tags, min_interval, window)
+            for name, tags in groups.items()
+        }
+
+    @classmethod
+    def from_config(cls, config):
+        """根据 ADAPTIVE_POLL_CONFIG 创建调度器"""
+        return cls(
+            config['groups'],
+            min_interval=config.get('min_interval', 0.5),
+            max_interval=config.get('max_interval', 10.0),
+            backoff_factor=config.get('backoff_factor', 1.5),
+            idle_scans=config.get('idle_scans', 3),
+            window=config.get('window', 20),
+        )
+
+    def due_groups(self, now=None):
+        """返回当前到期需要扫描的标签组"""
+        if now is None:
+            now = time.monotonic()
+        return [group for group in self.groups.values()
+                if not group.suspended and group.next_due <= now]
+
+    def record_scan(self, name, changed, now=None):
+        """记录一次扫描结果并计算该组的下一次扫描时间"""
+        if now is None:
+            now = time.monotonic()
+        group = self.groups[name]
+        group.history.append(1 if changed else 0)
+
+        if changed:
+            # 有变化：立即切换到最快周期，保证产线启动时的响应速度
+            group.idle_scans = 0
+            group.interval = self.min_interval
+        else:
+            group.idle_scans += 1
+            if group.idle_scans >= self.idle_scans:
+                group.interval = min(group.interval * self.backoff_factor, self.max_interval)
+
+        group.next_due = now + group.interval * group.scale
+        return group.interval
+
+    def set_load_shedding(self, name, scale=1.0, suspended=False):
+        """设置标签组的降载状态（周期放大倍数、是否停止扫描）"""
+        group = self.groups[name]
+        if group.suspended and not suspended:
+            # 恢复扫描时立即读取一次
+            group.next_due = 0.0
+        group.scale = scale
+        group.suspended = suspended
+
+    def time_until_next(self, now=None):
+        """距离最近一个标签组到期的等待时间（秒）"""
+        if now is None:
+            now = time.monotonic()
+        active = [group.next_due for group in self.groups.values() if not group.suspended]
+        if not active:
+            return self.max_interval
+        next_due = min(active)
+        return max(0.0, next_due - now)
+
+    def get_status(self):
+        """返回各标签组当前周期和变化率"""
+        status = {}
+        for name, group in self.groups.items():
+            status[name] = {
+                'interval': round(group.interval, 3),
+                'change_rate': round(group.change_rate, 3),
+            }
+            if group.scale != 1.0:
+                status[name]['scale'] = group.scale
+            if group.suspended:
+                status[name]['suspended'] = True
+        return status
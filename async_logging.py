@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+非阻塞日志
+采集线程只把日志记录放入队列，格式化和文件/控制台写入由后台 QueueListener 线程完成；
+每次扫描的明细日志通过限速采样通道输出
+"""
+
+import time
+import queue
+import atexit
+import logging
+import logging.handlers
+
+from config import SCAN_DETAIL_LOG_CONFIG
+
+DEFAULT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """队列满时丢弃日志而不阻塞调用线程"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # 不在采集线程中格式化消息，留给监听线程处理
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(log_file, level=logging.INFO, fmt=DEFAULT_FORMAT, queue_size=None):
+    """配置基于队列的根日志（与 logging.basicConfig 一样，已配置时不重复配置）
+
+    返回后台监听器，程序退出时自动停止并刷新剩余日志
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return None
+
+    if queue_size is None:
+        queue_size = SCAN_DETAIL_LOG_CONFIG.get('queue_size', 10000)
+
+    formatter = logging.Formatter(fmt)
+    file_handler = logging.FileHandler(log_file, encoding='utf-8')
+    file_handler.setFormatter(formatter)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    listener = logging.handlers.QueueListener(
+        log_queue, file_handler, stream_handler, respect_handler_level=True
+    )
+    root.addHandler(DroppingQueueHandler(log_queue))
+    root.setLevel(level)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def get_dropped_count():
+    """返回因队列满被丢弃的日志条数"""
+    return sum(
+        handler.dropped for handler in logging.getLogger().handlers
+        if isinstance(handler, DroppingQueueHandler)
+    )
+
+
+class SampledLogger:
+    """限速采样的扫描明细日志通道
+
+    每次扫描开始时调用 begin_scan() 决定本次扫描是否输出明细，
+    同一次扫描的明细要么全部输出、要么全部跳过；跳过时不产生任何格式化开销
+    """
+
+    def __init__(self, logger, min_interval=None, sample_every=None):
+        if min_interval is None:
+            min_interval = SCAN_DETAIL_LOG_CONFIG.get('min_interval', 10.0)
+        if sample_every is None:
+            sample_every = SCAN_DETAIL_LOG_CONFIG.get('sample_every', 0)
+        self.logger = logger
+        self.min_interval = min_interval
+        self.sample_every = sample_every
+        self.enabled = True
+        self.scan_count = 0
+        self.last_output = None
+        self.suppressed_scans = 0
+
+    def begin_scan(self):
+        """开始新一次扫描，返回本次扫描是否输出明细"""
+        self.scan_count += 1
+        now = time.monotonic()
+        self.enabled = (
+            self.last_output is None
+            or now - self.last_output >= self.min_interval
+            or (self.sample_every > 0 and self.scan_count % self.sample_every == 0)
+        )
+        if self.enabled:
+            self.last_output = now
+            if self.suppressed_scans:
+                self.logger.info("（已省略 %d 次扫描的明细日志）", self.suppressed_scans)
+                self.suppressed_scans = 0
+        else:
+            self.suppressed_scans += 1
+        return self.enabled
+
+    def info(self, msg, *args):
+        if self.enabled:
+            self.logger.info(msg, *args)
+
+    def debug(self, msg, *args):
+        if self.enabled:
+            self.logger.debug(msg, *args)
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+大数据块并行读取
+配方、趋势等数十KB的数据块需要很多个PDU报文，单个连接只能逐个报文串行读取。
+本模块将读取区域按协商的PDU大小切分，由到同一CPU的多个连接并行读取，
+直接写入同一块预分配的缓冲区；读取前后比较版本字（头部计数器等），
+不一致时说明读取期间数据被改写，整块重新读取
+"""
+
+import os
+import sys
+import time
+import ctypes
+import logging
+import argparse
+import threading
+
+import snap7
+
+from read_plan import db_read_into
+
+logger = logging.getLogger(__name__)
+
+# S7 读取响应中除数据以外的开销（报文头 12 + 参数 2 + 数据项头 4 字节）
+PDU_OVERHEAD = 18
+
+# 未能获取协商PDU大小时使用的最小PDU
+DEFAULT_PDU = 240
+
+
+def split_chunks(start, size, chunk_size):
+    """将 [start, start + size) 切分为 [(地址, 长度)]，每块不超过 chunk_size"""
+    return [(address, min(chunk_size, start + size - address))
+            for address in range(start, start + size, chunk_size)]
+
+
+class LargeBlockReader:
+    """到同一CPU的多个连接并行读取大数据块"""
+
+    def __init__(self, ip, rack=0, slot=1, connections=3, max_retries=3, client_factory=None):
+        self.ip = ip
+        self.rack = rack
+        self.slot = slot
+        # 并行连接数需在CPU的连接资源以内（预留编程器、HMI和采集连接）
+        self.connections = max(1, int(connections))
+        self.max_retries = max_retries
+        self.client_factory = client_factory or snap7.client.Client
+        self.clients = []
+        self.chunk_size = DEFAULT_PDU - PDU_OVERHEAD
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, ip, config, rack=0, slot=1):
+        """根据 LARGE_BLOCK_CONFIG 创建"""
+        return cls(ip, rack, slot, connections=config.get('connections', 3),
+                   max_retries=config.get('max_retries', 3))
+
+    def _connect_one(self, results, index):
+        client = self.client_factory()
+        try:
+            client.connect(self.ip, self.rack, self.slot)
+            if client.get_connected():
+                results[index] = client
+        except Exception as e:
+            logger.warning(f"大数据块读取连接 {index + 1} 失败: {e}")
+
+    def connect(self):
+        """并行建立连接（补足断开的连接），返回可用连接数"""
+        missing = self.connections - len(self.clients)
+        if missing > 0:
+            results = [None] * missing
+            threads = [threading.Thread(target=self._connect_one, args=(results, index), daemon=True)
+                       for index in range(missing)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.clients.extend(client for client in results if client is not None)
+
+        if self.clients:
+            # 按各连接协商的最小PDU切分，每块正好一个报文
+            pdu = min(self._pdu_length(client) for client in self.clients)
+            self.chunk_size = pdu - PDU_OVERHEAD
+        return len(self.clients)
+
+    @staticmethod
+    def _pdu_length(client):
+        try:
+            return int(client.get_pdu_length()) or DEFAULT_PDU
+        except Exception:
+            return DEFAULT_PDU
+
+    def disconnect(self):
+        for client in self.clients:
+            try:
+                client.disconnect()
+            except Exception:
+                pass
+        self.clients = []
+
+    def read(self, db_number, start, size, version_offset=None, version_size=2):
+        """读取 [start, start + size)，返回 (数据, 读取信息)
+
+        指定 version_offset 时读取前后各读一次版本字，版本字变化（或块内的版本字与前后不一致）
+        时整块重新读取，最多 max_retries 次；仍不一致时返回最后一次的数据，信息中 consistent 为 False
+        """
+        with self.lock:
+            if self.connect() == 0:
+                raise ConnectionError(f"无法连接到PLC: {self.ip}")
+
+            buf = bytearray(size)
+            started = time.monotonic()
+            chunks = split_chunks(start, size, self.chunk_size)
+            consistent = True
+            version = None
+            attempts = 0
+            while attempts <= self.max_retries:
+                attempts += 1
+                before = self._read_version(db_number, version_offset, version_size)
+                self._read_chunks(db_number, start, chunks, buf)
+                if version_offset is None:
+                    break
+                after = self._read_version(db_number, version_offset, version_size)
+                consistent = before == after
+                if consistent and start <= version_offset and version_offset + version_size <= start + size:
+                    inner = version_offset - start
+                    consistent = buf[inner:inner + version_size] == after
+                version = after.hex()
+                if consistent:
+                    break
+                logger.info(f"DB{db_number} 读取期间版本字变化，重新读取（第 {attempts} 次）")
+
+            info = {
+                'db_number': db_number,
+                'start': start,
+                'size': size,
+                'chunks': len(chunks),
+                'chunk_size': self.chunk_size,
+                'connections': len(self.clients),
+                'attempts': attempts,
+                'consistent': consistent,
+                'version': version,
+                'elapsed_ms': round((time.monotonic() - started) * 1000, 1),
+            }
+            if not consistent:
+                logger.warning(f"DB{db_number} 多次读取版本字仍不一致，数据可能不完整")
+            return buf, info
+
+    def _read_version(self, db_number, offset, size):
+        if offset is None:
+            return None
+        return bytes(self.clients[0].db_read(db_number, offset, size))
+
+    def _read_chunks(self, db_number, start, chunks, buf):
+        """各连接从共享的块列表中依次取块读取，写入 buf 的对应位置"""
+        pending = list(reversed(chunks))
+        pending_lock = threading.Lock()
+        failed = []
+
+        def worker(client):
+            while True:
+                with pending_lock:
+                    if not pending or client in failed:
+                        return
+                    address, length = pending.pop()
+                offset = address - start
+                try:
+                    native = (ctypes.c_ubyte * length).from_buffer(buf, offset)
+                    db_read_into(client, db_number, address, native, memoryview(buf)[offset:offset + length])
+                except Exception as e:
+                    logger.warning(f"DB{db_number} 地址 {address} 读取失败，连接停用: {e}")
+                    with pending_lock:
+                        pending.append((address, length))
+                        failed.append(client)
+                    return
+
+        while True:
+            # 某个连接失败时退回的块可能在其他连接已退出后才放回，需要再分配一轮
+            live = [client for client in self.clients if client not in failed]
+            if not pending or not live:
+                break
+            if len(live) == 1:
+                worker(live[0])
+                continue
+            threads = [threading.Thread(target=worker, args=(client,), daemon=True) for client in live]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        for client in failed:
+            self.clients.remove(client)
+            try:
+                client.disconnect()
+            except Exception:
+                pass
+        if pending:
+            raise IOError(f"DB{db_number} 读取失败，剩余 {len(pending)} 块未读取")
+
+
+def save_snapshot(output_dir, name, data):
+    """保存数据块快照为二进制文件，返回文件路径"""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"{name}_{time.strftime('%Y%m%d_%H%M%S')}.bin")
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def main(argv=None):
+    """命令行：读取一个数据块并保存，可与单连接串行读取对比耗时"""
+    parser = argparse.ArgumentParser(description="大数据块并行读取")
+    parser.add_argument('--ip', required=True, help="PLC的IP地址")
+    parser.add_argument('--rack', type=int, default=0, help="机架号")
+    parser.add_argument('--slot', type=int, default=1, help="插槽号")
+    parser.add_argument('--db', type=int, required=True, help="DB块号")
+    parser.add_argument('--start', type=int, default=0, help="起始地址")
+    parser.add_argument('--size', type=int, required=True, help="读取字节数")
+    parser.add_argument('--connections', type=int, default=3, help="并行连接数")
+    parser.add_argument('--version-offset', type=int, help="版本字地址（用于一致性检查）")
+    parser.add_argument('--version-size', type=int, default=2, help="版本字字节数")
+    parser.add_argument('--output', help="保存到文件")
+    parser.add_argument('--compare', action='store_true', help="同时用单连接串行读取并对比耗时")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    reader = LargeBlockReader(args.ip, args.rack, args.slot, connections=args.connections)
+    try:
+        data, info = reader.read(args.db, args.start, args.size, args.version_offset, args.version_size)
+        print(f"并行读取: {info['size']} 字节，{info['chunks']} 块 x {info['chunk_size']} 字节，"
+              f"{info['connections']} 个连接，耗时 {info['elapsed_ms']} ms")
+        if args.output:
+            with open(args.output, 'wb') as f:
+                f.write(data)
+            print(f"已保存: {args.output}")
+    finally:
+        reader.disconnect()
+
+    if args.compare:
+        serial = LargeBlockReader(args.ip, args.rack, args.slot, connections=1)
+        try:
+            serial_data, serial_info = serial.read(args.db, args.start, args.size)
+            print(f"串行读取: 耗时 {serial_info['elapsed_ms']} ms，"
+                  f"数据{'一致' if serial_data == data else '不一致（读取期间数据变化）'}")
+        finally:
+            serial.disconnect()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
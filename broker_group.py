@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多MQTT服务器分发
+同一份采集数据发送到多个MQTT服务器（如厂商平台和本地服务器），每个服务器使用独立的
+客户端、主题映射、编码方式、QoS 和有界发送队列；发送在各自的线程中进行，
+慢速或不可用的服务器只会积压并丢弃自己的队列，不影响其他服务器和采集线程
+"""
+
+import gzip
+import json
+import time
+import logging
+import threading
+from collections import deque
+
+import paho.mqtt.client as mqtt
+
+logger = logging.getLogger(__name__)
+
+
+def _as_data(data, text):
+    return data if data is not None else json.loads(text)
+
+
+def _as_bytes(text):
+    return text if isinstance(text, bytes) else text.encode('utf-8')
+
+
+# 编码方式: 函数(数据字典, 已序列化的JSON文本或字节) -> 消息内容
+CODECS = {
+    'json': lambda data, text: text,
+    'json_compact': lambda data, text: json.dumps(_as_data(data, text), ensure_ascii=False, separators=(',', ':')),
+    'gzip_json': lambda data, text: gzip.compress(_as_bytes(text)),
+}
+
+
+class BrokerTarget:
+    """一个目标MQTT服务器：独立客户端、发送线程和有界队列"""
+
+    def __init__(self, name, host, port=1883, qos=1, retain=False, codec='json', topic_map=None,
+                 topic_prefix='', queue_size=1000, max_inflight=20, username=None, password=None,
+                 keepalive=60):
+        if codec not in CODECS:
+            raise ValueError(f"MQTT服务器 {name} 的编码方式不支持: {codec}")
+        self.name = name
+        self.host = host
+        self.port = port
+        self.qos = qos
+        self.retain = retain
+        self.codec = codec
+        self.encode = CODECS[codec]
+        # 主题映射: 本地主题 -> 目标主题，映射为 None 表示不向该服务器发送此主题；
+        # 快照以外的消息（报警、按标签发布、会话消息等）只发送映射中列出的主题
+        self.topic_map = dict(topic_map or {})
+        self.topic_prefix = topic_prefix
+        self.keepalive = keepalive
+
+        self.queue = deque(maxlen=queue_size)
+        self.condition = threading.Condition()
+        self.connected = False
+        self.running = False
+        self.thread = None
+
+        self.client = mqtt.Client()
+        if username and password:
+            self.client.username_pw_set(username, password)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_publish = self._on_publish
+        # 限制 paho 内部的在途和排队消息数量，积压只留在本地有界队列中（丢弃最旧的）
+        self.client.max_inflight_messages_set(max_inflight)
+        self.client.max_queued_messages_set(max_inflight)
+
+        self.stats = {
+            'enqueued': 0,    # 进入发送队列
+            'published': 0,   # 已交给客户端发送
+            'acked': 0,       # 已确认（QoS 0 在写入网络后即计入），在途窗口随之释放
+            'dropped': 0,     # 队列已满丢弃的最旧消息
+            'errors': 0,      # 发布失败
+            'skipped': 0,     # 主题映射为 None 或未映射的非快照消息，未发送
+            'throttled': 0,   # 客户端在途窗口已满，等待确认后重发
+            'max_queue': 0,   # 队列最大积压
+        }
+        self.latencies = deque(maxlen=1000)   # 入队 -> 发出 的耗时（秒）
+        self.last_error = None
+
+    @classmethod
+    def from_config(cls, config):
+        """根据 BROKER_GROUP_CONFIG['brokers'] 中的一项创建目标服务器"""
+        options = dict(config)
+        name = options.pop('name', None) or f"{options.get('host')}:{options.get('port', 1883)}"
+        options.pop('enabled', None)
+        return cls(name, **options)
+
+    def map_topic(self, topic, mapped_only=False):
+        if topic in self.topic_map:
+            return self.topic_map[topic]
+        if mapped_only:
+            return None
+        return self.topic_prefix + topic
+
+    def start(self):
+        """异步连接并启动发送线程（服务器不可用时不阻塞）"""
+        self.running = True
+        try:
+            self.client.connect_async(self.host, self.port, self.keepalive)
+            self.client.loop_start()
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"[{self.name}] 启动MQTT连接时发生错误: {e}")
+        self.thread = threading.Thread(target=self._run, name=f'broker-{self.name}', daemon=True)
+        self.thread.start()
+        logger.info(f"[{self.name}] 已启动，服务器: {self.host}:{self.port}，编码: {self.codec}，QoS: {self.qos}")
+
+    def stop(self, timeout=2.0):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join(timeout)
+            self.thread = None
+        try:
+            self.client.loop_stop()
+            self.client.disconnect()
+        except Exception:
+            pass
+
+    def enqueue(self, topic, data, text, qos=None, retain=None, mapped_only=False):
+        """放入发送队列（不阻塞），队列已满时丢弃最旧的消息
+
+        qos/retain 为 None 时使用该服务器的配置；mapped_only 为 True 时只发送主题映射中列出的主题
+        """
+        target_topic = self.map_topic(topic, mapped_only)
+        if target_topic is None:
+            self.stats['skipped'] += 1
+            return False
+        with self.condition:
+            if len(self.queue) == self.queue.maxlen:
+                self.stats['dropped'] += 1
+            self.queue.append((target_topic, data, text, qos, retain, time.monotonic()))
+            self.stats['enqueued'] += 1
+            if len(self.queue) > self.stats['max_queue']:
+                self.stats['max_queue'] = len(self.queue)
+            self.condition.notify()
+        return True
+
+    def _run(self):
+        while True:
+            with self.condition:
+                # 未连接时消息留在队列中（超过上限时丢弃最旧的）
+                self.condition.wait_for(lambda: not self.running or (self.connected and self.queue), 1.0)
+                if not self.running:
+                    return
+                if not self.connected or not self.queue:
+                    continue
+                item = self.queue.popleft()
+            if not self._send(item):
+                with self.condition:
+                    # 在途窗口已满：放回队首，等待确认后再发送（队列已满时丢弃这条最旧的消息）
+                    if len(self.queue) == self.queue.maxlen:
+                        self.stats['dropped'] += 1
+                    else:
+                        self.queue.appendleft(item)
+                    self.condition.wait(1.0)
+
+    def _send(self, item):
+        """发送一条消息，在途窗口已满时返回 False，其余情况返回 True"""
+        topic, data, text, qos, retain, enqueued_at = item
+        qos = self.qos if qos is None else qos
+        retain = self.retain if retain is None else retain
+        try:
+            # 空消息用于清除保留消息，不经过编码
+            payload = self.encode(data, text) if text else text
+            result = self.client.publish(topic, payload, qos=qos, retain=retain)
+        except Exception as e:
+            self.stats['errors'] += 1
+            self.last_error = str(e)
+            logger.error(f"[{self.name}] 发布MQTT数据时发生错误 ({topic}): {e}")
+            return True
+        if result.rc == mqtt.MQTT_ERR_QUEUE_SIZE:
+            self.stats['throttled'] += 1
+            return False
+        if result.rc != mqtt.MQTT_ERR_SUCCESS:
+            self.stats['errors'] += 1
+            self.last_error = f"错误码 {result.rc}"
+            logger.error(f"[{self.name}] MQTT发布失败 ({topic})，错误码: {result.rc}")
+            return True
+        self.stats['published'] += 1
+        self.latencies.append(time.monotonic() - enqueued_at)
+        return True
+
+    def _on_connect(self, client, userdata, flags, rc):
+        with self.condition:
+            self.connected = rc == 0
+            self.condition.notify_all()
+        if rc == 0:
+            logger.info(f"[{self.name}] ✓ MQTT连接成功")
+        else:
+            self.last_error = f"连接失败，返回码 {rc}"
+            logger.error(f"[{self.name}] ✗ MQTT连接失败，返回码: {rc}")
+
+    def _on_disconnect(self, client, userdata, rc):
+        with self.condition:
+            self.connected = False
+        logger.warning(f"[{self.name}] MQTT连接断开")
+
+    def _on_publish(self, client, userdata, mid):
+        # QoS 0 消息写入网络后即回调，QoS 1/2 消息在收到确认后回调
+        with self.condition:
+            self.stats['acked'] += 1
+            self.condition.notify_all()
+
+    def get_stats(self):
+        with self.condition:
+            stats = dict(self.stats)
+            stats['queue'] = len(self.queue)
+            latencies = sorted(self.latencies)
+        stats['connected'] = self.connected
+        if latencies:
+            stats['queue_latency_ms'] = {
+                'p50': round(latencies[len(latencies) // 2] * 1000, 2),
+                'max': round(latencies[-1] * 1000, 2),
+            }
+        if self.last_error:
+            stats['last_error'] = self.last_error
+        return stats
+
+
+class BrokerGroup:
+    """多MQTT服务器分发组"""
+
+    def __init__(self, targets):
+        self.targets = list(targets)
+
+    @classmethod
+    def from_config(cls, config):
+        """根据 BROKER_GROUP_CONFIG 创建分发组（跳过 enabled 为 False 的服务器）"""
+        return cls(BrokerTarget.from_config(item) for item in config.get('brokers', [])
+                   if item.get('enabled', True))
+
+    def start(self):
+        for target in self.targets:
+            target.start()
+
+    def stop(self):
+        for target in self.targets:
+            target.stop()
+
+    def publish(self, topic, data, text, qos=None, retain=None, mapped_only=False):
+        """分发一条消息：data 为数据字典（可为 None），text 为已序列化的JSON文本（字符串或字节）
+
+        qos/retain 为 None 时使用各服务器的配置；mapped_only 为 True 时只分发到在主题映射中列出该主题的服务器
+        """
+        delivered = 0
+        for target in self.targets:
+            if target.enqueue(topic, data, text, qos, retain, mapped_only):
+                delivered += 1
+        return delivered
+
+    def get_stats(self):
+        return {target.name: target.get_stats() for target in self.targets}
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+高速触发录波
+使用独立的PLC连接高速扫描原始数据帧并保存在环形缓冲区中，
+触发位出现上升沿时录制触发后数据，并将触发前后的数据帧写入压缩文件
+"""
+
+import snap7
+import time
+import json
+import gzip
+import os
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+
+from config import BOOL_DATA_CONFIG, PLC_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class BurstCapture:
+    """高速触发录波器"""
+
+    def __init__(self, plc_ip, rack=0, slot=1, db_number=9000, start_address=0, read_size=38,
+                 fast_interval=0.05, pre_trigger_seconds=5, post_trigger_seconds=5,
+                 triggers=('B1',), output_dir='captures', on_capture=None,
+                 reconnect_min=1.0, reconnect_max=30.0):
+        self.plc_ip = plc_ip
+        self.rack = rack
+        self.slot = slot
+        self.db_number = db_number
+        self.start_address = start_address
+        self.read_size = read_size
+        self.fast_interval = fast_interval
+        self.pre_trigger_seconds = pre_trigger_seconds
+        self.post_trigger_seconds = post_trigger_seconds
+        self.output_dir = output_dir
+        self.on_capture = on_capture
+        # 连接断开后按指数退避重连（reconnect_min 到 reconnect_max 秒）
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = max(reconnect_min, reconnect_max)
+
+        # 触发位: 名称 -> (帧内字节偏移, 位)
+        self.triggers = {}
+        for name in triggers:
+            byte_addr, bit_pos = BOOL_DATA_CONFIG['mapping'][name]
+            offset = byte_addr - start_address
+            if not 0 <= offset < read_size:
+                raise ValueError(f"触发位 {name} 不在录波帧范围内")
+            self.triggers[name] = (offset, bit_pos)
+
+        # 环形缓冲区只保留触发前窗口，内存占用有上限
+        ring_size = max(1, int(pre_trigger_seconds / fast_interval))
+        self.ring = deque(maxlen=ring_size)
+
+        # 录波使用独立连接，不占用正常扫描的连接
+        self.client = snap7.client.Client()
+        self.running = False
+        self.thread = None
+        self.capture_count = 0
+        self.last_trigger_state = {}
+
+        self._burst_frames = None
+        self._burst_end = 0.0
+        self._burst_meta = None
+
+    @classmethod
+    def from_config(cls, plc_ip, config, on_capture=None):
+        """根据 BURST_CAPTURE_CONFIG 创建录波器"""
+        return cls(
+            plc_ip,
+            rack=config.get('rack', PLC_CONFIG.get('rack', 0)),
+            slot=config.get('slot', PLC_CONFIG.get('slot', 1)),
+            db_number=config.get('db_number', 9000),
+            start_address=config.get('start_address', 0),
+            read_size=config.get('read_size', 38),
+            fast_interval=config.get('fast_interval', 0.05),
+            pre_trigger_seconds=config.get('pre_trigger_seconds', 5),
+            post_trigger_seconds=config.get('post_trigger_seconds', 5),
+            triggers=config.get('triggers', ['B1']),
+            output_dir=config.get('output_dir', 'captures'),
+            on_capture=on_capture,
+            reconnect_min=config.get('reconnect_min', 1.0),
+            reconnect_max=config.get('reconnect_max', 30.0),
+        )
+
+    def start(self):
+        """连接PLC并启动高速扫描线程"""
+        try:
+            self.client.connect(self.plc_ip, self.rack, self.slot)
+            if not self.client.get_connected():
+                logger.error("录波连接PLC失败")
+                return False
+        except Exception as e:
+            logger.error(f"录波连接PLC错误: {e}")
+            return False
+
+        self.running = True
+        self.thread = threading.Thread(target=self._scan_loop, name='burst-capture', daemon=True)
+        self.thread.start()
+        logger.info(f"触发录波已启动，扫描周期: {self.fast_interval}秒，触发位: {', '.join(self.triggers)}")
+        return True
+
+    def stop(self):
+        """停止高速扫描并断开连接"""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=2)
+            self.thread = None
+        if self.client.get_connected():
+            self.client.disconnect()
+        logger.info("触发录波已停止")
+
+    def _scan_loop(self):
+        """高速扫描循环"""
+        next_scan = time.monotonic()
+        connected = True
+        backoff = self.reconnect_min
+        next_attempt = 0.0
+        while self.running:
+            if not connected:
+                # 断线期间按退避间隔重连，每次尝试最多记录一条日志
+                now = time.monotonic()
+                if now >= next_attempt:
+                    connected = self._reconnect()
+                    if connected:
+                        backoff = self.reconnect_min
+                        next_scan = time.monotonic()
+                    else:
+                        logger.warning(f"录波重连PLC失败，{backoff:.0f} 秒后重试")
+                        next_attempt = now + backoff
+                        backoff = min(backoff * 2, self.reconnect_max)
+                if not connected:
+                    time.sleep(min(self.fast_interval * 10, max(0.0, next_attempt - time.monotonic())))
+                    continue
+
+            try:
+                frame = bytes(self.client.db_read(self.db_number, self.start_address, self.read_size))
+                self.process_frame(time.time(), frame)
+            except Exception as e:
+                logger.error(f"录波读取错误: {e}，断开连接后重连")
+                connected = False
+                next_attempt = time.monotonic() + backoff
+                self._close_client()
+                continue
+
+            # 按固定节拍扫描，落后时不追赶
+            next_scan += self.fast_interval
+            delay = next_scan - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_scan = time.monotonic()
+
+    def _close_client(self):
+        try:
+            self.client.disconnect()
+        except Exception:
+            pass
+
+    def _reconnect(self):
+        try:
+            self.client.connect(self.plc_ip, self.rack, self.slot)
+            if self.client.get_connected():
+                logger.info("录波已重新连接PLC")
+                return True
+        except Exception as e:
+            logger.debug(f"录波重连PLC错误: {e}")
+        return False
+
+    def process_frame(self, timestamp, frame):
+        """处理一帧原始数据：缓存、检测触发、录制触发后数据"""
+        if self._burst_frames is not None:
+            self._burst_frames.append((timestamp, frame))
+            if timestamp >= self._burst_end:
+                self._finish_burst()
+            return
+
+        fired = self._check_triggers(frame)
+        self.ring.append((timestamp, frame))
+        if fired:
+            logger.warning(f"录波触发: {', '.join(fired)}")
+            self._burst_meta = {
+                'trigger': fired,
+                'trigger_time': timestamp,
+                'pre_frames': len(self.ring),
+            }
+            self._burst_frames = list(self.ring)
+            self._burst_end = timestamp + self.post_trigger_seconds
+            self.ring.clear()
+
+    def _check_triggers(self, frame):
+        """检测触发位上升沿，返回本帧触发的位名称"""
+        fired = []
+        for name, (offset, bit_pos) in self.triggers.items():
+            state = bool(frame[offset] & (1 << bit_pos))
+            if state and not self.last_trigger_state.get(name, False):
+                fired.append(name)
+            self.last_trigger_state[name] = state
+        return fired
+
+    def _finish_burst(self):
+        """结束录制，在后台线程写文件，避免影响高速扫描"""
+        frames, meta = self._burst_frames, self._burst_meta
+        self._burst_frames = None
+        self._burst_meta = None
+        # 触发后的帧继续更新触发状态，避免同一次故障重复触发
+        self._check_triggers(frames[-1][1])
+        threading.Thread(target=self._write_capture, args=(frames, meta), daemon=True).start()
+
+    def _write_capture(self, frames, meta):
+        """将一次录波写入 gzip 压缩的 JSON 文件并通知"""
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            trigger_time = datetime.fromtimestamp(meta['trigger_time'])
+            filename = os.path.join(
+                self.output_dir,
+                f"capture_{trigger_time.strftime('%Y%m%d_%H%M%S_%f')}.json.gz"
+            )
+            capture = {
+                'device_id': f'PLC_DB{self.db_number}',
+                'db_number': self.db_number,
+                'start_address': self.start_address,
+                'read_size': self.read_size,
+                'fast_interval': self.fast_interval,
+                'trigger': meta['trigger'],
+                'trigger_time': trigger_time.strftime('%Y-%m-%d %H:%M:%S.%f'),
+                'pre_frames': meta['pre_frames'],
+                'post_frames': len(frames) - meta['pre_frames'],
+                'frames': [[round(ts, 6), frame.hex()] for ts, frame in frames],
+            }
+            with gzip.open(filename, 'wt', encoding='utf-8') as f:
+                json.dump(capture, f, ensure_ascii=False)
+
+            self.capture_count += 1
+            logger.info(f"录波文件已保存: {filename} (帧数: {len(frames)})")
+
+            if self.on_capture:
+                summary = {key: value for key, value in capture.items() if key != 'frames'}
+                summary['file'] = filename
+                self.on_capture(summary)
+        except Exception as e:
+            logger.error(f"保存录波文件时发生错误: {e}")
@@ -12,17 +12,16 @@ from datetime import datetime
 import logging
 import csv
 import json
+from async_logging import setup_logging, SampledLogger
+from console_input import prompt_int, prompt_float, prompt_text
+from sqlite_sink import SQLiteSink
+from config import SQLITE_SINK_CONFIG
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('complete_data_reader.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+# 配置日志（经队列由后台线程写入文件和控制台，不阻塞读取线程）
+setup_logging('complete_data_reader.log')
 logger = logging.getLogger(__name__)
+# 每次读取的逐项明细日志限速采样输出
+scan_logger = SampledLogger(logging.getLogger(__name__ + '.scan'))
 
 class CompleteDataReader:
     """完整数据读取器"""
@@ -33,6 +32,10 @@ class CompleteDataReader:
         self.slot = slot
         self.client = snap7.client.Client()
         self.connected = False
+        # 启用 SQLite 存储时每次读取结果写入数据库，可按标签和时间范围直接查询
+        self.sqlite_sink = SQLiteSink.from_config(SQLITE_SINK_CONFIG) if SQLITE_SINK_CONFIG.get('enabled') else None
+        if self.sqlite_sink:
+            self.sqlite_sink.start()
         
     def connect(self):
         """连接到PLC"""
@@ -58,6 +61,10 @@ class CompleteDataReader:
             self.client.disconnect()
             self.connected = False
             logger.info("已断开PLC连接")
+        if self.sqlite_sink:
+            self.sqlite_sink.stop()
+            logger.info(f"SQLite 存储统计: {self.sqlite_sink.get_stats()}")
+            self.sqlite_sink = None
     
     def read_bool_at_address(self, db_number=9000, byte_address=0, bit_position=0):
         """读取指定地址的布尔值"""
@@ -146,11 +153,12 @@ class CompleteDataReader:
             'data': {}
         }
         
-        logger.info(f"开始读取所有数据 - {timestamp.strftime('%Y-%m-%d %H:%M:%S')}")
-        logger.info("=" * 80)
+        scan_logger.begin_scan()
+        scan_logger.info("开始读取所有数据 - %s", results['timestamp'])
+        scan_logger.info("=" * 80)
         
         # 1. 读取32个布尔值
-        logger.info("1. 读取32个布尔值 (地址 0.0 - 3.7):")
+        scan_logger.info("1. 读取32个布尔值 (地址 0.0 - 3.7):")
         bool_values = {}
         for byte_addr in range(4):  # 0, 1, 2, 3
             for bit_pos in range(8):  # 0-7
@@ -160,67 +168,65 @@ class CompleteDataReader:
                 bool_values[bool_name] = bool_value
                 
                 if bool_value is not None:
-                    status = "✓" if bool_value else "✗"
-                    logger.info(f"  {status} {bool_name:>4}: DB{db_number}.DBX{byte_addr}.{bit_pos} = {bool_value}")
+                    scan_logger.info("  %s %4s: DB%d.DBX%d.%d = %s", "✓" if bool_value else "✗",
+                                     bool_name, db_number, byte_addr, bit_pos, bool_value)
                 else:
-                    logger.warning(f"  ✗ {bool_name:>4}: DB{db_number}.DBX{byte_addr}.{bit_pos} = ERROR")
+                    logger.warning("  ✗ %4s: DB%d.DBX%d.%d = ERROR", bool_name, db_number, byte_addr, bit_pos)
         
         results['data']['booleans'] = bool_values
         
         # 2. 读取字符串
-        logger.info("\n2. 读取字符串 (地址 4.0):")
+        scan_logger.info("\n2. 读取字符串 (地址 4.0):")
         string_value = self.read_string(db_number, 4, 20)
         if string_value is not None:
-            logger.info(f"  ✓ String: DB{db_number}.DBString4 = '{string_value}'")
+            scan_logger.info("  ✓ String: DB%d.DBString4 = '%s'", db_number, string_value)
             results['data']['string'] = string_value
         else:
-            logger.warning(f"  ✗ String: DB{db_number}.DBString4 = ERROR")
+            logger.warning("  ✗ String: DB%d.DBString4 = ERROR", db_number)
             results['data']['string'] = None
         
         # 3. 读取32位整数1 (地址 26.0)
-        logger.info("\n3. 读取32位整数1 (地址 26.0):")
+        scan_logger.info("\n3. 读取32位整数1 (地址 26.0):")
         dint1_value = self.read_dint(db_number, 26)
         if dint1_value is not None:
-            logger.info(f"  ✓ DInt1: DB{db_number}.DBD26 = {dint1_value}")
+            scan_logger.info("  ✓ DInt1: DB%d.DBD26 = %d", db_number, dint1_value)
             results['data']['dint1'] = dint1_value
         else:
-            logger.warning(f"  ✗ DInt1: DB{db_number}.DBD26 = ERROR")
+            logger.warning("  ✗ DInt1: DB%d.DBD26 = ERROR", db_number)
             results['data']['dint1'] = None
         
         # 4. 读取32位整数2 (地址 30.0)
-        logger.info("\n4. 读取32位整数2 (地址 30.0):")
+        scan_logger.info("\n4. 读取32位整数2 (地址 30.0):")
         dint2_value = self.read_dint(db_number, 30)
         if dint2_value is not None:
-            logger.info(f"  ✓ DInt2: DB{db_number}.DBD30 = {dint2_value}")
+            scan_logger.info("  ✓ DInt2: DB%d.DBD30 = %d", db_number, dint2_value)
             results['data']['dint2'] = dint2_value
         else:
-            logger.warning(f"  ✗ DInt2: DB{db_number}.DBD30 = ERROR")
+            logger.warning("  ✗ DInt2: DB%d.DBD30 = ERROR", db_number)
             results['data']['dint2'] = None
         
-
-        
         # 5. 读取16位整数1 (地址 34.0)
-        logger.info("\n5. 读取16位整数1 (地址 34.0):")
+        scan_logger.info("\n5. 读取16位整数1 (地址 34.0):")
         int1_value = self.read_int(db_number, 34)
         if int1_value is not None:
-            logger.info(f"  ✓ Int1: DB{db_number}.DBW34 = {int1_value}")
+            scan_logger.info("  ✓ Int1: DB%d.DBW34 = %d", db_number, int1_value)
             results['data']['int1'] = int1_value
         else:
-            logger.warning(f"  ✗ Int1: DB{db_number}.DBW34 = ERROR")
+            logger.warning("  ✗ Int1: DB%d.DBW34 = ERROR", db_number)
             results['data']['int1'] = None
         
         # 6. 读取16位整数2 (地址 36.0)
-        logger.info("\n6. 读取16位整数2 (地址 36.0):")
+        scan_logger.info("\n6. 读取16位整数2 (地址 36.0):")
         int2_value = self.read_int(db_number, 36)
         if int2_value is not None:
-            logger.info(f"  ✓ Int2: DB{db_number}.DBW36 = {int2_value}")
+            scan_logger.info("  ✓ Int2: DB%d.DBW36 = %d", db_number, int2_value)
             results['data']['int2'] = int2_value
         else:
-            logger.warning(f"  ✗ Int2: DB{db_number}.DBW36 = ERROR")
+            logger.warning("  ✗ Int2: DB%d.DBW36 = ERROR", db_number)
             results['data']['int2'] = None
         
-        logger.info("=" * 80)
-        logger.info("数据读取完成")
+        scan_logger.info("=" * 80)
+        scan_logger.info("数据读取完成")
         
         return results
     
@@ -242,6 +248,8 @@ class CompleteDataReader:
                 if results:
                     all_results.append(results)
                     read_count += 1
+                    if self.sqlite_sink:
+                        self.sqlite_sink.record(results)
                 
                 time.sleep(interval_seconds)
                 
@@ -319,6 +327,8 @@ def main():
         
         # 保存结果
         if results:
+            if reader.sqlite_sink:
+                reader.sqlite_sink.record(results)
             reader.save_results_to_file(results)
         
         # 询问是否进行连续读取
@@ -327,11 +337,11 @@ def main():
         print("输入 'y' 开始连续读取，其他键退出: ", end="")
         
         try:
-            user_input = input().strip().lower()
+            user_input = prompt_text("", 'n', 'PLC_CONTINUOUS_READ').lower()
             if user_input == 'y':
                 print("请输入连续读取参数:")
-                interval = int(input("读取间隔（秒，默认2）: ") or "2")
-                max_reads = int(input("最大读取次数（0表示无限，默认10）: ") or "10")
+                interval = prompt_float("读取间隔（秒，默认2）: ", 2, 'PLC_SCAN_INTERVAL')
+                max_reads = prompt_int("最大读取次数（0表示无限，默认10）: ", 10, 'PLC_MAX_READS')
                 
                 all_results = reader.continuous_read(interval, max_reads)
                 
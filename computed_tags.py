@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+计算标签
+在配置中以表达式声明派生标签（如 dint1 - dint2、变化速率、状态字），
+启动时编译一次，之后只在输入标签变化时重新计算，结果随原始标签一起发布
+"""
+
+import re
+import time
+import logging
+
+from tag_expression import compile_expression
+
+logger = logging.getLogger(__name__)
+
+RATE_PATTERN = re.compile(r'\brate\s*\(')
+
+_MISSING = object()
+
+
+def pack_word(*bits):
+    """将若干布尔值按顺序组合为状态字，第一个参数为最低位"""
+    word = 0
+    for index, bit in enumerate(bits):
+        if bit:
+            word |= 1 << index
+    return word
+
+
+class RateFunction:
+    """每分钟变化速率，表达式中每个 rate(...) 调用持有独立的状态"""
+
+    def __init__(self):
+        self.last_value = None
+        self.last_time = None
+        self.rate = 0.0
+
+    def __call__(self, value):
+        now = time.monotonic()
+        if self.last_value is not None and now > self.last_time:
+            self.rate = (value - self.last_value) * 60.0 / (now - self.last_time)
+        self.last_value = value
+        self.last_time = now
+        return self.rate
+
+
+class ComputedTag:
+    """单个计算标签"""
+
+    __slots__ = ('name', 'expression', 'evaluate', 'dependencies', 'volatile', 'precision')
+
+    def __init__(self, name, expression, precision=None):
+        self.name = name
+        self.expression = expression
+        self.evaluate, self.dependencies = compile_expression(
+            expression, {'word': pack_word}, factories={'rate': RateFunction}
+        )
+        # 含速率函数的标签与时间相关，输入不变时速率也需要归零，因此每次扫描都计算
+        self.volatile = bool(RATE_PATTERN.search(expression))
+        self.precision = precision
+        if name in self.dependencies:
+            raise ValueError(f"计算标签不能引用自身: {name}")
+
+
+class ComputedTagEngine:
+    """计算标签引擎"""
+
+    def __init__(self, tags=()):
+        self.tags = self._sort_tags(list(tags))
+        self.values = {}
+        self.index = {}
+        for tag in self.tags:
+            for dependency in tag.dependencies:
+                self.index.setdefault(dependency, []).append(tag)
+        self.volatile = [tag for tag in self.tags if tag.volatile]
+
+    @classmethod
+    def from_config(cls, config):
+        """根据 COMPUTED_TAGS_CONFIG 创建计算标签引擎"""
+        return cls(
+            ComputedTag(item['name'], item['expression'], item.get('precision'))
+            for item in config.get('tags', [])
+        )
+
+    @staticmethod
+    def _sort_tags(tags):
+        """按依赖关系排序，使被引用的计算标签先计算"""
+        by_name = {tag.name: tag for tag in tags}
+        if len(by_name) != len(tags):
+            raise ValueError("计算标签名称重复")
+
+        ordered, visiting, done = [], set(), set()
+
+        def visit(tag):
+            if tag.name in done:
+                return
+            if tag.name in visiting:
+                raise ValueError(f"计算标签存在循环引用: {tag.name}")
+            visiting.add(tag.name)
+            for dependency in tag.dependencies:
+                if dependency in by_name:
+                    visit(by_name[dependency])
+            visiting.discard(tag.name)
+            done.add(tag.name)
+            ordered.append(tag)
+
+        for tag in tags:
+            visit(tag)
+        return ordered
+
+    def update(self, values, changed_tags=None):
+        """根据变化集合重新计算受影响的计算标签
+
+        计算结果写回 values（供报警规则引用），返回发生变化的计算标签名集合；
+        changed_tags 为 None 时计算全部标签
+        """
+        if changed_tags is None:
+            dirty = set(self.tags)
+        else:
+            dirty = set(self.volatile)
+            for tag_name in changed_tags:
+                dirty.update(self.index.get(tag_name, ()))
+
+        changed = set()
+        if dirty:
+            for tag in self.tags:
+                if tag not in dirty:
+                    continue
+                try:
+                    value = tag.evaluate(values)
+                    if tag.precision is not None and isinstance(value, float):
+                        value = round(value, tag.precision)
+                except (KeyError, TypeError, ValueError, ZeroDivisionError) as e:
+                    logger.debug(f"计算标签 {tag.name} 计算失败: {e}")
+                    value = None
+
+                values[tag.name] = value
+                if self.values.get(tag.name, _MISSING) != value:
+                    self.values[tag.name] = value
+                    changed.add(tag.name)
+                    # 级联更新引用了该计算标签的其他计算标签
+                    dirty.update(self.index.get(tag.name, ()))
+
+        # 未重新计算的标签沿用上次结果
+        for name, value in self.values.items():
+            values.setdefault(name, value)
+        return changed
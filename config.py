@@ -65,4 +65,281 @@ READ_INTERVAL = {
     'enabled': False,              # 是否启用连续读取
     'interval_seconds': 5,         # 读取间隔（秒）
     'max_reads': 100,              # 最大读取次数（0表示无限）
-} 
\ No newline at end of file
+} 
+# 自适应轮询配置（按标签组的变化率在最小/最大周期之间调整扫描周期）
+ADAPTIVE_POLL_CONFIG = {
+    'enabled': False,              # 是否启用自适应轮询
+    'min_interval': 0.5,           # 最小扫描周期（秒），检测到变化后立即切换到该周期
+    'max_interval': 10.0,          # 最大扫描周期（秒），长时间空闲时退避到该周期
+    'backoff_factor': 1.5,         # 空闲时每次退避的周期倍数
+    'idle_scans': 3,               # 连续无变化多少次后开始退避
+    'window': 20,                  # 变化率统计窗口（扫描次数）
+    'groups': {
+        # 组名: 组内标签（与发布数据 data 下的键一致）
+        'booleans': ['booleans'],
+        'string': ['string'],
+        'dints': ['dint1', 'dint2'],
+        'ints': ['int1', 'int2'],
+    },
+}
+
+# 高速触发录波配置（独立连接高速扫描，触发后保存触发前后的原始数据帧）
+BURST_CAPTURE_CONFIG = {
+    'enabled': False,              # 是否启用触发录波
+    'db_number': 9000,             # DB块号
+    'start_address': 0,            # 原始帧起始地址
+    'read_size': 38,               # 原始帧字节数（覆盖全部标签）
+    'fast_interval': 0.05,         # 高速扫描周期（秒）
+    'pre_trigger_seconds': 5,      # 触发前保留时长（秒）
+    'post_trigger_seconds': 5,     # 触发后录制时长（秒）
+    'triggers': ['B1'],            # 触发位（上升沿触发），名称见 BOOL_DATA_CONFIG['mapping']
+    'output_dir': 'captures',      # 录波文件目录
+    'topic_suffix': '/capture',    # 录波通知主题后缀（追加到发布主题后）
+    'reconnect_min': 1.0,          # 录波连接断开后首次重连等待（秒），之后每次加倍
+    'reconnect_max': 30.0,         # 重连等待上限（秒）
+    # 'rack': 0, 'slot': 1,        # 未指定时使用 PLC_CONFIG 中的机架号和插槽号
+}
+
+# 报警规则配置（表达式支持 AND/OR/NOT、比较和四则运算，标签名如 B7、int1、dint1）
+ALARM_RULES_CONFIG = {
+    'enabled': False,              # 是否启用报警规则引擎
+    'topic_suffix': '/alarm',      # 报警事件主题后缀（追加到发布主题后）
+    'rules': [
+        # name: 规则名, expression: 条件表达式, delay: 条件持续秒数, severity: 级别
+        {'name': 'int1_high', 'expression': 'int1 > 900', 'delay': 5,
+         'severity': 'warning', 'message': 'Int1 超过 900 持续 5 秒'},
+        {'name': 'b7_without_b8', 'expression': 'B7 AND NOT B8',
+         'severity': 'alarm', 'message': 'B7 动作但 B8 未反馈'},
+    ],
+}
+
+# 计算标签配置（以原始标签为输入的表达式，结果随原始数据一起发布在 data.computed 下）
+# 额外函数: rate(标签) 每分钟变化速率, word(B1, B2, ...) 组合状态字（第一个参数为最低位）
+COMPUTED_TAGS_CONFIG = {
+    'enabled': False,              # 是否启用计算标签
+    'tags': [
+        {'name': 'dint_diff', 'expression': 'dint1 - dint2'},
+        {'name': 'dint1_rate', 'expression': 'rate(dint1)', 'precision': 2},
+        {'name': 'status_word', 'expression': 'word(B1, B2, B3, B4, B5, B6, B7, B8, '
+                                              'B9, B10, B11, B12, B13, B14, B15, B16)'},
+    ],
+}
+
+# 扫描明细日志配置（日志经队列由后台线程写入，每次扫描的明细日志限速采样输出）
+SCAN_DETAIL_LOG_CONFIG = {
+    'min_interval': 10.0,          # 两次明细输出之间的最小间隔（秒）
+    'sample_every': 0,             # 每N次扫描必输出一次明细（0表示不按次数采样）
+    'queue_size': 10000,           # 日志队列长度，队列满时丢弃新日志并计数
+}
+
+# 标签读取配置（读取计划），默认与 DB9000 的数据布局一致
+# BOOL 指定 count 时按 name 作为前缀展开为 name1..nameN，从 address.0 开始连续排列
+TAG_CONFIG = {
+    'db_number': 9000,
+    'tags': [
+        {'name': 'B', 'type': 'BOOL', 'address': 0, 'count': 32, 'group': 'booleans'},
+        {'name': 'string', 'type': 'STRING', 'address': 4, 'length': 20},
+        {'name': 'dint1', 'type': 'DINT', 'address': 26},
+        {'name': 'dint2', 'type': 'DINT', 'address': 30},
+        {'name': 'int1', 'type': 'INT', 'address': 34},
+        {'name': 'int2', 'type': 'INT', 'address': 36},
+    ],
+    # UDT 结构定义（可选）: {UDT名: [成员]}，成员用相对UDT起始地址的 offset 代替 address，
+    # 其余字段与标签相同。UDT类型的标签展开为 "实例.成员"，数组为 "实例[i].成员"，例如:
+    # 'udts': {'Motor': [
+    #     {'name': 'running', 'type': 'BOOL', 'offset': 0, 'bit': 0},
+    #     {'name': 'speed', 'type': 'REAL', 'offset': 2, 'deadband': 0.5},
+    #     {'name': 'started', 'type': 'DTL', 'offset': 6},
+    #     {'name': 'currents', 'type': 'INT', 'offset': 18, 'array': 3},
+    # ]},
+    # 标签: {'name': 'motors', 'type': 'Motor', 'address': 100, 'array': 4, 'group': 'motors'}
+}
+
+# 运行时配置热加载（监视JSON配置文件，变更后在扫描间隙原子切换读取计划）
+RUNTIME_CONFIG = {
+    'enabled': False,              # 是否启用配置热加载
+    'file': 'plc_runtime.json',    # 运行时配置文件，格式见 plc_runtime.example.json
+    'watch_interval': 2.0,         # 检查文件变化的间隔（秒）
+}
+
+# 多进程分片采集配置（多个PLC分片到多个工作进程，经共享内存环形缓冲区交给发布进程）
+FLEET_CONFIG = {
+    'workers': 0,                  # 工作进程数（0表示CPU核心数）
+    'interval_seconds': 2,         # 每个PLC的采集间隔（秒）
+    'ring_size': 1024 * 1024,      # 每个工作进程的共享内存环形缓冲区大小（字节）
+    'reconnect_interval': 10,      # PLC断线重连间隔（秒）
+    'max_restarts': 5,             # 重启窗口内允许的最大重启次数，超过后该进程的分片重新分配
+    'restart_window': 60,          # 重启统计窗口（秒）
+    'endpoints': [
+        # name: PLC名称（作为 device_id）, topic: 发布主题（省略时使用 <默认发布主题>/<name>）, port: S7端口（可选，默认102）
+        {'name': 'PLC_DB9000', 'ip': '172.16.10.66', 'rack': 0, 'slot': 1,
+         'topic': '/dxiot/4q/pub/huaheng/zudui'},
+    ],
+}
+
+# 性能分析配置（通过订阅主题命令或信号临时开启，结果写入文件）
+# 命令示例: {"cmd": "profile", "mode": "cprofile", "seconds": 30}，mode 可选 cprofile/sampling/stages
+PROFILING_CONFIG = {
+    'output_dir': 'profiles',      # 分析结果目录
+    'default_seconds': 30,         # 默认分析时长（秒）
+    'max_seconds': 600,            # 单次分析最长时长（秒）
+    'sample_interval': 0.005,      # 采样分析的采样间隔（秒）
+    'signal': 'SIGUSR1',           # 收到该信号时开启 cProfile 分析（Windows 下忽略）
+}
+
+# MQTT发布管理配置（QoS 1 在途消息跟踪、背压、超时重试和离线缓存）
+PUBLISH_CONFIG = {
+    'enabled': False,              # 是否启用发布管理
+    'max_inflight': 20,            # 在途（未收到PUBACK）消息上限
+    'max_queued': 100,             # paho 内部发送队列上限
+    'ack_timeout': 10.0,           # 等待PUBACK超时时间（秒），超时只记录告警，由 paho 在重连后重发
+    'block_timeout': 1.0,          # 在途窗口已满时发布方最长等待时间（秒），超时后写入离线缓存
+    'spool_file': 'mqtt_spool.jsonl',        # 离线缓存文件
+    'spool_max_bytes': 50 * 1024 * 1024,     # 离线缓存未补发部分上限（字节），超过后丢弃新消息
+    'replay_batch': 50,            # 连接恢复后每次补发的离线消息数
+}
+
+# 无人值守服务模式配置（plc_service.py，命令行参数和环境变量优先）
+SERVICE_CONFIG = {
+    'mode': 'auto',                # 采集模式: auto（按 ADAPTIVE_POLL_CONFIG['enabled']）、fixed、adaptive
+    'interval_seconds': 2,         # 固定周期模式的采集间隔（秒）
+    'connect_timeout': 10.0,       # 并行连接PLC和MQTT的最长等待时间（秒）
+    'dns_cache_file': 'dns_cache.json',  # 域名解析缓存文件，重启时直接使用
+    'dns_ttl': 300,                # 解析结果有效期（秒），过期后后台刷新
+    'dns_timeout': 2.0,            # 无缓存时同步解析的超时时间（秒）
+}
+
+# 冗余连接和故障切换配置（并行竞速连接、后台健康检查）
+FAILOVER_CONFIG = {
+    'enabled': False,              # 是否启用
+    'plc_ips': ['172.16.10.66'],   # PLC地址列表（H系统或备用CPU），按优先级排列
+    'mqtt_endpoints': ['Mqtt.dxiot.liju.cc:1883'],  # MQTT服务器列表（host:port），按优先级排列
+    'stagger': 0.25,               # 依次发起下一个连接尝试的间隔（秒），前一个失败时立即发起
+    'connect_timeout': 3.0,        # 一轮竞速连接的最长等待时间（秒）
+    'health_interval': 1.0,        # 后台健康检查周期（秒）
+    'probe_timeout': 0.5,          # 单次TCP探测超时（秒）
+    'fail_threshold': 2,           # 连续探测失败次数达到该值时判定端点不可用
+    'reconnect_delay': 0.2,        # MQTT断线后自动重连的最短等待时间（秒）
+}
+
+# 多MQTT服务器分发配置（主MQTT连接之外的附加目标服务器，每个服务器独立队列和发送线程）
+BROKER_GROUP_CONFIG = {
+    'enabled': False,              # 是否启用
+    'brokers': [
+        {
+            'name': 'onprem',              # 服务器名称（用于日志和统计）
+            'enabled': True,
+            'host': '192.168.1.10',        # 服务器地址
+            'port': 1883,
+            'qos': 1,
+            'retain': False,
+            'codec': 'json',               # 编码方式: json、json_compact、gzip_json
+            'topic_map': {                 # 主题映射（本地主题 -> 目标主题，None 表示不发送）
+                '/dxiot/4q/pub/huaheng/zudui': 'plant/huaheng/zudui',
+                # 报警、按标签发布、会话等消息只发送这里列出的主题（按原消息的 QoS 和 retain），如:
+                # '/dxiot/4q/pub/huaheng/zudui/alarm': 'plant/huaheng/zudui/alarm',
+            },
+            'topic_prefix': '',            # 未映射的快照主题的前缀
+            'queue_size': 1000,            # 发送队列上限，满时丢弃最旧的消息
+            'max_inflight': 20,            # 客户端在途消息上限，满时消息留在发送队列中等待确认
+        },
+    ],
+}
+
+# 按标签发布配置（统一命名空间主题树，保留消息，只发布变化的标签）
+TAG_TOPICS_CONFIG = {
+    'enabled': False,              # 是否启用
+    'prefix': 'dxiot/huaheng/zudui',  # 主题前缀
+    'device': '',                  # 设备段，留空时使用 DB<块号>（如 DB9000）
+    'use_aliases': False,          # 主题最后一段使用短别名（对照表发布在 <前缀>/<设备>/$aliases）
+    'qos': 0,                      # 标签消息QoS
+    'retain': True,                # 以保留消息发布，新订阅方立即获得当前值
+    'include_computed': True,      # 是否发布计算标签
+}
+
+# 有状态会话配置（出生/死亡证书、增量消息序号、rebirth 命令）
+STATE_SESSION_CONFIG = {
+    'enabled': False,              # 是否启用
+    'topic': '/dxiot/4q/state/huaheng/zudui',  # 出生: <topic>/birth，增量: <topic>/delta，死亡: <topic>/death
+    'qos': 1,                      # 出生、增量和死亡消息的QoS
+    'delta_only': False,           # True 时不再发布完整快照，只发布增量消息
+}
+
+# 大数据块并行读取配置（配方、趋势等大数据块快照，通过 {"cmd": "snapshot_block", "block": "<名称>"} 触发）
+LARGE_BLOCK_CONFIG = {
+    'enabled': False,              # 是否启用
+    'connections': 3,              # 到同一CPU的并行连接数（需在CPU连接资源以内，预留编程器/HMI连接）
+    'max_retries': 3,              # 版本字不一致时整块重新读取的最多次数
+    'keep_connected': False,       # 读取完成后是否保持连接（默认断开，不长期占用连接资源）
+    'output_dir': 'block_snapshots',  # 快照文件目录
+    'topic_suffix': '/block',      # 快照通知主题后缀（追加到发布主题后）
+    'blocks': [
+        # version_offset: 版本字/头部计数器地址（可选），读取期间变化时整块重新读取
+        {'name': 'recipe', 'db_number': 100, 'start': 0, 'size': 32768, 'version_offset': 0, 'version_size': 4},
+    ],
+}
+
+# 历史数据压缩归档配置（旋转门/死区压缩，归档点按天写入 <directory>/history_YYYYMMDD.jsonl）
+HISTORIAN_CONFIG = {
+    'enabled': False,              # 是否启用
+    'directory': 'history',        # 归档目录
+    'flush_interval': 5.0,         # 归档文件刷新间隔（秒）
+    'compression': {
+        'mode': 'swinging_door',   # 压缩方式: swinging_door（旋转门，线性插值重建）、deadband（死区，保持上一个值）、none
+        'deviation': 1.0,          # 允许误差（重建值与采样值的最大偏差，工程单位）
+        'max_interval': 600,       # 最长归档间隔（秒），超过后即使未变化也归档一个点
+    },
+    # 汇总层级（可选 1min、15min、1h、1d），每个时间桶记录最小、最大、平均、数量、第一个、最后一个值
+    'rollups': ['1min', '15min', '1h', '1d'],
+    'trend_topic_suffix': '/trend',  # 趋势查询结果主题后缀（追加到发布主题后）
+    'tags': {
+        # 按标签覆盖压缩配置，例如:
+        # 'int1': {'deviation': 2},
+        # 'dint1': {'mode': 'deadband', 'deviation': 10},
+    },
+}
+
+# SQLite 本地存储配置
+# 采集数据写入本地 SQLite 数据库（WAL 模式），可用 sqlite3 命令行或任何支持 SQLite 的工具直接查询
+SQLITE_SINK_CONFIG = {
+    'enabled': False,              # 是否启用
+    'path': 'plc_data.db',         # 数据库文件
+    'mode': 'changes',             # 写入方式: changes（变化的标签写入 samples 表）、snapshot（整次快照写入 snapshots 表）、both
+    'batch_size': 1000,            # 每批最多行数（达到后立即提交事务）
+    'batch_interval': 1.0,         # 最长提交间隔（秒）
+    'queue_size': 100000,          # 写入队列上限（行），写入跟不上时丢弃最旧的行
+    'retention_days': 30,          # 数据保留天数（0 表示不清理）
+    'prune_interval': 3600,        # 过期数据清理间隔（秒）
+}
+
+# 扫描周期看门狗配置
+# 每次扫描的耗时与扫描周期（自适应模式为最短周期）比较，持续超时时按 policy 逐级降载，状态变化发布到过载主题
+SCAN_WATCHDOG_CONFIG = {
+    'enabled': False,              # 是否启用
+    'window': 50,                  # 超时比例统计窗口（扫描次数）
+    'overrun_ratio': 0.2,          # 窗口内超时比例达到该值时判定为过载
+    'escalate_scans': 10,          # 过载持续多少次扫描后升一级降载
+    'recover_scans': 30,           # 连续多少次扫描按时完成后降一级
+    # 降载动作（按顺序逐级启用；固定周期模式只执行 pause_sinks）:
+    #   pause_sinks - 暂停 sinks 中的数据去向
+    #   slow_groups - 非关键标签组的周期乘以 slow_factor（自适应模式）
+    #   drop_groups - 停止扫描低优先级标签组（自适应模式）
+    'policy': ['pause_sinks', 'slow_groups', 'drop_groups'],
+    'sinks': ['historian', 'sqlite_sink', 'tag_topics', 'broker_group'],  # 可暂停的数据去向
+    'slow_factor': 3.0,            # 非关键标签组的周期放大倍数
+    'critical_groups': ['booleans'],       # 关键标签组（不降载，名称见 ADAPTIVE_POLL_CONFIG['groups']）
+    'low_priority_groups': ['string'],     # 低优先级标签组（最高一级降载时停止扫描）
+    'topic_suffix': '/overload',   # 过载状态主题后缀（追加到发布主题后）
+}
+
+# 端到端延迟跟踪配置
+# 每次采集记录读取开始/结束的 Unix 纳秒时间和各阶段的 monotonic 时间，按消息ID等待 PUBACK，
+# 统计 读取、解码、处理、发布、确认 各阶段和全程延迟的分位数；命令 {"cmd": "latency"} 立即发布统计
+LATENCY_CONFIG = {
+    'enabled': False,              # 是否启用
+    'window': 2000,                # 分位数统计窗口（最近的消息数）
+    'max_pending': 10000,          # 等待 PUBACK 的消息上限，超过后最旧的不再等待
+    'payload_fields': False,       # 是否在发布消息中附带 acquisition 字段（读取开始/结束纳秒时间和各阶段耗时）
+    'report_interval': 60,         # 定期发布延迟统计的间隔（秒，0 表示只在命令时发布）
+    'topic_suffix': '/latency',    # 延迟统计主题后缀（追加到发布主题后）
+}
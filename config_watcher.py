@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运行时配置热加载
+后台线程监视JSON配置文件，变化后校验并编译新的读取计划，
+由采集循环在两次扫描之间原子切换，无需重启程序
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+
+from read_plan import ReadPlan
+
+logger = logging.getLogger(__name__)
+
+
+class RuntimeConfig:
+    """编译完成、可直接切换的运行时配置"""
+
+    __slots__ = ('plan', 'interval_seconds', 'topic_pub', 'topic_sub', 'source')
+
+    def __init__(self, plan, interval_seconds=None, topic_pub=None, topic_sub=None, source=None):
+        self.plan = plan
+        self.interval_seconds = interval_seconds
+        self.topic_pub = topic_pub
+        self.topic_sub = topic_sub
+        self.source = source
+
+
+def compile_runtime_config(raw, source=None):
+    """校验配置内容并编译为 RuntimeConfig，配置无效时抛出 ValueError
+
+    配置格式:
+        {
+          "interval_seconds": 2,
+          "topics": {"pub": "...", "sub": "..."},
+          "db_number": 9000,
+          "tags": [ ... 与 config.TAG_CONFIG['tags'] 相同 ... ],
+          "udts": { ... 与 config.TAG_CONFIG['udts'] 相同（可选） ... }
+        }
+    除 tags 外均可省略，省略的项保持当前值
+    """
+    if not isinstance(raw, dict):
+        raise ValueError("配置文件顶层必须是JSON对象")
+    if not isinstance(raw.get('tags'), list):
+        raise ValueError("配置文件缺少 tags 列表")
+    if not all(isinstance(tag, dict) for tag in raw['tags']):
+        raise ValueError("tags 中的每一项必须是JSON对象")
+    if raw.get('udts') is not None and not isinstance(raw['udts'], dict):
+        raise ValueError("udts 必须是JSON对象")
+    db_number = raw.get('db_number', 9000)
+    if isinstance(db_number, bool) or not isinstance(db_number, int) or db_number <= 0:
+        raise ValueError(f"DB块号无效: {db_number!r}")
+
+    plan = ReadPlan.from_config(raw)
+
+    interval = raw.get('interval_seconds')
+    if interval is not None:
+        interval = float(interval)
+        if interval <= 0:
+            raise ValueError(f"采集间隔无效: {interval}")
+
+    topics = raw.get('topics', {})
+    if not isinstance(topics, dict):
+        raise ValueError("topics 必须是JSON对象")
+    for key in ('pub', 'sub'):
+        topic = topics.get(key)
+        if topic is not None and (not isinstance(topic, str) or not topic or '#' in topic or '+' in topic):
+            raise ValueError(f"主题无效: {key} = {topic!r}")
+
+    return RuntimeConfig(plan, interval, topics.get('pub'), topics.get('sub'), source)
+
+
+def load_runtime_config(path):
+    """读取并编译配置文件"""
+    with open(path, 'r', encoding='utf-8') as f:
+        raw = json.load(f)
+    return compile_runtime_config(raw, source=path)
+
+
+class ConfigWatcher:
+    """配置文件监视器
+
+    检测到文件修改后在后台线程中完成校验和编译，结果放入待切换槽位；
+    采集循环调用 take_pending() 取走新配置并在扫描间隙切换
+    """
+
+    def __init__(self, path, watch_interval=2.0):
+        self.path = path
+        self.watch_interval = watch_interval
+        self.running = False
+        self.thread = None
+        self.lock = threading.Lock()
+        self.pending = None
+        self.last_signature = None
+        self.reload_count = 0
+        self.error_count = 0
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def start(self):
+        """启动监视线程；文件已存在时立即加载一次"""
+        self.running = True
+        self.check()
+        self.thread = threading.Thread(target=self._watch_loop, name='config-watcher', daemon=True)
+        self.thread.start()
+        logger.info(f"配置热加载已启用，监视文件: {self.path}")
+
+    def stop(self):
+        """停止监视线程"""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=self.watch_interval + 1)
+            self.thread = None
+
+    def _watch_loop(self):
+        while self.running:
+            time.sleep(self.watch_interval)
+            self.check()
+
+    def check(self):
+        """检查文件是否变化，变化时编译新配置，返回是否产生了新配置"""
+        signature = self._signature()
+        if signature is None or signature == self.last_signature:
+            return False
+        self.last_signature = signature
+
+        try:
+            runtime = load_runtime_config(self.path)
+        except (OSError, ValueError) as e:
+            # 配置无效时保留当前运行配置
+            self.error_count += 1
+            logger.error(f"运行时配置无效，继续使用当前配置: {e}")
+            return False
+        except Exception as e:
+            # 未预料的格式错误也不能结束监视线程，否则之后的修改不再生效
+            self.error_count += 1
+            logger.error(f"运行时配置无效，继续使用当前配置: {type(e).__name__}: {e}")
+            return False
+
+        with self.lock:
+            self.pending = runtime
+        logger.info(f"运行时配置已编译，等待切换 (标签数: {len(runtime.plan.tags)})")
+        return True
+
+    def take_pending(self):
+        """取走待切换的新配置（没有时返回 None）"""
+        if self.pending is None:
+            return None
+        with self.lock:
+            runtime, self.pending = self.pending, None
+        if runtime is not None:
+            self.reload_count += 1
+        return runtime
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+并行连接竞速和端点健康检查
+按 "happy eyeballs" 方式依次错开发起多个连接尝试，最先成功的端点胜出，
+其余尝试完成后自动清理；后台持续探测各端点（TCP连接），
+故障切换时优先选择健康的端点
+"""
+
+import time
+import queue
+import socket
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# S7 通信（ISO-on-TCP）端口
+S7_PORT = 102
+
+
+def parse_endpoint(value, default_port):
+    """将 'host:port'、[host, port] 或 'host' 解析为 (host, port)"""
+    if isinstance(value, (list, tuple)):
+        host, port = value[0], int(value[1]) if len(value) > 1 else default_port
+        return str(host), port
+    text = str(value).strip()
+    if text.count(':') == 1:
+        host, port = text.split(':')
+        return host, int(port)
+    return text, default_port
+
+
+def tcp_probe(host, port, timeout):
+    """尝试建立TCP连接，成功返回耗时（秒），失败抛出 OSError"""
+    started = time.monotonic()
+    with socket.create_connection((host, port), timeout=timeout):
+        pass
+    return time.monotonic() - started
+
+
+def race(attempts, stagger=0.25, timeout=5.0, cleanup=None):
+    """并行竞速连接
+
+    attempts 为 [(标签, 连接函数)]，按顺序每隔 stagger 秒发起下一个（前一个失败时立即发起），
+    返回最先成功的 (标签, 结果)；全部失败或超时返回 (None, None)。
+    落败但之后成功的结果交给 cleanup(标签, 结果) 释放
+    """
+    if not attempts:
+        return None, None
+
+    results = queue.Queue()
+    lock = threading.Lock()
+    state = {'winner': None}
+
+    def run(label, connect):
+        try:
+            resource = connect()
+        except Exception as e:
+            logger.debug("连接尝试失败: %s (%s)", label, e)
+            results.put((label, None, e))
+            return
+        with lock:
+            won = state['winner'] is None
+            if won:
+                state['winner'] = label
+        if won:
+            results.put((label, resource, None))
+        elif cleanup:
+            try:
+                cleanup(label, resource)
+            except Exception as e:
+                logger.debug("清理落败连接时发生错误: %s (%s)", label, e)
+
+    deadline = time.monotonic() + timeout
+    started = failed = 0
+    while True:
+        if started < len(attempts):
+            label, connect = attempts[started]
+            threading.Thread(target=run, args=(label, connect), name=f'race-{label}', daemon=True).start()
+            started += 1
+            wait = stagger
+        else:
+            wait = deadline - time.monotonic()
+        wait = min(wait, deadline - time.monotonic())
+
+        try:
+            label, resource, error = results.get(timeout=max(0.0, wait))
+        except queue.Empty:
+            if time.monotonic() >= deadline:
+                break
+            continue
+        if error is None:
+            return label, resource
+        failed += 1
+        if failed >= len(attempts):
+            break
+
+    with lock:
+        if state['winner'] is None:
+            # 超时：之后才成功的尝试由 run() 清理
+            state['winner'] = ''
+            return None, None
+    # 超时的同时已有尝试成功，其结果已经（或即将）放入队列
+    while True:
+        label, resource, error = results.get()
+        if error is None:
+            return label, resource
+
+
+class HealthMonitor:
+    """后台TCP探测各端点，记录健康状态和连接延迟"""
+
+    def __init__(self, endpoints, interval=1.0, timeout=0.5, fail_threshold=2):
+        self.endpoints = list(endpoints)
+        self.interval = interval
+        self.timeout = timeout
+        self.fail_threshold = fail_threshold
+        self.lock = threading.Lock()
+        self.status = {
+            endpoint: {'healthy': True, 'failures': 0, 'latency_ms': None, 'checked_at': None}
+            for endpoint in self.endpoints
+        }
+        self.on_unhealthy = None      # 回调: on_unhealthy(endpoint)
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='endpoint-health', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=self.interval + self.timeout)
+            self.thread = None
+
+    def _run(self):
+        while self.running:
+            started = time.monotonic()
+            self.check_all()
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def check_all(self):
+        """并行探测全部端点"""
+        threads = [threading.Thread(target=self.check, args=(endpoint,), daemon=True)
+                   for endpoint in self.endpoints]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(self.timeout + 0.5)
+
+    def check(self, endpoint):
+        host, port = endpoint
+        try:
+            latency = tcp_probe(host, port, self.timeout)
+            ok = True
+        except OSError:
+            latency, ok = None, False
+        self.record(endpoint, ok, latency)
+
+    def record(self, endpoint, ok, latency=None):
+        became_unhealthy = False
+        with self.lock:
+            entry = self.status.setdefault(
+                endpoint, {'healthy': True, 'failures': 0, 'latency_ms': None, 'checked_at': None})
+            entry['checked_at'] = time.time()
+            if ok:
+                entry['failures'] = 0
+                entry['latency_ms'] = round(latency * 1000, 2) if latency is not None else None
+                if not entry['healthy']:
+                    logger.info(f"端点恢复: {endpoint[0]}:{endpoint[1]}")
+                entry['healthy'] = True
+            else:
+                entry['failures'] += 1
+                if entry['healthy'] and entry['failures'] >= self.fail_threshold:
+                    entry['healthy'] = False
+                    became_unhealthy = True
+                    logger.warning(f"端点不可用: {endpoint[0]}:{endpoint[1]}")
+        if became_unhealthy and self.on_unhealthy:
+            self.on_unhealthy(endpoint)
+
+    def is_healthy(self, endpoint):
+        with self.lock:
+            entry = self.status.get(endpoint)
+            return entry is None or entry['healthy']
+
+    def ordered(self, endpoints=None):
+        """健康的端点排在前面，其余保持配置中的优先级顺序"""
+        endpoints = list(self.endpoints if endpoints is None else endpoints)
+        with self.lock:
+            return sorted(endpoints, key=lambda endpoint: not self.status.get(endpoint, {}).get('healthy', True))
+
+    def get_status(self):
+        with self.lock:
+            return {f"{host}:{port}": dict(entry) for (host, port), entry in self.status.items()}
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动参数输入
+交互运行时在终端询问参数；systemd、容器等非交互运行时使用环境变量或默认值，不等待键盘输入
+"""
+
+import os
+import sys
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _prompt_number(prompt, default, env_var, parse):
+    value = os.getenv(env_var, '').strip() if env_var else ''
+    if not value:
+        if sys.stdin is None or not sys.stdin.isatty():
+            logger.info(f"非交互运行，使用默认值: {prompt.strip()} {default}")
+            return default
+        value = input(prompt).strip()
+    if not value:
+        return default
+    try:
+        return parse(value)
+    except ValueError:
+        logger.warning(f"输入无效 '{value}'，使用默认值: {prompt.strip()} {default}")
+        return default
+
+
+def prompt_int(prompt, default, env_var=None):
+    """读取整数参数：环境变量优先，交互终端下询问，非交互运行时或输入无效时使用默认值"""
+    return _prompt_number(prompt, default, env_var, int)
+
+
+def prompt_float(prompt, default, env_var=None):
+    """读取小数参数（如采集间隔），规则同 prompt_int"""
+    return _prompt_number(prompt, default, env_var, float)
+
+
+def prompt_text(prompt, default='', env_var=None):
+    """读取文本参数：环境变量优先，交互终端下询问，非交互运行时使用默认值"""
+    value = os.getenv(env_var, '').strip() if env_var else ''
+    if value:
+        return value
+    if sys.stdin is None or not sys.stdin.isatty():
+        return default
+    return input(prompt).strip() or default
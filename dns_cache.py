@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+域名解析缓存
+解析结果保存到本地文件，进程重启（如看门狗拉起）时直接使用上次的结果，
+过期条目先返回旧地址再在后台刷新，启动过程不等待DNS
+"""
+
+import os
+import json
+import time
+import socket
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def is_ip_address(host):
+    """判断是否已经是IP地址"""
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            socket.inet_pton(family, host)
+            return True
+        except (OSError, ValueError):
+            continue
+    return False
+
+
+class DNSCache:
+    """带持久化的域名解析缓存"""
+
+    def __init__(self, cache_file='dns_cache.json', ttl=300.0, timeout=2.0):
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.entries = {}     # 域名 -> {'ip': ..., 'resolved_at': 时间戳}
+        self.refreshing = set()
+        self._load()
+
+    @classmethod
+    def from_config(cls, config):
+        """根据 SERVICE_CONFIG 创建解析缓存"""
+        return cls(config.get('dns_cache_file', 'dns_cache.json'),
+                   config.get('dns_ttl', 300.0), config.get('dns_timeout', 2.0))
+
+    def _load(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取DNS缓存文件失败: {e}")
+
+    def _save(self):
+        if not self.cache_file:
+            return
+        try:
+            tmp_file = self.cache_file + '.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, self.cache_file)
+        except OSError as e:
+            logger.warning(f"保存DNS缓存文件失败: {e}")
+
+    def _lookup(self, host):
+        """实际解析（优先IPv4），失败时抛出异常"""
+        infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        infos.sort(key=lambda info: info[0] != socket.AF_INET)
+        return infos[0][4][0]
+
+    def _resolve_with_timeout(self, host):
+        # getaddrinfo 本身没有超时参数，放到后台线程中等待
+        result = {}
+
+        def worker():
+            try:
+                result['ip'] = self._lookup(host)
+            except Exception as e:
+                result['error'] = e
+
+        thread = threading.Thread(target=worker, name=f'dns-{host}', daemon=True)
+        thread.start()
+        thread.join(self.timeout)
+        if 'ip' in result:
+            return result['ip']
+        raise OSError(result.get('error') or f"解析超时（{self.timeout}秒）")
+
+    def _store(self, host, ip):
+        with self.lock:
+            self.entries[host] = {'ip': ip, 'resolved_at': time.time()}
+            self._save()
+
+    def resolve(self, host):
+        """解析域名：有缓存时立即返回（过期则后台刷新），无缓存时同步解析，失败返回 None"""
+        if not host or is_ip_address(host):
+            return host
+
+        with self.lock:
+            entry = self.entries.get(host)
+        if entry:
+            if time.time() - entry.get('resolved_at', 0) > self.ttl:
+                self.refresh_async(host)
+            return entry['ip']
+
+        try:
+            ip = self._resolve_with_timeout(host)
+        except Exception as e:
+            logger.warning(f"域名解析失败: {host} ({e})")
+            return None
+        self._store(host, ip)
+        logger.info(f"域名解析成功: {host} -> {ip}")
+        return ip
+
+    def refresh_async(self, host):
+        """在后台线程中刷新解析结果（同一域名同时只刷新一次）"""
+        with self.lock:
+            if host in self.refreshing:
+                return
+            self.refreshing.add(host)
+
+        def worker():
+            try:
+                ip = self._lookup(host)
+                self._store(host, ip)
+                logger.info(f"DNS缓存已刷新: {host} -> {ip}")
+            except Exception as e:
+                logger.warning(f"刷新DNS缓存失败: {host} ({e})，继续使用缓存地址")
+            finally:
+                with self.lock:
+                    self.refreshing.discard(host)
+
+        threading.Thread(target=worker, name=f'dns-refresh-{host}', daemon=True).start()
+
+    def prefetch(self, host):
+        """启动时预解析：没有缓存条目时在后台解析，供稍后的连接直接使用"""
+        if not host or is_ip_address(host):
+            return
+        with self.lock:
+            cached = host in self.entries
+        if not cached:
+            self.refresh_async(host)
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_dns_cache():
+    """返回进程内共享的解析缓存（按 SERVICE_CONFIG 创建）"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            from config import SERVICE_CONFIG
+            _default_cache = DNSCache.from_config(SERVICE_CONFIG)
+        return _default_cache
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多PLC分片采集监督进程
+将 FLEET_CONFIG 中的PLC列表分片到多个工作进程并行采集和编码，
+工作进程通过共享内存环形缓冲区把编码好的消息交给本进程统一发布到MQTT；
+工作进程崩溃时自动重启，频繁崩溃时将其分片重新分配给其他工作进程
+"""
+
+import os
+import json
+import time
+import signal
+import logging
+import multiprocessing
+from collections import deque
+from datetime import datetime
+
+from async_logging import setup_logging
+from shm_ring import SharedRingBuffer
+from config import FLEET_CONFIG, TAG_CONFIG
+
+logger = logging.getLogger(__name__)
+
+LOG_FILE = 'fleet_supervisor.log'
+
+
+def shard_endpoints(endpoints, count):
+    """将PLC列表轮流分配到 count 个分片"""
+    shards = [[] for _ in range(count)]
+    for index, endpoint in enumerate(endpoints):
+        shards[index % count].append(endpoint)
+    return shards
+
+
+def _exit_worker(signum, frame):
+    raise SystemExit(0)
+
+
+def worker_main(worker_id, endpoints, ring_name, tag_config, interval_seconds, reconnect_interval,
+                client_factory=None):
+    """工作进程：采集分配到的PLC，数据变化时编码为JSON写入环形缓冲区
+
+    监督进程通过 SIGTERM 停止工作进程；不使用跨进程的 Event 等同步对象，
+    避免工作进程被强制结束时锁住监督进程。client_factory 用于替换 snap7 客户端
+    （负载测试中的虚拟PLC），需可被 pickle
+    """
+    signal.signal(signal.SIGTERM, _exit_worker)
+    # 工作进程以 spawn 方式启动，需要重新配置日志并在进程内导入 snap7
+    setup_logging(LOG_FILE)
+    import snap7
+    from read_plan import ReadPlan
+
+    ring = SharedRingBuffer(name=ring_name)
+    plan = ReadPlan.from_config(tag_config)
+    client_factory = client_factory or snap7.client.Client
+    states = [
+        {
+            'endpoint': endpoint,
+            'client': client_factory(),
+            'connected': False,
+            'last_attempt': float('-inf'),
+            'last_data': None,
+            'deadband': {},
+            'header': endpoint['topic'].encode('utf-8') + b'\n',
+        }
+        for endpoint in endpoints
+    ]
+    logger.info(f"工作进程 {worker_id} 已启动 (pid {os.getpid()})，PLC: "
+                f"{', '.join(endpoint['name'] for endpoint in endpoints)}")
+
+    next_scan = time.monotonic()
+    try:
+        while True:
+            for state in states:
+                endpoint = state['endpoint']
+                client = state['client']
+                if not state['connected']:
+                    now = time.monotonic()
+                    if now - state['last_attempt'] < reconnect_interval:
+                        continue
+                    state['last_attempt'] = now
+                    try:
+                        if 'port' in endpoint:
+                            # 非标准端口（同一主机上的多个模拟PLC）
+                            client.connect(endpoint['ip'], endpoint.get('rack', 0), endpoint.get('slot', 1),
+                                           endpoint['port'])
+                        else:
+                            client.connect(endpoint['ip'], endpoint.get('rack', 0), endpoint.get('slot', 1))
+                        state['connected'] = client.get_connected()
+                    except Exception as e:
+                        logger.error(f"[{endpoint['name']}] PLC连接错误: {e}")
+                    if not state['connected']:
+                        continue
+                    logger.info(f"[{endpoint['name']}] ✓ PLC连接成功")
+
+                try:
+                    data = plan.apply_deadband(plan.read(client), state['deadband'])
+                except Exception as e:
+                    logger.error(f"[{endpoint['name']}] 读取数据时发生错误: {e}")
+                    state['connected'] = False
+                    try:
+                        client.disconnect()
+                    except Exception:
+                        pass
+                    continue
+
+                # 与优化版本一致：首次读取只记录，之后只在数据变化时发布
+                if state['last_data'] is not None and data != state['last_data']:
+                    payload = json.dumps({
+                        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                        'device_id': endpoint['name'],
+                        'data': data
+                    }, ensure_ascii=False).encode('utf-8')
+                    try:
+                        if not ring.put(state['header'] + payload):
+                            logger.warning(f"[{endpoint['name']}] 环形缓冲区已满，丢弃一条消息")
+                    except ValueError as e:
+                        # 超过环形缓冲区一半的消息无法写入，只丢弃这一条，工作进程继续运行
+                        logger.error(f"[{endpoint['name']}] {e}，已丢弃（请增大 ring_size）")
+                state['last_data'] = data
+
+            next_scan += interval_seconds
+            delay = next_scan - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_scan = time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for state in states:
+            if state['connected']:
+                state['client'].disconnect()
+        ring.close()
+
+
+class WorkerSlot:
+    """一个工作进程槽位：环形缓冲区、分片和重启记录"""
+
+    def __init__(self, worker_id, ring):
+        self.worker_id = worker_id
+        self.ring = ring
+        self.endpoints = []
+        self.process = None
+        self.restarts = deque()
+        self.failed = False
+
+
+class FleetSupervisor:
+    """多PLC分片采集监督进程"""
+
+    def __init__(self, publisher, fleet_config=None, tag_config=None, client_factory=None):
+        self.publisher = publisher
+        self.config = fleet_config or FLEET_CONFIG
+        self.tag_config = tag_config or TAG_CONFIG
+        self.client_factory = client_factory
+        self.context = multiprocessing.get_context('spawn')
+        self.running = False
+        self.slots = []
+        self.published_count = 0
+
+        default_topic = publisher.mqtt_topic_pub
+        self.endpoints = []
+        for endpoint in self.config['endpoints']:
+            endpoint = dict(endpoint)
+            endpoint.setdefault('topic', f"{default_topic}/{endpoint['name']}")
+            self.endpoints.append(endpoint)
+        names = [endpoint['name'] for endpoint in self.endpoints]
+        if len(set(names)) != len(names):
+            raise ValueError("PLC名称重复")
+
+    def start(self):
+        """创建环形缓冲区、分片并启动工作进程"""
+        workers = self.config.get('workers') or os.cpu_count() or 1
+        workers = max(1, min(workers, len(self.endpoints)))
+        ring_size = self.config.get('ring_size', 1024 * 1024)
+
+        for worker_id in range(workers):
+            ring = SharedRingBuffer(size=ring_size, create=True)
+            self.slots.append(WorkerSlot(worker_id, ring))
+        for slot, shard in zip(self.slots, shard_endpoints(self.endpoints, workers)):
+            slot.endpoints = shard
+            self._start_worker(slot)
+
+        self.running = True
+        logger.info(f"分片采集已启动: PLC {len(self.endpoints)} 台，工作进程 {workers} 个")
+
+    def _start_worker(self, slot):
+        slot.process = self.context.Process(
+            target=worker_main,
+            args=(slot.worker_id, slot.endpoints, slot.ring.name, self.tag_config,
+                  self.config.get('interval_seconds', 2),
+                  self.config.get('reconnect_interval', 10), self.client_factory),
+            name=f'plc-worker-{slot.worker_id}',
+            daemon=True,
+        )
+        slot.process.start()
+
+    def _stop_worker(self, slot):
+        if slot.process and slot.process.is_alive():
+            slot.process.terminate()
+            slot.process.join(timeout=5)
+            if slot.process.is_alive():
+                slot.process.kill()
+                slot.process.join()
+
+    def drain(self, budget=1000):
+        """从所有环形缓冲区取出消息并发布，返回本次处理的消息数
+
+        MQTT断线或发布失败时消息留在环形缓冲区中，恢复后再发布（缓冲区写满后由工作进程丢弃新消息并告警）；
+        启用发布管理时未发出的消息已写入离线缓存，直接移出
+        """
+        handled = 0
+        for slot in self.slots:
+            while handled < budget and self.publisher.mqtt_connected:
+                message = slot.ring.peek()
+                if message is None:
+                    break
+                topic, _, payload = message.partition(b'\n')
+                if self.publisher.publish_payload(topic.decode('utf-8'), payload):
+                    self.published_count += 1
+                elif not self.publisher.publish_manager:
+                    break
+                slot.ring.advance()
+                handled += 1
+        return handled
+
+    def check_workers(self):
+        """重启退出的工作进程；重启过于频繁时将其分片重新分配"""
+        now = time.monotonic()
+        window = self.config.get('restart_window', 60)
+        max_restarts = self.config.get('max_restarts', 5)
+        needs_rebalance = False
+
+        for slot in self.slots:
+            if slot.failed or slot.process.is_alive():
+                continue
+            while slot.restarts and now - slot.restarts[0] > window:
+                slot.restarts.popleft()
+            if len(slot.restarts) >= max_restarts:
+                logger.error(f"工作进程 {slot.worker_id} 在 {window} 秒内重启 {len(slot.restarts)} 次，"
+                             f"停止重启并重新分配其PLC")
+                slot.failed = True
+                needs_rebalance = True
+                continue
+            slot.restarts.append(now)
+            logger.warning(f"工作进程 {slot.worker_id} 已退出 (退出码 {slot.process.exitcode})，正在重启")
+            self._start_worker(slot)
+
+        if needs_rebalance:
+            self.rebalance()
+
+    def rebalance(self):
+        """把全部PLC重新分片到健康的工作进程上，只重启分片发生变化的进程"""
+        healthy = [slot for slot in self.slots if not slot.failed]
+        if not healthy:
+            logger.error("没有可用的工作进程，全部重置后重新分配")
+            for slot in self.slots:
+                slot.failed = False
+                slot.restarts.clear()
+            healthy = self.slots
+
+        for slot in self.slots:
+            if slot.failed:
+                slot.endpoints = []
+        for slot, shard in zip(healthy, shard_endpoints(self.endpoints, len(healthy))):
+            if shard != slot.endpoints or not slot.process.is_alive():
+                self._stop_worker(slot)
+                slot.endpoints = shard
+                self._start_worker(slot)
+        logger.info("分片已重新分配: " + "; ".join(
+            f"进程{slot.worker_id}: {', '.join(ep['name'] for ep in slot.endpoints) or '-'}"
+            for slot in self.slots
+        ))
+
+    def run(self, check_interval=1.0):
+        """发布循环：持续取出消息发布，并定期检查工作进程"""
+        last_check = time.monotonic()
+        try:
+            while self.running:
+                if self.drain() == 0:
+                    time.sleep(0.01)
+                now = time.monotonic()
+                if now - last_check >= check_interval:
+                    last_check = now
+                    self.check_workers()
+        except KeyboardInterrupt:
+            logger.info("用户中断分片采集")
+        finally:
+            self.stop()
+
+    def stop(self):
+        """停止全部工作进程并释放共享内存"""
+        self.running = False
+        for slot in self.slots:
+            self._stop_worker(slot)
+        # 发布工作进程退出前写入的剩余消息
+        self.drain(budget=float('inf'))
+        for slot in self.slots:
+            remaining = 0
+            while slot.ring.get() is not None:
+                remaining += 1
+            if remaining:
+                logger.warning(f"工作进程 {slot.worker_id}: {remaining} 条消息因MQTT未连接未能发布")
+            logger.info(f"工作进程 {slot.worker_id}: 重启 {len(slot.restarts)} 次")
+            slot.ring.close()
+            slot.ring.unlink()
+        self.slots = []
+        logger.info(f"分片采集已停止，共发布 {self.published_count} 条消息")
+
+
+def main():
+    """主函数"""
+    setup_logging(LOG_FILE)
+    # 日志配置完成后再导入发布器，避免其模块级日志配置生效
+    from plc_mqtt_publisher_optimized import PLCMQTTPublisherOptimized
+
+    publisher = PLCMQTTPublisherOptimized()
+    if not publisher.connect_mqtt():
+        print("无法连接到MQTT服务器，程序退出")
+        return
+
+    supervisor = FleetSupervisor(publisher)
+    signal.signal(signal.SIGTERM, lambda signum, frame: setattr(supervisor, 'running', False))
+    try:
+        supervisor.start()
+        supervisor.run()
+    finally:
+        publisher.disconnect_mqtt()
+
+
+if __name__ == "__main__":
+    main()
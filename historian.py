@@ -0,0 +1,602 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+历史数据压缩归档
+按标签对采集数据做旋转门（swinging door）或死区压缩，只归档重建所需的点：
+数值标签在相邻归档点之间线性插值（死区方式为保持上一个值），重建值与原始采样值的
+偏差不超过配置的允许误差（旋转门归档点取在门内，可能与该时刻的采样值相差不超过允许误差）；
+开关量和字符串只在变化时归档。
+压缩状态按标签下标保存在紧凑数组中，归档点按天写入 JSON Lines 文件。
+同时按 1min/15min/1h/1d 层级增量维护汇总（最小、最大、平均、数量、第一个、最后一个），
+趋势查询自动选择满足分辨率的最粗层级，查询时间范围再大也只需读取少量汇总行
+"""
+
+import os
+import json
+import math
+import time
+import bisect
+import logging
+import threading
+from array import array
+
+from tag_utils import flatten_data
+
+logger = logging.getLogger(__name__)
+
+# 压缩方式
+SWINGING_DOOR = 0
+DEADBAND = 1
+NO_COMPRESSION = 2
+MODES = {'swinging_door': SWINGING_DOOR, 'deadband': DEADBAND, 'none': NO_COMPRESSION}
+
+
+class TagCompressor:
+    """按标签的压缩状态，数值标签的状态保存在按下标访问的数组中"""
+
+    def __init__(self, default=None, overrides=None):
+        default = default or {}
+        self.default = {
+            'mode': default.get('mode', 'swinging_door'),
+            'deviation': float(default.get('deviation', 0.0)),
+            'max_interval': float(default.get('max_interval', 600)),
+        }
+        self.overrides = dict(overrides or {})
+
+        self.index = {}                 # 标签名 -> 数值状态下标
+        self.names = []
+        self.modes = bytearray()
+        self.deviation = array('d')
+        self.max_interval = array('d')
+        self.started = bytearray()      # 是否已有归档点
+        self.integer = bytearray()      # 是否为整数标签（归档值为整数时输出 int）
+        self.has_held = bytearray()     # 是否有未归档的保留点
+        self.archived_t = array('d')    # 最近归档点
+        self.archived_v = array('d')
+        self.held_t = array('d')        # 最近收到但未归档的点
+        self.held_v = array('d')
+        self.slope_max = array('d')     # 旋转门上门斜率（取最小）
+        self.slope_min = array('d')     # 旋转门下门斜率（取最大）
+        self.discrete = {}              # 非数值标签 -> 最近归档值
+        self.stats = {'received': 0, 'archived': 0}
+
+    def settings(self, name):
+        """标签的压缩配置（默认配置 + 按标签覆盖）"""
+        settings = dict(self.default)
+        settings.update(self.overrides.get(name, {}))
+        if settings['mode'] not in MODES:
+            raise ValueError(f"标签 {name} 的压缩方式不支持: {settings['mode']}")
+        return settings
+
+    def _register(self, name):
+        settings = self.settings(name)
+        i = self.index[name] = len(self.names)
+        self.names.append(name)
+        self.modes.append(MODES[settings['mode']])
+        self.deviation.append(float(settings['deviation']))
+        self.max_interval.append(float(settings['max_interval']))
+        self.started.append(0)
+        self.integer.append(0)
+        self.has_held.append(0)
+        for column in (self.archived_t, self.archived_v, self.held_t, self.held_v,
+                       self.slope_max, self.slope_min):
+            column.append(0.0)
+        return i
+
+    def add(self, t, values, out):
+        """加入一次采样，需要归档的点以 (时间, 标签, 值) 追加到 out"""
+        index = self.index
+        for name, value in values.items():
+            self.stats['received'] += 1
+            value_type = type(value)
+            if (value_type is int or value_type is float) and math.isfinite(value):
+                i = index.get(name)
+                if i is None:
+                    i = self._register(name)
+                self._add_numeric(i, name, t, value, out)
+            else:
+                # 开关量、字符串、数组等：只在变化时归档
+                if name in self.discrete and self.discrete[name] == value:
+                    continue
+                self.discrete[name] = value
+                out.append((t, name, value))
+                self.stats['archived'] += 1
+                i = index.get(name)
+                if i is not None:
+                    # 数值标签临时变为无效值，之后重新开始压缩
+                    self.started[i] = 0
+                    self.has_held[i] = 0
+
+    def _archive(self, i, name, t, value, out):
+        out.append((t, name, value))
+        self.stats['archived'] += 1
+        self.archived_t[i] = t
+        self.archived_v[i] = value
+        self.started[i] = 1
+        self.has_held[i] = 0
+
+    def _output(self, i, value):
+        if self.integer[i] and value.is_integer():
+            return int(value)
+        return value
+
+    def _archive_held(self, i, name, out):
+        """归档保留点：取 “最近归档点 -> 保留点” 的斜率限制在门内得到的值，
+        保证两个归档点之间的全部采样都在允许误差以内"""
+        archived_t, archived_v = self.archived_t[i], self.archived_v[i]
+        held_t = self.held_t[i]
+        slope = (self.held_v[i] - archived_v) / (held_t - archived_t)
+        slope = min(max(slope, self.slope_min[i]), self.slope_max[i])
+        value = archived_v + slope * (held_t - archived_t)
+        out.append((held_t, name, self._output(i, value)))
+        self.stats['archived'] += 1
+        self.archived_t[i] = held_t
+        self.archived_v[i] = value
+        self.has_held[i] = 0
+
+    def _add_numeric(self, i, name, t, value, out):
+        if name in self.discrete:
+            del self.discrete[name]
+        self.integer[i] = type(value) is int
+        if not self.started[i]:
+            self._archive(i, name, t, value, out)
+            return
+        dt = t - self.archived_t[i]
+        if dt <= 0:
+            return
+        mode = self.modes[i]
+        deviation = self.deviation[i]
+
+        if mode == NO_COMPRESSION:
+            self._archive(i, name, t, value, out)
+            return
+
+        if mode == DEADBAND:
+            if abs(value - self.archived_v[i]) > deviation or dt >= self.max_interval[i]:
+                self._archive(i, name, t, value, out)
+            return
+
+        # 旋转门：上下两扇门以最近归档点为轴，随新点收窄；门打开（下门斜率超过上门）时
+        # 归档上一个保留点，并以它为新的轴
+        if self.has_held[i]:
+            archived_v = self.archived_v[i]
+            upper = min(self.slope_max[i], (value + deviation - archived_v) / dt)
+            lower = max(self.slope_min[i], (value - deviation - archived_v) / dt)
+            if lower > upper or dt > self.max_interval[i]:
+                self._archive_held(i, name, out)
+                archived_v = self.archived_v[i]
+                dt = t - self.archived_t[i]
+                upper = (value + deviation - archived_v) / dt
+                lower = (value - deviation - archived_v) / dt
+        else:
+            archived_v = self.archived_v[i]
+            upper = (value + deviation - archived_v) / dt
+            lower = (value - deviation - archived_v) / dt
+        self.has_held[i] = 1
+        self.slope_max[i] = upper
+        self.slope_min[i] = lower
+        self.held_t[i] = t
+        self.held_v[i] = value
+
+    def flush(self, out):
+        """归档全部保留点（停止采集前调用，保证结尾可以重建）"""
+        for i, name in enumerate(self.names):
+            if self.has_held[i]:
+                self._archive_held(i, name, out)
+
+    def mode_of(self, name):
+        i = self.index.get(name)
+        return self.modes[i] if i is not None else None
+
+    def compression_ratio(self):
+        return round(self.stats['received'] / self.stats['archived'], 2) if self.stats['archived'] else None
+
+
+def interpolate(points, t, step=False):
+    """由归档点重建 t 时刻的值：数值线性插值（step 为 True 时保持上一个值），非数值保持上一个值"""
+    if not points:
+        return None
+    times = [point[0] for point in points]
+    index = bisect.bisect_right(times, t)
+    if index == 0:
+        return None
+    t0, v0 = points[index - 1]
+    if index == len(points) or step or t0 == t:
+        return v0
+    t1, v1 = points[index]
+    if type(v0) not in (int, float) or type(v1) not in (int, float) or isinstance(v0, bool):
+        return v0
+    return v0 + (v1 - v0) * (t - t0) / (t1 - t0)
+
+
+class HistoryArchive:
+    """按天分文件的归档点存储（每行 [时间, 标签, 值]）"""
+
+    def __init__(self, directory='history', flush_interval=5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._file = None
+        self._day = None
+        self._last_flush = time.monotonic()
+        # 采集线程写入，查询可能来自其他线程
+        self.lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, day):
+        return os.path.join(self.directory, f"history_{day}.jsonl")
+
+    def append(self, points):
+        with self.lock:
+            for t, name, value in points:
+                day = time.strftime('%Y%m%d', time.localtime(t))
+                if day != self._day:
+                    self.close()
+                    self._file = open(self.path_for(day), 'a', encoding='utf-8')
+                    self._day = day
+                self._file.write(json.dumps([round(t, 3), name, value], ensure_ascii=False))
+                self._file.write('\n')
+            if self._file and time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def flush(self):
+        with self.lock:
+            if self._file:
+                self._file.flush()
+            self._last_flush = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+                self._day = None
+
+    def query(self, tag, start, end):
+        """返回 [start, end] 内的归档点 [(时间, 值)]，并包含两端之外最近的点以便插值"""
+        self.flush()
+        before, points, after = None, [], None
+        key = f', {json.dumps(tag, ensure_ascii=False)}, '
+        # 向前多查一天，取得 start 之前最近的归档点
+        day = start - 86400
+        while day <= end + 86400 and after is None:
+            path = self.path_for(time.strftime('%Y%m%d', time.localtime(day)))
+            day += 86400
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if key not in line:
+                        continue
+                    t, name, value = json.loads(line)
+                    if name != tag:
+                        continue
+                    if t < start:
+                        before = (t, value)
+                    elif t <= end:
+                        points.append((t, value))
+                    elif after is None:
+                        after = (t, value)
+                        break
+        if before:
+            points.insert(0, before)
+        if after:
+            points.append(after)
+        return points
+
+
+# 汇总层级: (名称, 秒数)，由细到粗；较粗的层级由上一层级关闭的时间桶合并得到
+ROLLUP_TIERS = (('1min', 60), ('15min', 900), ('1h', 3600), ('1d', 86400))
+
+# 时间桶按本地时间对齐（1d 从本地零点开始）
+_UTC_OFFSET = time.localtime().tm_gmtoff
+
+
+class RollupBucket:
+    """一个时间桶的汇总值"""
+
+    __slots__ = ('start', 'min', 'max', 'sum', 'count', 'first', 'last')
+
+    def __init__(self, start, value):
+        self.start = start
+        self.min = self.max = self.first = self.last = value
+        self.sum = value
+        self.count = 1
+
+    def add(self, value):
+        if value < self.min:
+            self.min = value
+        elif value > self.max:
+            self.max = value
+        self.sum += value
+        self.count += 1
+        self.last = value
+
+    def merge(self, other):
+        """合并时间上在本桶之后的细粒度桶"""
+        if other.min < self.min:
+            self.min = other.min
+        if other.max > self.max:
+            self.max = other.max
+        self.sum += other.sum
+        self.count += other.count
+        self.last = other.last
+
+    def row(self, tag):
+        return [self.start, tag, self.min, self.max, self.sum / self.count, self.count, self.first, self.last]
+
+
+def bucket_start(t, seconds):
+    return t - (t + _UTC_OFFSET) % seconds
+
+
+class RollupTier:
+    """一个汇总层级：每个标签保留当前未关闭的时间桶"""
+
+    def __init__(self, name, seconds):
+        self.name = name
+        self.seconds = seconds
+        self.open = {}
+
+    def add(self, tag, t, value, closed):
+        """加入一个采样，关闭的时间桶以 (标签, 桶) 追加到 closed"""
+        start = bucket_start(t, self.seconds)
+        bucket = self.open.get(tag)
+        if bucket is not None and bucket.start == start:
+            bucket.add(value)
+            return
+        if bucket is not None:
+            closed.append((tag, bucket))
+        self.open[tag] = RollupBucket(start, value)
+
+    def merge(self, tag, child, closed):
+        """合并下一层级关闭的时间桶"""
+        start = bucket_start(child.start, self.seconds)
+        bucket = self.open.get(tag)
+        if bucket is not None and bucket.start == start:
+            bucket.merge(child)
+            return
+        if bucket is not None:
+            closed.append((tag, bucket))
+        bucket = self.open[tag] = RollupBucket(start, child.first)
+        bucket.min, bucket.max, bucket.sum, bucket.count = child.min, child.max, child.sum, child.count
+        bucket.last = child.last
+
+    def close_all(self, closed):
+        closed.extend(self.open.items())
+        self.open.clear()
+
+
+class RollupStore:
+    """汇总数据存储：按层级分文件（每行 [桶开始时间, 标签, 最小, 最大, 平均, 数量, 第一个, 最后一个]）
+
+    1min 按天、15min 和 1h 按月、1d 按年分文件，范围查询只读取覆盖的文件
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._files = {}
+        self.lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def period(seconds, t):
+        if seconds < 900:
+            return time.strftime('%Y%m%d', time.localtime(t))
+        if seconds < 86400:
+            return time.strftime('%Y%m', time.localtime(t))
+        return time.strftime('%Y', time.localtime(t))
+
+    def path_for(self, tier, period):
+        return os.path.join(self.directory, f"rollup_{tier.name}_{period}.jsonl")
+
+    def append(self, tier, rows):
+        with self.lock:
+            for tag, bucket in rows:
+                path = self.path_for(tier, self.period(tier.seconds, bucket.start))
+                entry = self._files.get(tier.name)
+                if entry is None or entry[0] != path:
+                    if entry is not None:
+                        entry[1].close()
+                    entry = self._files[tier.name] = (path, open(path, 'a', encoding='utf-8'))
+                entry[1].write(json.dumps(bucket.row(tag), ensure_ascii=False))
+                entry[1].write('\n')
+
+    def flush(self):
+        with self.lock:
+            for _, f in self._files.values():
+                f.flush()
+
+    def close(self):
+        with self.lock:
+            for _, f in self._files.values():
+                f.close()
+            self._files.clear()
+
+    def query(self, tier, tag, start, end):
+        """返回与 [start, end] 重叠的时间桶行"""
+        self.flush()
+        rows = []
+        key = f', {json.dumps(tag, ensure_ascii=False)}, '
+        periods = []
+        t = bucket_start(start, tier.seconds)
+        while True:
+            period = self.period(tier.seconds, min(t, end))
+            if not periods or periods[-1] != period:
+                periods.append(period)
+            if t >= end:
+                break
+            # 文件最小按天分区，逐天前进即可覆盖全部文件
+            t += 86400
+        for period in periods:
+            path = self.path_for(tier, period)
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if key not in line:
+                        continue
+                    row = json.loads(line)
+                    if row[1] == tag and row[0] + tier.seconds > start and row[0] <= end:
+                        rows.append(row)
+        return rows
+
+
+class Rollups:
+    """按层级增量维护汇总（最细层级接收采样，其余层级合并上一层级关闭的时间桶）"""
+
+    def __init__(self, store, tiers=ROLLUP_TIERS):
+        self.store = store
+        self.tiers = [RollupTier(name, seconds) for name, seconds in tiers]
+
+    def add(self, t, values):
+        closed = []
+        first = self.tiers[0]
+        for tag, value in values.items():
+            value_type = type(value)
+            if (value_type is int or value_type is float) and math.isfinite(value):
+                first.add(tag, t, value, closed)
+        self._cascade(0, closed)
+
+    def _cascade(self, level, closed):
+        while closed:
+            tier = self.tiers[level]
+            self.store.append(tier, closed)
+            level += 1
+            if level == len(self.tiers):
+                return
+            parent_closed = []
+            for tag, bucket in closed:
+                self.tiers[level].merge(tag, bucket, parent_closed)
+            closed = parent_closed
+
+    def close(self):
+        """关闭全部未完成的时间桶（停止采集时调用）
+
+        未满的时间桶也会写入，重新启动后同一时间桶可能有多行，查询时合并
+        """
+        carried = []
+        for level, tier in enumerate(self.tiers):
+            closed = carried
+            tier.close_all(closed)
+            self.store.append(tier, closed)
+            carried = []
+            if level + 1 < len(self.tiers):
+                for tag, bucket in closed:
+                    self.tiers[level + 1].merge(tag, bucket, carried)
+        self.store.close()
+
+    def select_tier(self, resolution):
+        """满足分辨率要求（桶宽不超过 resolution 秒）的最粗层级，没有时返回 None"""
+        chosen = None
+        for tier in self.tiers:
+            if tier.seconds <= resolution:
+                chosen = tier
+        return chosen
+
+    def query(self, tier, tag, start, end):
+        """查询时间桶 [{t, min, max, avg, count, first, last}]，包含尚未关闭的桶"""
+        rows = self.store.query(tier, tag, start, end)
+        # 本层级及更细层级中尚未合并上来的桶（由粗到细即按时间先后）
+        level = self.tiers.index(tier)
+        for open_tier in reversed(self.tiers[:level + 1]):
+            bucket = open_tier.open.get(tag)
+            if bucket is None:
+                continue
+            row = bucket.row(tag)
+            row[0] = bucket_start(bucket.start, tier.seconds)
+            if row[0] + tier.seconds > start and row[0] <= end:
+                rows.append(row)
+
+        merged = {}
+        for bucket_t, _, low, high, avg, count, first, last in rows:
+            entry = merged.get(bucket_t)
+            if entry is None:
+                merged[bucket_t] = {'t': bucket_t, 'min': low, 'max': high, 'sum': avg * count,
+                                    'count': count, 'first': first, 'last': last}
+                continue
+            # 同一时间桶的多行（重启前后各写入一部分），按写入顺序合并
+            entry['min'] = min(entry['min'], low)
+            entry['max'] = max(entry['max'], high)
+            entry['sum'] += avg * count
+            entry['count'] += count
+            entry['last'] = last
+        result = []
+        for bucket_t in sorted(merged):
+            entry = merged[bucket_t]
+            entry['avg'] = entry.pop('sum') / entry['count']
+            result.append(entry)
+        return result
+
+
+class Historian:
+    """采集数据压缩后归档"""
+
+    def __init__(self, archive, compressor, rollups=None):
+        self.archive = archive
+        self.compressor = compressor
+        self.rollups = rollups
+        self._points = []
+
+    @classmethod
+    def from_config(cls, config):
+        """根据 HISTORIAN_CONFIG 创建"""
+        directory = config.get('directory', 'history')
+        archive = HistoryArchive(directory, config.get('flush_interval', 5.0))
+        compressor = TagCompressor(config.get('compression'), config.get('tags'))
+        rollups = None
+        tier_names = config.get('rollups', [])
+        if tier_names:
+            known = dict(ROLLUP_TIERS)
+            unknown = [name for name in tier_names if name not in known]
+            if unknown:
+                raise ValueError(f"汇总层级不支持: {', '.join(unknown)}（可选 {', '.join(known)}）")
+            tiers = [(name, seconds) for name, seconds in ROLLUP_TIERS if name in tier_names]
+            rollups = Rollups(RollupStore(directory), tiers)
+        return cls(archive, compressor, rollups)
+
+    def record(self, data, now=None):
+        """记录一次采集数据（发布数据格式），返回归档点数量"""
+        return self.record_values(flatten_data(data), now)
+
+    def record_values(self, values, now=None):
+        """记录一次采样（标签名 -> 值），返回归档点数量"""
+        points = self._points
+        now = time.time() if now is None else now
+        self.compressor.add(now, values, points)
+        if self.rollups:
+            self.rollups.add(now, values)
+        count = len(points)
+        if points:
+            self.archive.append(points)
+            points.clear()
+        return count
+
+    def query(self, tag, start, end):
+        """查询归档点 [(时间, 值)]，数值按线性插值重建（死区方式按保持上一个值）"""
+        return self.archive.query(tag, start, end)
+
+    def trend(self, tag, start, end, resolution):
+        """趋势查询：选择桶宽不超过 resolution 秒的最粗汇总层级，
+        没有合适层级时返回归档点。返回 {'tier': 层级名或 'raw', 'points': [...]}"""
+        tier = self.rollups.select_tier(resolution) if self.rollups else None
+        if tier is None:
+            points = [{'t': t, 'value': value} for t, value in self.query(tag, start, end)]
+            return {'tier': 'raw', 'points': points}
+        return {'tier': tier.name, 'points': self.rollups.query(tier, tag, start, end)}
+
+    def value_at(self, tag, t):
+        points = self.query(tag, t, t)
+        return interpolate(points, t, step=self.compressor.mode_of(tag) == DEADBAND)
+
+    def close(self):
+        points = []
+        self.compressor.flush(points)
+        self.archive.append(points)
+        self.archive.close()
+        if self.rollups:
+            self.rollups.close()
+
+    def get_stats(self):
+        stats = dict(self.compressor.stats)
+        stats['compression_ratio'] = self.compressor.compression_ratio()
+        return stats
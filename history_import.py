@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+历史数据批量导入
+把已有的 plc_data_*.log（PLCLogger 日志中的 "JSON数据" 块）和 save_results_to_file 生成的
+JSON/CSV 文件导入 SQLite 本地存储的 samples 表，之后可按标签和时间范围查询。
+多个文件由进程池并行解析，按时间戳去重，重复导入同一文件不会产生重复数据
+"""
+
+import os
+import sys
+import csv
+import json
+import glob
+import time
+import shutil
+import sqlite3
+import logging
+import argparse
+import tempfile
+from datetime import datetime
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from tag_utils import flatten_data, diff_values
+from sqlite_sink import SQLiteSink, encode_sample
+from config import SQLITE_SINK_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# PLCLogger 日志中快照JSON的起始标记（之后是 indent=2 的多行JSON，以顶格的 "}" 结束）
+JSON_MARKER = 'JSON数据: '
+
+# 工作进程每批写入暂存数据库的行数
+INSERT_BATCH = 50000
+
+
+def parse_timestamp(text):
+    """解析采集时间戳（'%Y-%m-%d %H:%M:%S'、ISO 格式或 Unix 秒），返回 Unix 秒，无法解析时返回 None"""
+    if isinstance(text, (int, float)):
+        return float(text)
+    if not text:
+        return None
+    if len(text) == 19 and text[4] == '-' and text[10] == ' ':
+        # 常见格式直接按位置切分，比 strptime 快一个数量级
+        try:
+            return time.mktime((int(text[0:4]), int(text[5:7]), int(text[8:10]), int(text[11:13]),
+                                int(text[14:16]), int(text[17:19]), 0, 0, -1))
+        except ValueError:
+            return None
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        return None
+
+
+def iter_log_records(path):
+    """逐条读取 PLCLogger 日志中的快照（只解析 "JSON数据" 块，其余日志行直接跳过）"""
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        block = None
+        for line in f:
+            if block is None:
+                index = line.find(JSON_MARKER)
+                if index < 0:
+                    continue
+                text = line[index + len(JSON_MARKER):].rstrip()
+                if text == '{':
+                    block = [text]
+                    continue
+                # 单行JSON
+                record = _loads(text, path)
+                if record is not None:
+                    yield record
+            else:
+                text = line.rstrip()
+                block.append(text)
+                if text == '}':
+                    record = _loads('\n'.join(block), path)
+                    block = None
+                    if record is not None:
+                        yield record
+
+
+def _loads(text, path):
+    try:
+        record = json.loads(text)
+    except ValueError:
+        logger.debug(f"{path}: 跳过无法解析的JSON块")
+        return None
+    return record if isinstance(record, dict) else None
+
+
+def iter_json_records(path):
+    """读取 save_results_to_file 生成的JSON文件（单次结果或结果列表）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        content = json.load(f)
+    records = content if isinstance(content, list) else [content]
+    for record in records:
+        if isinstance(record, dict):
+            yield record
+
+
+def _csv_value(text):
+    if text == '':
+        return None
+    if text in ('True', 'False'):
+        return text == 'True'
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def iter_csv_records(path):
+    """读取 save_results_to_file 生成的CSV文件（timestamp 列加每个标签一列）"""
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            timestamp = row.pop('timestamp', '')
+            yield {'timestamp': timestamp, 'data': {tag: _csv_value(value) for tag, value in row.items()}}
+
+
+def iter_records(path):
+    """按扩展名选择解析方式"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.json':
+        return iter_json_records(path)
+    if ext == '.csv':
+        return iter_csv_records(path)
+    return iter_log_records(path)
+
+
+def iter_file_rows(path, all_samples, stats):
+    """逐条产生文件中的样本行 (时间戳, 标签, 值)，解析统计写入 stats
+
+    默认与 SQLite 存储的 changes 方式一致：文件中第一条快照写入全部标签，之后只写入变化的标签；
+    all_samples 为 True 时每条快照写入全部标签。与上一条时间戳相同的重复快照跳过
+    （不相邻的重复在合并时按 (标签, 时间戳) 去重）
+    """
+    previous = None
+    last_ts = None
+    for record in iter_records(path):
+        ts = parse_timestamp(record.get('timestamp'))
+        if ts is None:
+            stats['invalid'] += 1
+            continue
+        if ts == last_ts:
+            stats['duplicates'] += 1
+            continue
+        last_ts = ts
+        stats['records'] += 1
+        values = flatten_data(record)
+        names = values if previous is None or all_samples else diff_values(previous, values)
+        previous = values
+        for name in names:
+            yield ts, name, encode_sample(values[name])
+
+
+def parse_file(path, staging, all_samples=False):
+    """解析一个文件（在工作进程中执行），样本行按批写入暂存数据库 staging，返回 (路径, 暂存文件, 行数, 统计)
+
+    内存中最多保留一批行，多 GB 的日志也不会整体载入内存或在进程间传递；
+    读取出错时保留已解析的行，暂存数据库出错时不返回暂存文件（暂存文件为 None）
+    """
+    stats = {'records': 0, 'duplicates': 0, 'invalid': 0}
+    count = 0
+    try:
+        conn = sqlite3.connect(staging)
+        try:
+            # 暂存文件只在导入期间使用，不需要日志和同步
+            conn.execute("PRAGMA journal_mode=OFF")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("CREATE TABLE samples (ts REAL, tag TEXT, value)")
+            rows = iter_file_rows(path, all_samples, stats)
+            try:
+                while True:
+                    batch = list(islice(rows, INSERT_BATCH))
+                    if not batch:
+                        break
+                    conn.executemany("INSERT INTO samples VALUES (?, ?, ?)", batch)
+                    count += len(batch)
+            except (OSError, ValueError, csv.Error) as e:
+                stats['error'] = str(e)
+            conn.commit()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        stats['error'] = f"暂存数据库错误: {e}"
+        return path, None, 0, stats
+    return path, staging, count, stats
+
+
+def expand_paths(patterns):
+    """展开通配符和目录（目录下的 plc_data_*.log 及 JSON/CSV 文件）"""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for name in ('plc_data_*.log', '*.json', '*.csv'):
+                paths.extend(glob.glob(os.path.join(pattern, name)))
+        else:
+            paths.extend(glob.glob(pattern) or [pattern])
+    # 大文件先提交，进程池的尾部等待更短
+    unique = sorted(set(paths), key=lambda p: os.path.getsize(p) if os.path.exists(p) else 0, reverse=True)
+    return unique
+
+
+class HistoryImporter:
+    """把解析结果写入 SQLite 存储（工作进程写入各自的暂存文件，汇总到临时表后去重合并）"""
+
+    def __init__(self, db_path, workers=None, all_samples=False):
+        self.db_path = db_path
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.all_samples = all_samples
+        self.stats = {'files': 0, 'failed_files': 0, 'records': 0, 'duplicates': 0,
+                      'invalid': 0, 'parsed_rows': 0, 'inserted': 0}
+
+    def run(self, paths):
+        """导入文件列表，返回统计"""
+        started = time.monotonic()
+        # 暂存文件放在数据库旁边（系统临时目录可能在内存中）
+        staging_dir = tempfile.mkdtemp(prefix='history_import_',
+                                       dir=os.path.dirname(os.path.abspath(self.db_path)))
+        conn = SQLiteSink(self.db_path).connect()
+        try:
+            # 导入期间放宽同步，写入在最后一个事务中一并提交
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("CREATE TEMP TABLE import_samples (ts REAL, tag TEXT, value)")
+            for path, staging, count, stats in self._parse_all(paths, staging_dir):
+                try:
+                    self._load_staging(conn, staging)
+                except sqlite3.Error as e:
+                    stats['error'] = f"载入暂存数据时发生错误: {e}"
+                    count = 0
+                self._collect(path, count, stats)
+            self.stats['inserted'] = self._merge(conn)
+        finally:
+            conn.close()
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        self.stats['elapsed_s'] = round(time.monotonic() - started, 2)
+        return self.stats
+
+    def _parse_all(self, paths, staging_dir):
+        stagings = [os.path.join(staging_dir, f'{index}.db') for index in range(len(paths))]
+        if self.workers <= 1 or len(paths) <= 1:
+            for path, staging in zip(paths, stagings):
+                yield parse_file(path, staging, self.all_samples)
+            return
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(paths))) as pool:
+            futures = {pool.submit(parse_file, path, staging, self.all_samples): path
+                       for path, staging in zip(paths, stagings)}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # 单个文件的意外错误（包括工作进程异常退出）只计为该文件失败，继续导入其他文件
+                    result = (futures[future], None, 0, {'records': 0, 'duplicates': 0, 'invalid': 0,
+                                                         'error': f"{type(e).__name__}: {e}"})
+                yield result
+
+    @staticmethod
+    def _load_staging(conn, staging):
+        """把一个暂存文件中的行复制到临时表（在 SQLite 内部完成，不经过 Python 对象），然后删除暂存文件"""
+        if staging is None or not os.path.exists(staging):
+            return
+        conn.execute("ATTACH DATABASE ? AS staging", (staging,))
+        try:
+            with conn:
+                conn.execute("INSERT INTO import_samples SELECT ts, tag, value FROM staging.samples")
+        finally:
+            conn.execute("DETACH DATABASE staging")
+        os.remove(staging)
+
+    def _collect(self, path, count, stats):
+        if 'error' in stats:
+            self.stats['failed_files'] += 1
+            logger.error(f"文件解析失败: {path} ({stats['error']})")
+        else:
+            self.stats['files'] += 1
+        self.stats['records'] += stats['records']
+        self.stats['duplicates'] += stats['duplicates']
+        self.stats['invalid'] += stats['invalid']
+        self.stats['parsed_rows'] += count
+        logger.info(f"已解析: {path}（{stats['records']} 条快照，{count} 行）")
+
+    def _merge(self, conn):
+        """去重后合并到 samples 表：同一标签和时间戳只保留一行，已存在于库中的跳过"""
+        before = conn.total_changes
+        with conn:
+            conn.execute("CREATE INDEX temp.idx_import ON import_samples (tag, ts)")
+            # 不同文件之间的重复快照在这里去重（GROUP BY），与库中已有数据的重复通过 (tag, ts) 索引排除
+            conn.execute(
+                "INSERT INTO samples (ts, tag, value) "
+                "SELECT i.ts, i.tag, i.value FROM import_samples i "
+                "WHERE NOT EXISTS (SELECT 1 FROM samples s WHERE s.tag = i.tag AND s.ts = i.ts) "
+                "GROUP BY i.tag, i.ts ORDER BY i.tag, i.ts")
+        return conn.total_changes - before
+
+
+def main(argv=None):
+    """命令行：python3 history_import.py plc_data_*.log continuous_data_*.json --db plc_data.db"""
+    parser = argparse.ArgumentParser(description="历史日志批量导入 SQLite 存储")
+    parser.add_argument('paths', nargs='+', help="日志/JSON/CSV 文件、通配符或目录")
+    parser.add_argument('--db', default=SQLITE_SINK_CONFIG.get('path', 'plc_data.db'), help="SQLite 数据库文件")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="并行解析进程数")
+    parser.add_argument('--all-samples', action='store_true', help="每条快照写入全部标签（默认只写入变化的标签）")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    paths = expand_paths(args.paths)
+    if not paths:
+        logger.error("没有找到要导入的文件")
+        return 1
+    logger.info(f"开始导入 {len(paths)} 个文件到 {args.db}，{args.workers} 个进程")
+    try:
+        stats = HistoryImporter(args.db, args.workers, args.all_samples).run(paths)
+    except sqlite3.Error as e:
+        logger.error(f"写入数据库失败: {e}")
+        return 1
+    logger.info(f"导入完成: {stats}")
+    return 0 if stats['failed_files'] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+端到端延迟跟踪
+每次采集记录读取开始/结束的 Unix 纳秒时间戳和各阶段的 monotonic 时间戳，
+发布后按消息ID等待 PUBACK，统计 读取 -> 解码 -> 处理 -> 发布 -> 确认 各阶段和全程的延迟分位数
+"""
+
+import time
+import threading
+from collections import deque
+
+# 阶段: (名称, 起点标记, 终点标记)
+SEGMENTS = (
+    ('read', 'read_start', 'read_end'),        # PLC读取
+    ('decode', 'read_end', 'decoded'),         # 解码
+    ('process', 'decoded', 'enqueued'),        # 变化检测、计算标签、报警规则等
+    ('publish', 'enqueued', 'published'),      # 序列化并交给MQTT客户端（包括背压等待）
+    ('ack', 'published', 'acked'),             # 等待服务器 PUBACK
+    ('total', 'read_start', 'acked'),          # 全程
+)
+
+# 发布时即可计算的阶段（其余在收到 PUBACK 后计算）
+PUBLISH_SEGMENTS = SEGMENTS[:4]
+ACK_SEGMENTS = SEGMENTS[4:]
+
+
+def percentiles(values, points=(50, 95, 99)):
+    """返回 {'p50': ..., 'p95': ..., 'p99': ..., 'max': ...}（最近秩法），无数据时返回空字典"""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    result = {f'p{p}': round(ordered[min(len(ordered) - 1, max(0, -(-len(ordered) * p // 100) - 1))], 2)
+              for p in points}
+    result['max'] = round(ordered[-1], 2)
+    return result
+
+
+class AcquisitionStamps:
+    """一次采集的时间戳：读取开始/结束的 Unix 纳秒时间和各阶段的 monotonic 纳秒时间"""
+
+    __slots__ = ('read_start_ns', 'read_end_ns', 'marks')
+
+    def __init__(self):
+        self.read_start_ns = time.time_ns()
+        self.read_end_ns = None
+        self.marks = {'read_start': time.monotonic_ns()}
+
+    def end_read(self):
+        self.read_end_ns = time.time_ns()
+        self.marks['read_end'] = time.monotonic_ns()
+
+    def mark(self, name, now=None):
+        self.marks[name] = time.monotonic_ns() if now is None else now
+
+    def elapsed_ms(self, start, end):
+        marks = self.marks
+        if start in marks and end in marks:
+            return (marks[end] - marks[start]) / 1e6
+        return None
+
+    def payload_fields(self):
+        """发布消息中附带的采集时间（Unix 纳秒）和已完成阶段的耗时（微秒）"""
+        stages = {}
+        for name, start, end in PUBLISH_SEGMENTS:
+            elapsed = self.elapsed_ms(start, end)
+            if elapsed is not None:
+                stages[name] = int(elapsed * 1000)
+        return {'read_start_ns': self.read_start_ns, 'read_end_ns': self.read_end_ns, 'stages_us': stages}
+
+
+class LatencyTracker:
+    """各阶段延迟统计（最近 window 条消息）"""
+
+    def __init__(self, window=2000, max_pending=10000):
+        self.window = window
+        self.max_pending = max_pending
+        self.samples = {name: deque(maxlen=window) for name, _, _ in SEGMENTS}
+        # 等待 PUBACK 的消息：mid -> 时间戳；PUBACK 可能先于 publish() 返回到达，先记下确认时刻
+        # （paho 的消息ID循环复用，只接受发布开始之后的确认）
+        self.pending = {}
+        self.early_acks = {}
+        # PUBACK 回调在 paho 网络线程中调用
+        self.lock = threading.Lock()
+        self.stats = {'tracked': 0, 'acked': 0, 'expired': 0}
+
+    @classmethod
+    def from_config(cls, config):
+        """根据 LATENCY_CONFIG 创建"""
+        return cls(window=config.get('window', 2000), max_pending=config.get('max_pending', 10000))
+
+    def record(self, stamps):
+        """记录发布时已完成的各阶段"""
+        with self.lock:
+            for name, start, end in PUBLISH_SEGMENTS:
+                elapsed = stamps.elapsed_ms(start, end)
+                if elapsed is not None:
+                    self.samples[name].append(elapsed)
+
+    def track(self, mid, stamps):
+        """等待消息 mid 的 PUBACK"""
+        with self.lock:
+            self.stats['tracked'] += 1
+            acked = self.early_acks.pop(mid, None)
+            if acked is not None and acked >= stamps.marks.get('enqueued', stamps.marks['read_start']):
+                self._finish(stamps, acked)
+                return
+            # 早于本次发布的确认属于之前复用同一消息ID的其他消息，忽略
+            if len(self.pending) >= self.max_pending:
+                # 长时间未确认（如QoS 0或断线）的最旧消息不再等待
+                self.pending.pop(next(iter(self.pending)))
+                self.stats['expired'] += 1
+            self.pending[mid] = stamps
+
+    def acknowledge(self, mid):
+        """PUBACK 回调"""
+        now = time.monotonic_ns()
+        with self.lock:
+            stamps = self.pending.pop(mid, None)
+            if stamps is None:
+                # 也可能是未跟踪的消息（报警、按标签发布等），数量有上限
+                if len(self.early_acks) >= self.max_pending:
+                    self.early_acks.clear()
+                self.early_acks[mid] = now
+                return
+            self._finish(stamps, now)
+
+    def _finish(self, stamps, acked):
+        # 先于 publish() 返回到达的确认按发布完成时刻计，确认阶段不出现负值
+        stamps.mark('acked', max(acked, stamps.marks.get('published', acked)))
+        self.stats['acked'] += 1
+        for name, start, end in ACK_SEGMENTS:
+            elapsed = stamps.elapsed_ms(start, end)
+            if elapsed is not None:
+                self.samples[name].append(elapsed)
+
+    def get_report(self):
+        """各阶段延迟分位数（毫秒）"""
+        with self.lock:
+            report = {name: dict(percentiles(list(values)), count=len(values))
+                      for name, values in self.samples.items()}
+            report['pending'] = len(self.pending)
+            report.update(self.stats)
+        return report
@@ -0,0 +1,517 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多PLC负载测试
+在本机启动 N 台模拟PLC（进程内的模拟 snap7 客户端，或 snap7 服务器，DB9000 布局）和
+一个最小的本地MQTT代理，用分片采集（FleetSupervisor）按指定周期和变化密度采集，
+逐级增加PLC数量，报告每级的发布吞吐、CPU/内存占用（总计和每台PLC）和端到端延迟，
+找出单个实例的饱和点。全部在本机离线运行（CPU/内存统计读取 /proc，需 Linux）
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import signal
+import struct
+import asyncio
+import logging
+import argparse
+import threading
+import multiprocessing
+from functools import partial
+
+from async_logging import setup_logging
+from latency_tracker import percentiles
+
+logger = logging.getLogger(__name__)
+
+LOG_FILE = 'load_test.log'
+
+# DB9000 布局（与 TAG_CONFIG 一致）：B1-B32 在 0-3，String[20] 在 4，DInt 在 26/30，Int 在 34/36
+DB_NUMBER = 9000
+DB_SIZE = 38
+STRING_OFFSET = 4
+STRING_LENGTH = 20
+# dint1 写入数据变化时刻（毫秒，对 2^31 取模），代理收到消息时据此计算端到端延迟
+STAMP_TAG = 'dint1'
+STAMP_OFFSET = 26
+STAMP_MODULUS = 2 ** 31
+INT1_OFFSET = 34
+
+# 延迟超过采集周期或送达率低于该值时判定为饱和
+MIN_DELIVERY_RATIO = 0.9
+
+# MQTT 报文类型
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+
+def stamp_now():
+    return int(time.time() * 1000) % STAMP_MODULUS
+
+
+class VirtualPLC:
+    """DB9000 数据块模拟：每个周期按变化密度决定是否改变数据"""
+
+    def __init__(self, change_density=1.0, seed=None):
+        self.change_density = change_density
+        self.rng = random.Random(seed)
+        self.data = bytearray(DB_SIZE)
+        self.data[STRING_OFFSET] = STRING_LENGTH
+        text = b'VIRTUAL'
+        self.data[STRING_OFFSET + 1] = len(text)
+        self.data[STRING_OFFSET + 2:STRING_OFFSET + 2 + len(text)] = text
+
+    def tick(self):
+        """推进一个周期，数据变化时返回 True"""
+        if self.rng.random() >= self.change_density:
+            return False
+        self.data[self.rng.randrange(4)] ^= 1 << self.rng.randrange(8)
+        struct.pack_into('>h', self.data, INT1_OFFSET, self.rng.randint(-1000, 1000))
+        struct.pack_into('>i', self.data, STAMP_OFFSET, stamp_now())
+        return True
+
+
+class VirtualPLCClient:
+    """进程内模拟的 snap7 客户端：每次读取推进一个周期（接口与 snap7.client.Client 的子集一致）"""
+
+    def __init__(self, change_density=1.0):
+        self.plc = VirtualPLC(change_density)
+        self.connected = False
+
+    def connect(self, address, rack, slot, tcp_port=102):
+        self.connected = True
+
+    def get_connected(self):
+        return self.connected
+
+    def disconnect(self):
+        self.connected = False
+
+    def get_pdu_length(self):
+        return 480
+
+    def db_read(self, db_number, start, size):
+        if not self.connected:
+            raise ConnectionError("未连接")
+        if db_number != DB_NUMBER or start + size > DB_SIZE:
+            raise IOError(f"地址越界: DB{db_number} {start}+{size}")
+        self.plc.tick()
+        return bytearray(self.plc.data[start:start + size])
+
+
+def _exit_process(signum, frame):
+    raise SystemExit(0)
+
+
+def server_main(ports, interval_seconds, change_density, ready):
+    """模拟PLC进程：每个端口一个 snap7 服务器，按周期更新数据块"""
+    signal.signal(signal.SIGTERM, _exit_process)
+    import ctypes
+    from snap7.server import Server
+    from snap7.type import SrvArea
+
+    servers = []
+    plcs = []
+    try:
+        for port in ports:
+            plc = VirtualPLC(change_density)
+            area = (ctypes.c_ubyte * DB_SIZE).from_buffer(plc.data)
+            server = Server(log=False)
+            server.register_area(SrvArea.DB, DB_NUMBER, area)
+            server.start(tcp_port=port)
+            servers.append((server, area))
+            plcs.append(plc)
+        ready.set()
+        next_tick = time.monotonic()
+        while True:
+            for plc in plcs:
+                plc.tick()
+            next_tick += interval_seconds
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+    finally:
+        for server, _ in servers:
+            try:
+                server.stop()
+                server.destroy()
+            except Exception:
+                pass
+
+
+class LocalBroker:
+    """最小的 MQTT 3.1.1 代理（负载测试用）
+
+    支持 CONNECT、QoS 0/1/2 的 PUBLISH、SUBSCRIBE（含 + 和 # 通配符，按 QoS 0 转发）和心跳；
+    不支持保留消息、会话保持和认证。统计收到的消息数、字节数和延迟探针
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        self.subscriptions = {}   # writer -> 订阅主题过滤器列表
+        self.reset()
+
+    def reset(self):
+        self.started = time.monotonic()
+        self.messages = 0
+        self.bytes = 0
+        self.latencies = []
+
+    def snapshot(self):
+        elapsed = time.monotonic() - self.started
+        return {
+            'messages': self.messages,
+            'bytes': self.bytes,
+            'elapsed_s': round(elapsed, 3),
+            'rate': round(self.messages / elapsed, 1) if elapsed > 0 else 0.0,
+            'latency_ms': percentiles(self.latencies),
+            'clients': len(self.subscriptions),
+        }
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def handle(self, reader, writer):
+        self.subscriptions[writer] = []
+        try:
+            while True:
+                header = await reader.readexactly(1)
+                length, multiplier = 0, 1
+                while True:
+                    byte = (await reader.readexactly(1))[0]
+                    length += (byte & 0x7F) * multiplier
+                    multiplier *= 128
+                    if not byte & 0x80:
+                        break
+                body = await reader.readexactly(length) if length else b''
+                if not self.dispatch(header[0], body, writer):
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.subscriptions.pop(writer, None)
+            writer.close()
+
+    def dispatch(self, first, body, writer):
+        """处理一个报文，返回 False 时关闭连接"""
+        kind = first >> 4
+        if kind == PUBLISH:
+            self.on_publish(first, body, writer)
+        elif kind == CONNECT:
+            writer.write(bytes((CONNACK << 4, 2, 0, 0)))
+        elif kind == PUBREL:
+            writer.write(bytes((PUBCOMP << 4, 2)) + body[:2])
+        elif kind == SUBSCRIBE:
+            packet_id, filters, offset = body[:2], [], 2
+            while offset < len(body):
+                size = struct.unpack_from('>H', body, offset)[0]
+                filters.append(body[offset + 2:offset + 2 + size].decode('utf-8'))
+                offset += 3 + size
+            self.subscriptions[writer].extend(filters)
+            writer.write(bytes((SUBACK << 4, 2 + len(filters))) + packet_id + bytes(len(filters)))
+        elif kind == UNSUBSCRIBE:
+            writer.write(bytes((UNSUBACK << 4, 2)) + body[:2])
+        elif kind == PINGREQ:
+            writer.write(bytes((PINGRESP << 4, 0)))
+        elif kind == DISCONNECT:
+            return False
+        return True
+
+    def on_publish(self, first, body, writer):
+        qos = (first >> 1) & 0x03
+        size = struct.unpack_from('>H', body)[0]
+        topic = body[2:2 + size].decode('utf-8')
+        offset = 2 + size
+        if qos:
+            packet_id = body[offset:offset + 2]
+            offset += 2
+            writer.write(bytes(((PUBACK if qos == 1 else PUBREC) << 4, 2)) + packet_id)
+        payload = body[offset:]
+        self.messages += 1
+        self.bytes += len(payload)
+        self.probe_latency(payload)
+        self.forward(topic, payload)
+
+    def probe_latency(self, payload):
+        try:
+            stamp = json.loads(payload)['data'][STAMP_TAG]
+        except (ValueError, KeyError, TypeError):
+            return
+        if isinstance(stamp, int):
+            self.latencies.append((stamp_now() - stamp) % STAMP_MODULUS)
+
+    def forward(self, topic, payload):
+        targets = [writer for writer, filters in self.subscriptions.items()
+                   if any(topic_matches(f, topic) for f in filters)]
+        if not targets:
+            return
+        variable = struct.pack('>H', len(topic)) + topic.encode('utf-8') + payload
+        packet = bytes((PUBLISH << 4,)) + encode_length(len(variable)) + variable
+        for writer in targets:
+            writer.write(packet)
+
+
+def encode_length(length):
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | (0x80 if length else 0))
+        if not length:
+            return bytes(encoded)
+
+
+def topic_matches(pattern, topic):
+    """MQTT 主题过滤器匹配（+ 匹配一级，# 匹配其余各级）"""
+    pattern_parts = pattern.split('/')
+    topic_parts = topic.split('/')
+    for index, part in enumerate(pattern_parts):
+        if part == '#':
+            return True
+        if index >= len(topic_parts) or (part != '+' and part != topic_parts[index]):
+            return False
+    return len(pattern_parts) == len(topic_parts)
+
+
+def broker_main(port, conn):
+    """代理进程：通过管道接收 'reset'、'stats'、'stop' 命令"""
+    signal.signal(signal.SIGTERM, _exit_process)
+    broker = LocalBroker(port=port)
+    loop = asyncio.new_event_loop()
+    stopped = loop.create_future()
+
+    def on_command():
+        command = conn.recv()
+        if command == 'reset':
+            broker.reset()
+            conn.send(True)
+        elif command == 'stats':
+            conn.send(broker.snapshot())
+        elif command == 'stop' and not stopped.done():
+            stopped.set_result(None)
+
+    conn.send(loop.run_until_complete(broker.start()))
+    loop.add_reader(conn.fileno(), on_command)
+    try:
+        loop.run_until_complete(stopped)
+    finally:
+        loop.remove_reader(conn.fileno())
+        broker.server.close()
+        # 关闭各连接后连接处理协程读到连接结束自行退出（取消协程会使 asyncio 打印异常）
+        for writer in list(broker.subscriptions):
+            writer.close()
+        tasks = asyncio.all_tasks(loop)
+        if tasks:
+            loop.run_until_complete(asyncio.wait(tasks, timeout=2))
+        loop.close()
+
+
+class BrokerProcess:
+    """在独立进程中运行本地代理，避免与被测的采集进程争用 CPU"""
+
+    def __init__(self, port=0):
+        context = multiprocessing.get_context('spawn')
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=broker_main, args=(port, child), name='load-test-broker', daemon=True)
+        self.process.start()
+        self.port = self.conn.recv()
+
+    def call(self, command):
+        self.conn.send(command)
+        return self.conn.recv()
+
+    def stop(self):
+        self.conn.send('stop')
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+def process_usage(pids):
+    """读取 /proc 中各进程的累计 CPU 时间（秒）和常驻内存（字节）之和"""
+    ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+    cpu = rss = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            cpu += (int(fields[11]) + int(fields[12])) / ticks
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        rss += int(line.split()[1]) * 1024
+                        break
+        except (OSError, IndexError, ValueError):
+            continue
+    return cpu, rss
+
+
+def run_step(publisher, broker, plcs, options):
+    """运行一级负载，返回该级的测量结果"""
+    # 分片采集在导入时读取配置，需在日志配置之后导入
+    from fleet_supervisor import FleetSupervisor
+
+    endpoints = []
+    for index in range(plcs):
+        name = f'VPLC_{index:04d}'
+        endpoint = {'name': name, 'ip': '127.0.0.1', 'topic': f'{options.topic}/{name}'}
+        if options.mode == 'server':
+            endpoint['port'] = options.base_port + index
+        endpoints.append(endpoint)
+    fleet_config = {
+        'workers': options.workers,
+        'interval_seconds': options.interval,
+        'ring_size': options.ring_size,
+        'reconnect_interval': 1,
+        'max_restarts': 5,
+        'restart_window': 60,
+        'endpoints': endpoints,
+    }
+
+    server = None
+    client_factory = None
+    if options.mode == 'server':
+        context = multiprocessing.get_context('spawn')
+        ready = context.Event()
+        server = context.Process(target=server_main, name='load-test-plcs', daemon=True,
+                                 args=([e['port'] for e in endpoints], options.interval, options.density, ready))
+        server.start()
+        if not ready.wait(30):
+            raise RuntimeError("模拟PLC服务器启动超时")
+    else:
+        client_factory = partial(VirtualPLCClient, change_density=options.density)
+
+    supervisor = FleetSupervisor(publisher, fleet_config, client_factory=client_factory)
+    supervisor.start()
+    runner = threading.Thread(target=supervisor.run, name='fleet-run', daemon=True)
+    runner.start()
+    try:
+        time.sleep(options.warmup)
+        pids = [os.getpid()] + [slot.process.pid for slot in supervisor.slots]
+        cpu_before, _ = process_usage(pids)
+        broker.call('reset')
+        started = time.monotonic()
+        time.sleep(options.duration)
+        elapsed = time.monotonic() - started
+        stats = broker.call('stats')
+        cpu_after, rss = process_usage(pids)
+    finally:
+        supervisor.running = False
+        runner.join(timeout=30)
+        if server is not None:
+            server.terminate()
+            server.join(timeout=5)
+
+    expected = plcs * options.density / options.interval
+    cpu_percent = (cpu_after - cpu_before) / elapsed * 100
+    latency = stats['latency_ms']
+    result = {
+        'plcs': plcs,
+        'workers': len(pids) - 1,
+        'expected_rate': round(expected, 1),
+        'delivered_rate': stats['rate'],
+        'delivery_ratio': round(stats['rate'] / expected, 3) if expected else 1.0,
+        'cpu_percent': round(cpu_percent, 1),
+        'cpu_percent_per_plc': round(cpu_percent / plcs, 3),
+        'rss_mb': round(rss / 1048576, 1),
+        'rss_mb_per_plc': round(rss / 1048576 / plcs, 3),
+        'latency_ms': latency,
+        'bytes_per_second': round(stats['bytes'] / elapsed, 1),
+    }
+    reasons = []
+    if result['delivery_ratio'] < MIN_DELIVERY_RATIO:
+        reasons.append(f"送达率 {result['delivery_ratio']:.0%}")
+    if latency.get('p95', 0) > options.interval * 1000:
+        reasons.append(f"p95 延迟 {latency['p95']} ms 超过采集周期")
+    result['saturated'] = bool(reasons)
+    result['reason'] = '，'.join(reasons)
+    return result
+
+
+def print_report(results):
+    print(f"{'PLC数':>6} {'期望/秒':>9} {'送达/秒':>9} {'送达率':>7} {'CPU%':>7} {'CPU%/台':>8} "
+          f"{'内存MB':>8} {'MB/台':>7} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8}  状态")
+    for r in results:
+        latency = r['latency_ms']
+        print(f"{r['plcs']:>6} {r['expected_rate']:>9} {r['delivered_rate']:>9} {r['delivery_ratio']:>7.1%} "
+              f"{r['cpu_percent']:>7} {r['cpu_percent_per_plc']:>8} {r['rss_mb']:>8} {r['rss_mb_per_plc']:>7} "
+              f"{latency.get('p50', '-'):>8} {latency.get('p95', '-'):>8} {latency.get('p99', '-'):>8}  "
+              f"{'饱和: ' + r['reason'] if r['saturated'] else '正常'}")
+
+
+def main(argv=None):
+    """命令行：python3 load_test.py --plcs 10,50,100,200 --interval 1 --density 0.5"""
+    parser = argparse.ArgumentParser(description="多PLC负载测试（模拟PLC + 本地MQTT代理）")
+    parser.add_argument('--plcs', default='10,50,100,200', help="各级PLC数量，逗号分隔")
+    parser.add_argument('--interval', type=float, default=1.0, help="每台PLC的采集周期（秒）")
+    parser.add_argument('--density', type=float, default=0.5, help="变化密度：每个周期数据变化的概率（0-1）")
+    parser.add_argument('--duration', type=float, default=30.0, help="每级测量时长（秒）")
+    parser.add_argument('--warmup', type=float, default=5.0, help="每级开始测量前的预热时长（秒）")
+    parser.add_argument('--workers', type=int, default=0, help="采集工作进程数（0表示CPU核心数）")
+    parser.add_argument('--mode', choices=('client', 'server'), default='client',
+                        help="client: 进程内模拟客户端; server: snap7 服务器（经本机TCP）")
+    parser.add_argument('--base-port', type=int, default=10102, help="server 模式下第一台模拟PLC的端口")
+    parser.add_argument('--broker-port', type=int, default=0, help="本地MQTT代理端口（0表示自动选择）")
+    parser.add_argument('--ring-size', type=int, default=4 * 1024 * 1024, help="每个工作进程的环形缓冲区大小（字节）")
+    parser.add_argument('--topic', default='loadtest', help="发布主题前缀")
+    parser.add_argument('--all-steps', action='store_true', help="饱和后继续运行后续各级")
+    parser.add_argument('--report', default='load_test_report.json', help="JSON报告文件")
+    args = parser.parse_args(argv)
+    try:
+        steps = [int(value) for value in args.plcs.split(',') if value.strip()]
+    except ValueError:
+        parser.error(f"PLC数量无效: {args.plcs}")
+    if not 0 < args.density <= 1:
+        parser.error(f"变化密度无效: {args.density}")
+
+    setup_logging(LOG_FILE)
+    broker = BrokerProcess(args.broker_port)
+    logger.info(f"本地MQTT代理已启动: 127.0.0.1:{broker.port}")
+
+    # 日志配置完成后再导入发布器，避免其模块级日志配置生效
+    from plc_mqtt_publisher_optimized import PLCMQTTPublisherOptimized
+    publisher = PLCMQTTPublisherOptimized()
+    results = []
+    try:
+        if not publisher.connect_mqtt('127.0.0.1', broker.port):
+            print("无法连接到本地MQTT代理")
+            return 1
+        deadline = time.monotonic() + 5
+        while not publisher.mqtt_connected and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        for plcs in steps:
+            logger.info(f"负载测试: {plcs} 台PLC，周期 {args.interval} 秒，变化密度 {args.density}")
+            result = run_step(publisher, broker, plcs, args)
+            results.append(result)
+            logger.info(f"负载测试结果: {result}")
+            if result['saturated'] and not args.all_steps:
+                break
+    except KeyboardInterrupt:
+        logger.info("用户中断负载测试")
+    finally:
+        publisher.disconnect_mqtt()
+        broker.stop()
+
+    if results:
+        print_report(results)
+        healthy = [r['plcs'] for r in results if not r['saturated']]
+        saturated = [r['plcs'] for r in results if r['saturated']]
+        summary = {
+            'options': vars(args),
+            'steps': results,
+            'max_healthy_plcs': max(healthy) if healthy else 0,
+            'saturation_plcs': min(saturated) if saturated else None,
+        }
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"\n未饱和的最大PLC数: {summary['max_healthy_plcs']}，"
+              f"饱和点: {summary['saturation_plcs'] or '未达到'}，报告: {args.report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,6 +12,9 @@ import json
 import logging
 from datetime import datetime
 import os
+from console_input import prompt_float
+from historian import Historian
+from config import HISTORIAN_CONFIG
 
 # 配置日志
 log_filename = f"plc_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
@@ -33,6 +36,8 @@ class PLCLogger:
         self.plc_client = snap7.client.Client()
         self.plc_connected = False
         self.running = False
+        # 历史数据压缩归档（按需启用）
+        self.historian = Historian.from_config(HISTORIAN_CONFIG) if HISTORIAN_CONFIG.get('enabled') else None
         
     def connect_plc(self):
         """连接到PLC"""
@@ -198,6 +203,8 @@ class PLCLogger:
                 if data:
                     collect_count += 1
                     logger.info(f"成功记录第 {collect_count} 条数据")
+                    if self.historian:
+                        self.historian.record(data)
                 else:
                     logger.error("数据读取失败")
                 
@@ -209,6 +216,9 @@ class PLCLogger:
             logger.error(f"数据记录过程中发生错误: {e}")
         finally:
             self.running = False
+            if self.historian:
+                self.historian.close()
+                logger.info(f"历史数据归档统计: {self.historian.get_stats()}")
     
     def stop_logging(self):
         """停止数据记录"""
@@ -231,7 +241,7 @@ def main():
             return
         
         # 询问记录参数
-        interval = int(input("请输入记录间隔（秒，默认2）: ").strip() or "2")
+        interval = prompt_float("请输入记录间隔（秒，默认2）: ", 2, 'PLC_SCAN_INTERVAL')
         
         print(f"\n开始数据记录...")
         print(f"PLC IP: 172.16.10.66")
@@ -13,6 +13,7 @@ import logging
 from datetime import datetime
 import paho.mqtt.client as mqtt
 import threading
+from console_input import prompt_float
 
 # 配置日志
 logging.basicConfig(
@@ -350,7 +351,7 @@ def main():
             return
         
         # 询问采集参数
-        interval = int(input("请输入采集间隔（秒，默认2）: ").strip() or "2")
+        interval = prompt_float("请输入采集间隔（秒，默认2）: ", 2, 'PLC_SCAN_INTERVAL')
         
         print(f"\n开始数据采集和发布...")
         print(f"PLC IP: 172.16.10.66")
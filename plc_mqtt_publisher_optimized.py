@@ -10,21 +10,42 @@ import struct
 import time
 import json
 import logging
-from datetime import datetime
 import paho.mqtt.client as mqtt
 import threading
 import hashlib
+from adaptive_poller import AdaptivePoller
+from burst_capture import BurstCapture
+from rule_engine import RuleEngine
+from computed_tags import ComputedTagEngine
+from tag_utils import flatten_data, diff_values
+from async_logging import setup_logging, get_dropped_count, SampledLogger
+from read_plan import ReadPlan
+from config_watcher import ConfigWatcher
+from profiling_hooks import ScanProfiler
+from publish_manager import PublishManager
+from snapshot_serializer import SnapshotSerializer, TimestampFormatter
+from dns_cache import get_dns_cache
+from broker_group import BrokerGroup
+from tag_topics import TagTopicPublisher
+from state_session import StateSession
+from block_reader import LargeBlockReader, save_snapshot
+from historian import Historian
+from sqlite_sink import SQLiteSink
+from scan_watchdog import ScanWatchdog
+from latency_tracker import LatencyTracker, AcquisitionStamps
+from connection_racer import race, tcp_probe, parse_endpoint, HealthMonitor, S7_PORT
+from console_input import prompt_float
+from config import (ADAPTIVE_POLL_CONFIG, BURST_CAPTURE_CONFIG, ALARM_RULES_CONFIG,
+                    COMPUTED_TAGS_CONFIG, TAG_CONFIG, RUNTIME_CONFIG, PROFILING_CONFIG,
+                    PUBLISH_CONFIG, FAILOVER_CONFIG, BROKER_GROUP_CONFIG, TAG_TOPICS_CONFIG,
+                    STATE_SESSION_CONFIG, LARGE_BLOCK_CONFIG, HISTORIAN_CONFIG,
+                    SQLITE_SINK_CONFIG, SCAN_WATCHDOG_CONFIG, LATENCY_CONFIG)
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('plc_mqtt_publisher_optimized.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+# 配置日志（经队列由后台线程写入文件和控制台，不阻塞采集线程）
+setup_logging('plc_mqtt_publisher_optimized.log')
 logger = logging.getLogger(__name__)
+# 每次扫描的明细日志限速采样输出
+scan_logger = SampledLogger(logging.getLogger(__name__ + '.scan'))
 
 class PLCMQTTPublisherOptimized:
     """PLC数据采集器 - MQTT发布优化版本"""
@@ -51,6 +72,72 @@ class PLCMQTTPublisherOptimized:
         self.data_change_count = 0
         self.total_read_count = 0
         
+        # 读取计划（一次块读取 + 预编译解码），支持运行时热切换
+        self.read_plan = ReadPlan.from_config(TAG_CONFIG)
+        # 按读取计划预编译的快照序列化器和按秒缓存的时间戳格式化
+        self.serializer = SnapshotSerializer.from_plan(self.read_plan)
+        self.format_timestamp = TimestampFormatter()
+        self.deadband_state = {}
+        # 上次完整读取的 (读取计划, 解码结果)，原始数据未变化时直接沿用
+        self.last_decoded = (None, None)
+        self.interval_seconds = 2
+        self.config_watcher = None
+        
+        # 标签级变化集合（供报警规则等增量计算使用）
+        self.last_values = None
+        
+        # 触发录波（独立连接，按需启动）
+        self.burst_capture = None
+        
+        # 计算标签和报警规则引擎
+        self.computed_tags = None
+        self.rule_engine = None
+        
+        # 订阅主题上的命令处理: 命令名 -> 处理函数(消息字典)
+        self.command_handlers = {}
+        
+        # 各扫描阶段的性能分析埋点（默认关闭）
+        self.profiler = ScanProfiler.from_config(PROFILING_CONFIG)
+        self.register_command('profile', self.handle_profile_command)
+        
+        # QoS 1 在途跟踪和发布背压（按需启用）
+        self.publish_manager = None
+        
+        # 按标签发布到主题树（按需启用）
+        self.tag_topics = None
+        
+        # 出生/死亡证书和增量序号（按需启用）
+        self.state_session = None
+        
+        # 大数据块并行读取（按需启用，通过命令触发快照）
+        self.block_reader = None
+        self.block_config = None
+        
+        # 历史数据压缩归档（按需启用）
+        self.historian = None
+        
+        # SQLite 本地存储（按需启用）
+        self.sqlite_sink = None
+        
+        # 扫描周期看门狗和过载降载（按需启用）
+        self.watchdog = None
+        
+        # 端到端延迟跟踪（按需启用）
+        self.latency_tracker = None
+        self.scan_stamps = None
+        
+        # 附加MQTT服务器分发（按需启用）
+        self.broker_group = None
+        
+        # 冗余连接和故障切换（按需启用）
+        self.failover_config = None
+        self.health_monitor = None
+        self.plc_endpoints = []
+        self.mqtt_endpoints = []
+        self.mqtt_endpoint = None
+        self.plc_failover_pending = False
+        self.mqtt_failover_lock = threading.Lock()
+        
         # 设置MQTT回调
         self.mqtt_client.on_connect = self.on_mqtt_connect
         self.mqtt_client.on_disconnect = self.on_mqtt_disconnect
@@ -82,23 +169,21 @@ class PLCMQTTPublisherOptimized:
             self.plc_connected = False
             logger.info("已断开PLC连接")
     
-    def connect_mqtt(self):
-        """连接到MQTT服务器"""
+    def connect_mqtt(self, broker=None, port=None):
+        """连接到MQTT服务器（未指定服务器和端口时使用环境变量或默认值）"""
         try:
-            import os, socket
-            broker = os.getenv('MQTT_BROKER', self.mqtt_broker)
-            port = int(os.getenv('MQTT_PORT', str(self.mqtt_port)))
+            import os
+            broker = broker or os.getenv('MQTT_BROKER', self.mqtt_broker)
+            port = port or int(os.getenv('MQTT_PORT', str(self.mqtt_port)))
+            self.mqtt_broker, self.mqtt_port = broker, port
             broker_ip = os.getenv('MQTT_BROKER_IP', '').strip()
 
-            # 解析域名
-            resolved_ip = None
-            try:
-                resolved_ip = socket.gethostbyname(broker)
-                logger.info(f"MQTT域名解析成功: {broker} -> {resolved_ip}")
-            except Exception as re:
-                logger.warning(f"MQTT域名解析失败: {broker} ({re})")
+            # 解析域名（使用缓存，重启时不等待DNS），直接连接解析出的IP
+            resolved_ip = get_dns_cache().resolve(broker)
+            if resolved_ip:
+                logger.info(f"MQTT域名解析: {broker} -> {resolved_ip}")
 
-            target_host = broker
+            target_host = resolved_ip or broker
             if not resolved_ip and broker_ip:
                 target_host = broker_ip
                 logger.info(f"使用备用直连IP连接MQTT: {target_host}:{port}")
@@ -119,8 +204,156 @@ class PLCMQTTPublisherOptimized:
             logger.error(f"MQTT连接错误: {e}")
             return False
     
+    def connect_parallel(self, timeout=10.0, broker=None, port=None):
+        """并行连接PLC和MQTT，返回 (PLC是否连接成功, MQTT是否连接成功)"""
+        results = {}
+        
+        def run(name, connect, *args):
+            results[name] = connect(*args)
+        
+        if self.health_monitor:
+            # 启用故障切换时在各冗余端点间竞速连接
+            plc_args, mqtt_args = (self.connect_plc_redundant,), (self.connect_mqtt_redundant,)
+        else:
+            plc_args, mqtt_args = (self.connect_plc,), (self.connect_mqtt, broker, port)
+        threads = [
+            threading.Thread(target=run, args=('plc',) + plc_args, name='connect-plc', daemon=True),
+            threading.Thread(target=run, args=('mqtt',) + mqtt_args, name='connect-mqtt', daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        return results.get('plc', False), results.get('mqtt', False)
+    
+    def setup_failover(self, failover_config=None):
+        """启用冗余端点竞速连接、后台健康检查和故障切换（需在连接之前调用）"""
+        config = failover_config or FAILOVER_CONFIG
+        self.failover_config = config
+        self.plc_endpoints = [parse_endpoint(ip, S7_PORT) for ip in config['plc_ips']]
+        self.mqtt_endpoints = []
+        for value in config['mqtt_endpoints']:
+            host, port = parse_endpoint(value, self.mqtt_port)
+            # 预先解析域名，健康检查和切换时不再等待DNS
+            self.mqtt_endpoints.append((get_dns_cache().resolve(host) or host, port))
+        
+        self.health_monitor = HealthMonitor(
+            self.plc_endpoints + self.mqtt_endpoints,
+            interval=config.get('health_interval', 1.0),
+            timeout=config.get('probe_timeout', 0.5),
+            fail_threshold=config.get('fail_threshold', 2))
+        self.health_monitor.on_unhealthy = self.on_endpoint_unhealthy
+        self.health_monitor.start()
+        
+        # 缩短 paho 自动重连的等待时间
+        reconnect_delay = config.get('reconnect_delay', 0.2)
+        self.mqtt_client.reconnect_delay_set(min_delay=reconnect_delay, max_delay=max(reconnect_delay, 5))
+        logger.info(f"故障切换已启用，PLC: {', '.join(ip for ip, _ in self.plc_endpoints)}，"
+                    f"MQTT: {', '.join(f'{h}:{p}' for h, p in self.mqtt_endpoints)}")
+    
+    def connect_plc_redundant(self):
+        """在冗余PLC地址间竞速连接，最先连接成功的地址胜出"""
+        config = self.failover_config
+        
+        def attempt(ip):
+            client = snap7.client.Client()
+            client.connect(ip, 0, 1)
+            if not client.get_connected():
+                raise ConnectionError(f"PLC连接失败: {ip}")
+            return client
+        
+        def cleanup(ip, client):
+            client.disconnect()
+        
+        endpoints = self.health_monitor.ordered(self.plc_endpoints)
+        logger.info(f"正在竞速连接PLC: {', '.join(ip for ip, _ in endpoints)}")
+        ip, client = race([(ip, lambda ip=ip: attempt(ip)) for ip, _ in endpoints],
+                          config.get('stagger', 0.25), config.get('connect_timeout', 3.0), cleanup)
+        if client is None:
+            logger.error("✗ 所有PLC地址均连接失败")
+            return False
+        
+        old_client, self.plc_client = self.plc_client, client
+        self.plc_ip = ip
+        self.plc_connected = True
+        self.plc_failover_pending = False
+        logger.info(f"✓ PLC连接成功: {ip}")
+        if old_client is not client:
+            # 旧连接可能已失效，断开操作放到后台避免阻塞扫描
+            threading.Thread(target=self._close_quietly, args=(old_client,), daemon=True).start()
+        return True
+    
+    @staticmethod
+    def _close_quietly(client):
+        try:
+            client.disconnect()
+        except Exception:
+            pass
+    
+    def connect_mqtt_redundant(self):
+        """对各MQTT服务器并行探测TCP连接，连接最先响应的服务器"""
+        config = self.failover_config
+        probe_timeout = config.get('connect_timeout', 3.0)
+        endpoints = self.health_monitor.ordered(self.mqtt_endpoints)
+        attempts = [
+            (endpoint, lambda endpoint=endpoint: tcp_probe(endpoint[0], endpoint[1], probe_timeout))
+            for endpoint in endpoints
+        ]
+        endpoint, latency = race(attempts, config.get('stagger', 0.25), config.get('connect_timeout', 3.0))
+        if endpoint is None:
+            logger.error("✗ 所有MQTT服务器均无法连接")
+            return False
+        logger.info(f"MQTT服务器 {endpoint[0]}:{endpoint[1]} 最先响应（{latency * 1000:.1f} ms）")
+        self.mqtt_endpoint = endpoint
+        return self.connect_mqtt(endpoint[0], endpoint[1])
+    
+    def on_endpoint_unhealthy(self, endpoint):
+        """健康检查发现端点不可用（在健康检查线程中调用）"""
+        if endpoint[1] == S7_PORT and endpoint[0] == self.plc_ip:
+            # PLC切换在扫描线程中进行，避免与读取并发
+            self.plc_failover_pending = True
+        elif endpoint == self.mqtt_endpoint:
+            self.failover_mqtt()
+    
+    def failover_plc(self):
+        """切换到可用的PLC地址"""
+        logger.warning(f"PLC {self.plc_ip} 不可用，开始故障切换")
+        started = time.monotonic()
+        self.plc_connected = False
+        if self.connect_plc_redundant():
+            logger.info(f"PLC故障切换完成，耗时 {(time.monotonic() - started) * 1000:.0f} ms")
+            return True
+        return False
+    
+    def failover_mqtt(self):
+        """在后台线程中切换到可用的MQTT服务器（同一时间只进行一次）"""
+        if not self.running and not self.mqtt_connected:
+            return
+        if not self.mqtt_failover_lock.acquire(blocking=False):
+            return
+        
+        def worker():
+            try:
+                started = time.monotonic()
+                logger.warning("MQTT服务器不可用，开始故障切换")
+                self.mqtt_client.loop_stop()
+                if self.connect_mqtt_redundant():
+                    logger.info(f"MQTT故障切换完成，耗时 {(time.monotonic() - started) * 1000:.0f} ms")
+            finally:
+                self.mqtt_failover_lock.release()
+        
+        threading.Thread(target=worker, name='mqtt-failover', daemon=True).start()
+    
+    def service_failover(self):
+        """每次扫描调用一次：执行健康检查发现的PLC切换"""
+        if self.plc_failover_pending and self.health_monitor:
+            self.failover_plc()
+    
     def disconnect_mqtt(self):
         """断开MQTT连接"""
+        if self.mqtt_connected and self.state_session:
+            self.state_session.publish_death()
         if self.mqtt_connected:
             self.mqtt_client.loop_stop()
             self.mqtt_client.disconnect()
@@ -135,6 +368,12 @@ class PLCMQTTPublisherOptimized:
             # 订阅主题
             client.subscribe(self.mqtt_topic_sub)
             logger.info(f"已订阅主题: {self.mqtt_topic_sub}")
+            # 重连后刷新全部标签的保留消息
+            if self.tag_topics:
+                self.tag_topics.request_full_publish()
+            # 每次连接后先发布出生消息
+            if self.state_session:
+                self.state_session.request_birth()
         else:
             logger.error(f"MQTT连接失败，错误码: {rc}")
     
@@ -142,19 +381,80 @@ class PLCMQTTPublisherOptimized:
         """MQTT断开连接回调"""
         self.mqtt_connected = False
         logger.warning("MQTT连接断开")
+        # 新会话：会话序号加 1 并更新遗嘱消息
+        if self.state_session:
+            self.state_session.next_session(client)
+        # 非主动断开时切换到其他可用服务器
+        if rc != 0 and self.health_monitor:
+            self.failover_mqtt()
     
     def on_mqtt_publish(self, client, userdata, mid):
         """MQTT发布回调"""
-        logger.debug(f"MQTT消息已发布，消息ID: {mid}")
+        logger.debug("MQTT消息已发布，消息ID: %s", mid)
+        if self.publish_manager:
+            self.publish_manager.on_publish(mid)
+        if self.latency_tracker:
+            self.latency_tracker.acknowledge(mid)
     
     def on_mqtt_message(self, client, userdata, msg):
         """MQTT消息接收回调"""
         try:
             payload = msg.payload.decode('utf-8')
             logger.info(f"收到MQTT消息: {msg.topic} -> {payload}")
+            self.handle_command(payload)
         except Exception as e:
             logger.error(f"处理MQTT消息时发生错误: {e}")
     
+    def register_command(self, name, handler):
+        """注册订阅主题上的命令处理函数"""
+        self.command_handlers[name] = handler
+    
+    def handle_command(self, payload):
+        """处理形如 {"cmd": "ack", ...} 的JSON命令，非命令消息忽略"""
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return False
+        if not isinstance(message, dict) or 'cmd' not in message:
+            return False
+        
+        handler = self.command_handlers.get(message['cmd'])
+        if handler is None:
+            logger.warning(f"未知命令: {message['cmd']}")
+            return False
+        handler(message)
+        return True
+    
+    def publish_json(self, topic, payload, qos=1, retain=False):
+        """将字典以JSON格式发布到指定主题"""
+        return self.publish_payload(topic, json.dumps(payload, ensure_ascii=False), qos, retain)
+    
+    def publish_payload(self, topic, payload, qos=1, retain=False, spool=True):
+        """将已编码的消息（字符串或字节）发布到指定主题
+
+        spool 为 False 时发布失败的消息不写入离线缓存
+        """
+        if self.broker_group and not self.sink_paused('broker_group'):
+            # 快照以外的消息只分发到在主题映射中列出该主题的服务器，保持原消息的 QoS 和 retain
+            self.broker_group.publish(topic, None, payload, qos, retain, mapped_only=True)
+        
+        if self.publish_manager:
+            # 断线时由发布管理器写入离线缓存，恢复后补发
+            return self.publish_manager.publish(topic, payload, qos=qos, retain=retain, spool=spool)
+        
+        if not self.mqtt_connected:
+            return False
+        
+        try:
+            result = self.mqtt_client.publish(topic, payload, qos=qos, retain=retain)
+            if result.rc == mqtt.MQTT_ERR_SUCCESS:
+                return True
+            logger.error(f"MQTT发布失败 ({topic})，错误码: {result.rc}")
+            return False
+        except Exception as e:
+            logger.error(f"发布MQTT数据时发生错误 ({topic}): {e}")
+            return False
+    
     def read_bool_at_address(self, db_number=9000, byte_address=0, bit_position=0):
         """读取指定地址的布尔值"""
         if not self.plc_connected:
@@ -170,18 +470,27 @@ class PLCMQTTPublisherOptimized:
             logger.error(f"读取布尔值错误 (DB{db_number}.DBX{byte_address}.{bit_position}): {e}")
             return None
     
-    def read_string(self, db_number=9000, start_address=4, max_length=20):
-        """读取字符串"""
+    def read_string(self, db_number=9000, start_address=4, max_length=None):
+        """读取字符串（max_length 为 None 时按PLC中声明的最大长度读取）"""
         if not self.plc_connected:
             return None
             
         try:
+            if max_length is None:
+                # 先读取头部（最大长度、实际长度），再只读取实际长度的字符
+                header = self.plc_client.db_read(db_number, start_address, 2)
+                declared_length, actual_length = header[0], header[1]
+                if not 0 < actual_length <= declared_length:
+                    return ""
+                data = self.plc_client.db_read(db_number, start_address + 2, actual_length)
+                return str(data, 'utf-8', 'ignore')
+            
             data = self.plc_client.db_read(db_number, start_address, max_length + 2)
             if data and len(data) >= 2:
+                # 实际长度不能超过PLC中声明的最大长度和本次读取的长度
                 actual_length = data[1]
-                if actual_length > 0 and len(data) >= 2 + actual_length:
-                    string_data = data[2:2+actual_length]
-                    return string_data.decode('utf-8', errors='ignore')
+                if 0 < actual_length <= min(data[0], max_length):
+                    return str(memoryview(data)[2:2 + actual_length], 'utf-8', 'ignore')
             return ""
         except Exception as e:
             logger.error(f"读取字符串错误 (DB{db_number}.DBString{start_address}): {e}")
@@ -220,15 +529,8 @@ class PLCMQTTPublisherOptimized:
         if not data:
             return None
         
-        # 创建数据摘要（排除timestamp，只比较实际数据）
-        data_summary = {
-            'booleans': data.get('data', {}).get('booleans', {}),
-            'string': data.get('data', {}).get('string', ''),
-            'dint1': data.get('data', {}).get('dint1'),
-            'dint2': data.get('data', {}).get('dint2'),
-            'int1': data.get('data', {}).get('int1'),
-            'int2': data.get('data', {}).get('int2')
-        }
+        # 数据摘要（排除timestamp，只比较实际数据；标签由读取计划决定，可能随热加载变化）
+        data_summary = data.get('data', {})
         
         # 转换为JSON字符串并计算MD5哈希
         json_str = json.dumps(data_summary, sort_keys=True, ensure_ascii=False)
@@ -255,71 +557,105 @@ class PLCMQTTPublisherOptimized:
         
         return False
     
-    def read_all_data(self, db_number=9000):
+    def read_all_data(self):
         """读取所有数据"""
         if not self.plc_connected:
             logger.error("PLC未连接")
             return None
         
-        timestamp = datetime.now()
+        plan = self.read_plan
         results = {
-            'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-            'device_id': 'PLC_DB9000',
+            'timestamp': self.format_timestamp(),
+            'device_id': f'PLC_DB{plan.db_number}',
             'data': {}
         }
         
+        stamps = AcquisitionStamps() if self.latency_tracker else None
+        self.scan_stamps = stamps
         try:
-            # 1. 读取32个布尔值
-            bool_values = {}
-            for byte_addr in range(4):  # 0, 1, 2, 3
-                for bit_pos in range(8):  # 0-7
-                    bool_index = byte_addr * 8 + bit_pos + 1
-                    bool_name = f"B{bool_index}"
-                    bool_value = self.read_bool_at_address(db_number, byte_addr, bit_pos)
-                    bool_values[bool_name] = bool_value
-            
-            results['data']['booleans'] = bool_values
-            
-            # 2. 读取字符串
-            string_value = self.read_string(db_number, 4, 20)
-            results['data']['string'] = string_value
-            
-            # 3. 读取32位整数1 (地址 26.0)
-            dint1_value = self.read_dint(db_number, 26)
-            results['data']['dint1'] = dint1_value
-            
-            # 4. 读取32位整数2 (地址 30.0)
-            dint2_value = self.read_dint(db_number, 30)
-            results['data']['dint2'] = dint2_value
-            
-            # 5. 读取16位整数1 (地址 34.0)
-            int1_value = self.read_int(db_number, 34)
-            results['data']['int1'] = int1_value
-            
-            # 6. 读取16位整数2 (地址 36.0)
-            int2_value = self.read_int(db_number, 36)
-            results['data']['int2'] = int2_value
-            
+            # 按读取计划一次读取整个数据区并解码全部标签
+            with self.profiler.stage('read'):
+                buf = plan.read_raw(self.plc_client)
+            if stamps:
+                stamps.end_read()
+            with self.profiler.stage('decode'):
+                last_plan, last_decoded = self.last_decoded
+                if not (last_plan is plan and plan.raw_unchanged()):
+                    last_decoded = plan.apply_deadband(plan.decode(buf), self.deadband_state)
+                    self.last_decoded = (plan, last_decoded)
+                # 原始数据与上次完全相同时沿用上次的解码结果；发布数据使用浅拷贝，
+                # 之后写入的计算标签等不会改动缓存（缓存也被附加服务器队列和 last_data 引用）
+                results['data'] = dict(last_decoded)
+            if stamps:
+                stamps.mark('decoded')
             return results
             
         except Exception as e:
             logger.error(f"读取数据时发生错误: {e}")
+            if self.health_monitor:
+                self.failover_plc()
             return None
     
+    def read_tags(self, tag_names):
+        """按标签名或分组名读取部分数据（用于按标签组轮询）"""
+        try:
+            plan = self.read_plan.subset(tag_names)
+            with self.profiler.stage('read'):
+                buf = plan.read_raw(self.plc_client)
+            with self.profiler.stage('decode'):
+                return plan.apply_deadband(plan.decode(buf), self.deadband_state)
+        except Exception as e:
+            logger.error(f"读取标签 {', '.join(tag_names)} 时发生错误: {e}")
+            if self.health_monitor:
+                self.plc_failover_pending = True
+            return {}
+    
     def publish_data(self, data):
         """发布数据到MQTT"""
-        if not self.mqtt_connected or not data:
+        if not data:
             return False
+        if self.state_session and self.state_session.delta_only:
+            # 只发送增量：增量消息已在变化检测后发布
+            return self.state_session.last_publish_ok
         
+        stamps = self.scan_stamps if self.latency_tracker else None
+        self.scan_stamps = None
         try:
+            if stamps:
+                stamps.mark('enqueued')
+                if self.latency_payload:
+                    data['acquisition'] = stamps.payload_fields()
+            
             # 转换为JSON格式
-            json_data = json.dumps(data, ensure_ascii=False)
+            with self.profiler.stage('serialize'):
+                json_data = self.serializer.dumps(data)
+            
+            # 分发到附加MQTT服务器（只入队，不阻塞采集；先于主服务器，主服务器断线或背压等待不影响其他服务器）
+            if self.broker_group and not self.sink_paused('broker_group'):
+                self.broker_group.publish(self.mqtt_topic_pub, data, json_data)
+            
+            if not self.mqtt_connected and not self.publish_manager:
+                return False
+            
+            # 经发布管理器发布（在途窗口已满时在此阻塞，形成背压）
+            if self.publish_manager:
+                with self.profiler.stage('publish'):
+                    mid = self.publish_manager.publish_tracked(self.mqtt_topic_pub, json_data, qos=1)
+                if mid is None:
+                    return False
+                scan_logger.info("数据已发布到MQTT主题: %s", self.mqtt_topic_pub)
+                if stamps:
+                    self.track_latency(stamps, mid)
+                return True
             
             # 发布到MQTT
-            result = self.mqtt_client.publish(self.mqtt_topic_pub, json_data, qos=1)
+            with self.profiler.stage('publish'):
+                result = self.mqtt_client.publish(self.mqtt_topic_pub, json_data, qos=1)
             
             if result.rc == mqtt.MQTT_ERR_SUCCESS:
-                logger.info(f"数据已发布到MQTT主题: {self.mqtt_topic_pub}")
+                scan_logger.info("数据已发布到MQTT主题: %s", self.mqtt_topic_pub)
+                if stamps:
+                    self.track_latency(stamps, result.mid)
                 return True
             else:
                 logger.error(f"MQTT发布失败，错误码: {result.rc}")
@@ -329,6 +665,396 @@ class PLCMQTTPublisherOptimized:
             logger.error(f"发布MQTT数据时发生错误: {e}")
             return False
     
+    def setup_publish_manager(self, publish_config=None):
+        """启用 QoS 1 在途跟踪、发布背压和离线缓存"""
+        publish_config = publish_config or PUBLISH_CONFIG
+        self.publish_manager = PublishManager.from_config(
+            self.mqtt_client, publish_config, is_connected=lambda: self.mqtt_connected)
+        logger.info(f"发布管理已启用，在途上限: {self.publish_manager.max_inflight}，"
+                    f"离线缓存: {self.publish_manager.spool_file}")
+        return self.publish_manager
+    
+    def setup_tag_topics(self, topics_config=None):
+        """启用按标签发布（每个标签一个保留消息主题）"""
+        topics_config = topics_config or TAG_TOPICS_CONFIG
+        self.tag_topics = TagTopicPublisher.from_config(
+            self.publish_payload, topics_config, f'DB{self.read_plan.db_number}')
+        logger.info(f"按标签发布已启用，主题: {self.tag_topics.base}/<标签>")
+        return self.tag_topics
+    
+    def setup_state_session(self, session_config=None):
+        """启用出生/死亡证书和增量序号（需在连接MQTT之前调用，以便注册遗嘱消息）"""
+        session_config = session_config or STATE_SESSION_CONFIG
+        # 会话消息带序号，断线时不写入离线缓存（稍后补发会与新的序号冲突），由重连后的出生消息补齐
+        self.state_session = StateSession.from_config(
+            lambda topic, payload, qos, retain: self.publish_payload(topic, payload, qos, retain, spool=False),
+            session_config)
+        self.state_session.register_will(self.mqtt_client)
+        self.register_command('rebirth', self.handle_rebirth_command)
+        logger.info(f"有状态会话已启用，主题: {self.state_session.topic}/(birth|delta|death)"
+                    f"{'，只发送增量' if self.state_session.delta_only else ''}")
+        return self.state_session
+    
+    def handle_rebirth_command(self, message):
+        """处理重新发布出生消息命令: {"cmd": "rebirth"}"""
+        logger.info("收到 rebirth 命令，下次扫描发布完整出生消息")
+        self.state_session.request_birth()
+    
+    def build_tag_metadata(self):
+        """出生消息中的标签元数据（读取计划中的标签和计算标签）"""
+        metadata = {}
+        for tag in self.read_plan.tags:
+            entry = {'type': tag.type, 'address': tag.address}
+            if tag.type == 'BOOL':
+                entry['bit'] = tag.bit
+            if tag.length:
+                entry['length'] = tag.length
+            if tag.array:
+                entry['array'] = tag.array
+            if tag.group:
+                entry['group'] = tag.group
+            if tag.deadband:
+                entry['deadband'] = tag.deadband
+            metadata[tag.name] = entry
+        if self.computed_tags:
+            for tag in self.computed_tags.tags:
+                metadata[tag.name] = {'type': 'COMPUTED', 'expression': tag.expression, 'group': 'computed'}
+        return metadata
+    
+    def start_broker_group(self, group_config=None):
+        """启动附加MQTT服务器分发（各服务器异步连接，不可用时不影响采集）"""
+        group_config = group_config or BROKER_GROUP_CONFIG
+        self.broker_group = BrokerGroup.from_config(group_config)
+        self.broker_group.start()
+        logger.info(f"附加MQTT服务器分发已启用: {', '.join(t.name for t in self.broker_group.targets)}")
+        return self.broker_group
+    
+    def service_publish_manager(self):
+        """每次扫描调用一次：处理PUBACK超时并补发离线缓存"""
+        if self.publish_manager:
+            with self.profiler.stage('publish_service'):
+                self.publish_manager.service()
+    
+    def start_burst_capture(self, capture_config=None):
+        """启动高速触发录波"""
+        capture_config = capture_config or BURST_CAPTURE_CONFIG
+        self.burst_capture = BurstCapture.from_config(
+            self.plc_ip, capture_config, on_capture=self.publish_capture_notice
+        )
+        self.capture_topic = self.mqtt_topic_pub + capture_config.get('topic_suffix', '/capture')
+        if not self.burst_capture.start():
+            self.burst_capture = None
+            return False
+        return True
+    
+    def publish_capture_notice(self, summary):
+        """通过MQTT通知录波文件已生成（主服务器未连接时仍分发到附加服务器）"""
+        if self.publish_json(self.capture_topic, summary):
+            logger.info(f"录波通知已发布到MQTT主题: {self.capture_topic}")
+            return True
+        logger.warning(f"录波通知未发送到主MQTT服务器: {summary['file']}")
+        return False
+    
+    def setup_block_reader(self, block_config=None):
+        """启用大数据块快照（{"cmd": "snapshot_block", "block": "<名称>"} 触发）"""
+        block_config = block_config or LARGE_BLOCK_CONFIG
+        self.block_config = block_config
+        self.block_reader = LargeBlockReader.from_config(self.plc_ip, block_config)
+        self.block_topic = self.mqtt_topic_pub + block_config.get('topic_suffix', '/block')
+        self.register_command('snapshot_block', self.handle_snapshot_block_command)
+        names = ', '.join(block['name'] for block in block_config.get('blocks', []))
+        logger.info(f"大数据块快照已启用，并行连接数: {self.block_reader.connections}，数据块: {names}")
+    
+    def handle_snapshot_block_command(self, message):
+        """在后台线程中读取指定数据块，不阻塞采集"""
+        name = message.get('block')
+        blocks = {block['name']: block for block in self.block_config.get('blocks', [])}
+        if name not in blocks:
+            logger.warning(f"未知的数据块: {name}")
+            return
+        threading.Thread(target=self.snapshot_block, args=(blocks[name],),
+                         name=f'block-{name}', daemon=True).start()
+    
+    def snapshot_block(self, block):
+        """并行读取数据块，保存为文件并通过MQTT通知"""
+        try:
+            data, info = self.block_reader.read(
+                block['db_number'], block.get('start', 0), block['size'],
+                block.get('version_offset'), block.get('version_size', 2))
+        except Exception as e:
+            logger.error(f"读取数据块 {block['name']} 时发生错误: {e}")
+            return None
+        finally:
+            if not self.block_config.get('keep_connected', False):
+                # 默认读完即断开，不长期占用CPU的连接资源
+                self.block_reader.disconnect()
+        
+        info['name'] = block['name']
+        info['file'] = save_snapshot(self.block_config.get('output_dir', 'block_snapshots'), block['name'], data)
+        logger.info(f"数据块 {block['name']} 已保存: {info['file']}（{info['size']} 字节，"
+                    f"{info['connections']} 个连接，耗时 {info['elapsed_ms']} ms）")
+        if not self.publish_json(self.block_topic, info):
+            logger.warning(f"数据块快照通知发布失败: {block['name']}")
+        return info
+    
+    def setup_historian(self, historian_config=None):
+        """启用历史数据压缩归档"""
+        historian_config = historian_config or HISTORIAN_CONFIG
+        self.historian = Historian.from_config(historian_config)
+        self.trend_topic = self.mqtt_topic_pub + historian_config.get('trend_topic_suffix', '/trend')
+        self.register_command('trend', self.handle_trend_command)
+        compression = historian_config.get('compression', {})
+        logger.info(f"历史数据归档已启用，目录: {historian_config.get('directory', 'history')}，"
+                    f"压缩方式: {compression.get('mode', 'swinging_door')}，允许误差: {compression.get('deviation', 0)}，"
+                    f"汇总层级: {', '.join(historian_config.get('rollups', [])) or '无'}")
+        return self.historian
+    
+    def handle_trend_command(self, message):
+        """趋势查询: {"cmd": "trend", "tag": "int1", "start": 开始时间戳, "end": 结束时间戳, "resolution": 秒}
+
+        在后台线程中查询，结果发布到趋势主题
+        """
+        threading.Thread(target=self.publish_trend, args=(message,), name='trend-query', daemon=True).start()
+    
+    def publish_trend(self, message):
+        try:
+            tag = message['tag']
+            end = float(message.get('end') or time.time())
+            start = float(message.get('start') or end - 86400)
+            # 未指定分辨率时按约 500 个点选择
+            resolution = float(message.get('resolution') or (end - start) / 500)
+            result = self.historian.trend(tag, start, end, resolution)
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"趋势查询参数无效: {message} ({e})")
+            return
+        result.update({'tag': tag, 'start': start, 'end': end, 'resolution': resolution})
+        if message.get('id') is not None:
+            result['id'] = message['id']
+        if not self.publish_json(self.trend_topic, result):
+            logger.warning(f"趋势查询结果发布失败: {tag}")
+    
+    def setup_sqlite_sink(self, sink_config=None):
+        """启用 SQLite 本地存储"""
+        sink_config = sink_config or SQLITE_SINK_CONFIG
+        self.sqlite_sink = SQLiteSink.from_config(sink_config)
+        self.sqlite_sink.start()
+        return self.sqlite_sink
+    
+    def setup_watchdog(self, watchdog_config=None):
+        """启用扫描周期看门狗"""
+        watchdog_config = watchdog_config or SCAN_WATCHDOG_CONFIG
+        self.watchdog = ScanWatchdog.from_config(watchdog_config)
+        self.overload_topic = self.mqtt_topic_pub + watchdog_config.get('topic_suffix', '/overload')
+        logger.info(f"扫描周期看门狗已启用，降载策略: {' -> '.join(self.watchdog.policy) or '无'}，"
+                    f"关键标签组: {', '.join(sorted(self.watchdog.critical_groups)) or '无'}")
+        return self.watchdog
+    
+    def sink_paused(self, name):
+        """数据去向是否因过载降载暂停"""
+        return self.watchdog is not None and self.watchdog.sink_paused(name)
+    
+    def finish_scan(self, deadline, poller=None):
+        """扫描结束时交给看门狗，过载状态变化时调整标签组并发布状态"""
+        topics_paused = self.sink_paused('tag_topics')
+        group_paused = self.sink_paused('broker_group')
+        status = self.watchdog.end_scan(deadline)
+        if status is None:
+            return
+        if poller:
+            for name in poller.groups:
+                poller.set_load_shedding(name, self.watchdog.group_scale(name), self.watchdog.group_dropped(name))
+        if self.tag_topics and topics_paused and not self.sink_paused('tag_topics'):
+            # 暂停期间错过的变化在恢复后通过一次完整发布补齐
+            self.tag_topics.request_full_publish()
+        if self.broker_group and group_paused and not self.sink_paused('broker_group'):
+            self.resync_broker_group()
+        # 保留消息：新订阅的监控端立即得到当前过载状态
+        if not self.publish_json(self.overload_topic, status, retain=True):
+            logger.warning("过载状态发布失败")
+    
+    def resync_broker_group(self):
+        """附加服务器分发恢复后补发当前的完整快照（暂停期间错过的变化）"""
+        if self.last_data and not (self.state_session and self.state_session.delta_only):
+            self.broker_group.publish(self.mqtt_topic_pub, self.last_data, self.serializer.dumps(self.last_data))
+        if self.state_session:
+            # 增量序号在暂停期间对附加服务器已不连续，重新发布出生消息
+            self.state_session.request_birth()
+    
+    def setup_latency_tracking(self, latency_config=None):
+        """启用端到端延迟跟踪（读取 -> 解码 -> 处理 -> 发布 -> PUBACK）"""
+        latency_config = latency_config or LATENCY_CONFIG
+        self.latency_tracker = LatencyTracker.from_config(latency_config)
+        self.latency_payload = latency_config.get('payload_fields', False)
+        self.latency_topic = self.mqtt_topic_pub + latency_config.get('topic_suffix', '/latency')
+        self.latency_report_interval = latency_config.get('report_interval', 60)
+        self.next_latency_report = time.monotonic() + self.latency_report_interval
+        self.register_command('latency', self.handle_latency_command)
+        logger.info(f"端到端延迟跟踪已启用，统计窗口: {self.latency_tracker.window} 条，"
+                    f"消息中附带采集时间: {'是' if self.latency_payload else '否'}")
+        return self.latency_tracker
+    
+    def track_latency(self, stamps, mid):
+        """记录发布前各阶段的耗时，并等待该消息的 PUBACK"""
+        stamps.mark('published')
+        self.latency_tracker.record(stamps)
+        if mid is not None:
+            self.latency_tracker.track(mid, stamps)
+    
+    def handle_latency_command(self, message):
+        """处理延迟查询命令: {"cmd": "latency"}"""
+        self.publish_latency_report()
+    
+    def publish_latency_report(self):
+        report = self.latency_tracker.get_report()
+        report['timestamp'] = int(time.time() * 1000)
+        if not self.publish_json(self.latency_topic, report):
+            logger.warning("延迟统计发布失败")
+    
+    def service_latency_report(self):
+        """每次扫描调用一次：按 report_interval 定期发布延迟统计"""
+        if self.latency_tracker and self.latency_report_interval:
+            now = time.monotonic()
+            if now >= self.next_latency_report:
+                self.next_latency_report = now + self.latency_report_interval
+                self.publish_latency_report()
+    
+    def close_storage(self):
+        """归档压缩中保留的点、写入 SQLite 队列中的数据并关闭本地存储（采集循环结束时调用）"""
+        if self.historian:
+            self.historian.close()
+            logger.info(f"  历史数据归档统计: {self.historian.get_stats()}")
+        if self.sqlite_sink:
+            self.sqlite_sink.stop()
+            logger.info(f"  SQLite 存储统计: {self.sqlite_sink.get_stats()}")
+    
+    def setup_computed_tags(self, computed_config=None):
+        """编译计算标签"""
+        computed_config = computed_config or COMPUTED_TAGS_CONFIG
+        self.computed_tags = ComputedTagEngine.from_config(computed_config)
+        logger.info(f"计算标签已启用，标签数: {len(self.computed_tags.tags)}")
+    
+    def setup_rule_engine(self, rules_config=None):
+        """编译报警规则并注册报警确认命令"""
+        rules_config = rules_config or ALARM_RULES_CONFIG
+        self.rule_engine = RuleEngine.from_config(rules_config)
+        self.alarm_topic = self.mqtt_topic_pub + rules_config.get('topic_suffix', '/alarm')
+        self.register_command('ack', self.handle_ack_command)
+        logger.info(f"报警规则引擎已启用，规则数: {len(self.rule_engine.rules)}")
+    
+    def handle_ack_command(self, message):
+        """处理报警确认命令: {"cmd": "ack", "alarm": "规则名"}"""
+        event = self.rule_engine.acknowledge(message.get('alarm', ''))
+        if event:
+            self.publish_alarm_event(event)
+    
+    def publish_alarm_event(self, event):
+        """发布报警事件"""
+        logger.warning(f"报警 {event['event']}: {event['alarm']} - {event['message']}")
+        if not self.publish_json(self.alarm_topic, event):
+            logger.warning(f"报警事件发布失败: {event['alarm']}")
+    
+    def handle_profile_command(self, message):
+        """处理性能分析命令: {"cmd": "profile", "mode": "cprofile", "seconds": 30}"""
+        self.profiler.request(message.get('mode', 'cprofile'), message.get('seconds'))
+    
+    def detect_changed_tags(self, data):
+        """计算本次扫描相对上次的标签级变化集合
+
+        返回 (扁平标签值, 变化标签集合)，首次扫描的变化集合为 None
+        """
+        values = flatten_data(data)
+        if self.last_values is None:
+            changed = None
+        else:
+            changed = diff_values(self.last_values, values)
+        self.last_values = values
+        return values, changed
+    
+    def process_tag_changes(self, data):
+        """每次扫描后按变化集合执行增量计算（计算标签、报警规则）"""
+        values, changed = self.detect_changed_tags(data)
+        if self.computed_tags:
+            computed_changed = self.computed_tags.update(values, changed)
+            data['data']['computed'] = dict(self.computed_tags.values)
+            if changed is not None:
+                changed |= computed_changed
+        if self.rule_engine:
+            # 无变化时只检查延时中的规则
+            for event in self.rule_engine.evaluate(values, changed):
+                self.publish_alarm_event(event)
+        if self.tag_topics and not self.sink_paused('tag_topics'):
+            self.tag_topics.publish_changes(data, values, changed)
+        if self.state_session:
+            self.state_session.publish_changes(data, values, changed, self.build_tag_metadata)
+        if self.historian and not self.sink_paused('historian'):
+            # 压缩需要每次采样（包括未变化的值）
+            self.historian.record_values(values)
+        if self.sqlite_sink and not self.sink_paused('sqlite_sink'):
+            self.sqlite_sink.record(data, values, changed)
+        return values, changed
+    
+    def start_config_watcher(self, runtime_config=None):
+        """启动运行时配置热加载"""
+        runtime_config = runtime_config or RUNTIME_CONFIG
+        self.config_watcher = ConfigWatcher(
+            runtime_config.get('file', 'plc_runtime.json'),
+            runtime_config.get('watch_interval', 2.0)
+        )
+        self.config_watcher.start()
+    
+    def apply_pending_config(self, adaptive=False):
+        """在扫描间隙切换到已编译好的新配置（没有新配置时直接返回）
+
+        adaptive 为 True 时（自适应模式）周期由标签组决定，不使用配置中的采集间隔
+        """
+        if self.config_watcher is None:
+            return False
+        runtime = self.config_watcher.take_pending()
+        if runtime is None:
+            return False
+        
+        old_plan = self.read_plan
+        unchanged = runtime.plan.unchanged_tags(old_plan)
+        
+        # 一次赋值完成读取计划切换，之后的扫描全部使用新计划
+        self.read_plan = runtime.plan
+        self.serializer = SnapshotSerializer.from_plan(runtime.plan)
+        if self.tag_topics:
+            # 标签定义变化，重新生成主题和别名表并发布全部标签
+            self.tag_topics.reset()
+        if self.state_session:
+            # 标签元数据变化，重新发布出生消息
+            self.state_session.request_birth()
+        
+        # 定义未变化的标签保留上次值和死区状态，其余标签按新标签处理
+        self.deadband_state = {
+            name: value for name, value in self.deadband_state.items() if name in unchanged
+        }
+        if self.last_values is not None:
+            self.last_values = {
+                name: value for name, value in self.last_values.items()
+                if name in unchanged or name not in old_plan.by_name
+            }
+        
+        if runtime.interval_seconds and adaptive:
+            logger.warning(f"自适应模式的扫描周期由 ADAPTIVE_POLL_CONFIG 决定，"
+                           f"忽略热加载的采集间隔 {runtime.interval_seconds}秒")
+        elif runtime.interval_seconds:
+            self.interval_seconds = runtime.interval_seconds
+        if runtime.topic_pub and runtime.topic_pub != self.mqtt_topic_pub:
+            self.mqtt_topic_pub = runtime.topic_pub
+        if runtime.topic_sub and runtime.topic_sub != self.mqtt_topic_sub:
+            if self.mqtt_connected:
+                self.mqtt_client.unsubscribe(self.mqtt_topic_sub)
+                self.mqtt_client.subscribe(runtime.topic_sub)
+            self.mqtt_topic_sub = runtime.topic_sub
+        
+        interval = '自适应' if adaptive else f'{self.interval_seconds}秒'
+        logger.info(f"运行时配置已切换: 标签 {len(runtime.plan.tags)} 个 "
+                    f"(保留状态 {len(unchanged)} 个), 间隔 {interval}, "
+                    f"发布主题 {self.mqtt_topic_pub}")
+        return True
+    
     def collect_and_publish_optimized(self, interval_seconds=2):
         """优化版本：只在数据变化时发布"""
         logger.info(f"开始优化数据采集和发布，间隔: {interval_seconds}秒")
@@ -339,39 +1065,69 @@ class PLCMQTTPublisherOptimized:
         logger.info("按 Ctrl+C 停止")
         
         self.running = True
+        self.interval_seconds = interval_seconds
         collect_count = 0
+        next_scan = time.monotonic()
+        if self.watchdog:
+            # 固定周期模式一次读取全部标签，没有按组调度，只能暂停数据去向
+            removed = self.watchdog.restrict_policy(('pause_sinks',))
+            if removed:
+                logger.warning(f"固定周期模式不支持按标签组降载，已忽略降载动作: {', '.join(removed)}")
         
         try:
             while self.running:
+                if self.watchdog:
+                    self.watchdog.start_scan(next_scan)
+                self.apply_pending_config()
+                self.profiler.tick()
+                scan_logger.begin_scan()
+                self.service_failover()
+                self.service_publish_manager()
+                self.service_latency_report()
+                
                 # 读取数据
                 data = self.read_all_data()
                 self.total_read_count += 1
                 
                 if data:
+                    with self.profiler.stage('change_detection'):
+                        self.process_tag_changes(data)
+                        changed = self.has_data_changed(data)
+                    
                     # 检查数据是否发生变化
-                    if self.has_data_changed(data):
+                    if changed:
                         # 数据发生变化，发布到MQTT
                         if self.publish_data(data):
                             self.data_change_count += 1
                             collect_count += 1
                             
-                            # 记录变化详情
-                            bool_true_count = sum(1 for v in data['data']['booleans'].values() if v)
-                            logger.info(f"数据变化 #{self.data_change_count} - 发布成功")
-                            logger.info(f"  布尔值真值数量: {bool_true_count}/32")
-                            logger.info(f"  字符串: '{data['data']['string']}'")
-                            logger.info(f"  DInt1: {data['data']['dint1']}, DInt2: {data['data']['dint2']}")
-                            logger.info(f"  Int1: {data['data']['int1']}, Int2: {data['data']['int2']}")
+                            # 记录变化详情（明细限速采样输出）
+                            logger.info("数据变化 #%d - 发布成功", self.data_change_count)
+                            if scan_logger.enabled:
+                                # 按当前标签表输出，标签表热更新后名称可能变化
+                                values = flatten_data(data)
+                                bools = [v for v in values.values() if isinstance(v, bool)]
+                                scan_logger.info("  布尔值真值数量: %d/%d", sum(bools), len(bools))
+                                for name, value in values.items():
+                                    if not isinstance(value, bool):
+                                        scan_logger.info("  %s: %r", name, value)
                         else:
                             logger.warning("数据变化但发布失败")
                     else:
                         # 数据未变化，只记录读取状态
                         if self.total_read_count % 10 == 0:  # 每10次读取显示一次状态
-                            logger.info(f"数据未变化 - 总读取: {self.total_read_count}, 变化发布: {self.data_change_count}")
+                            logger.info("数据未变化 - 总读取: %d, 变化发布: %d",
+                                        self.total_read_count, self.data_change_count)
                 else:
                     logger.error("数据读取失败")
                 
-                time.sleep(interval_seconds)
+                if self.watchdog:
+                    # 看门狗按固定周期排定下次扫描；超时后不补扫，从当前时刻重新排定
+                    self.finish_scan(self.interval_seconds)
+                    next_scan = max(next_scan + self.interval_seconds, time.monotonic())
+                    time.sleep(max(0.0, next_scan - time.monotonic()))
+                else:
+                    time.sleep(self.interval_seconds)
                 
         except KeyboardInterrupt:
             logger.info("用户中断数据采集")
@@ -387,12 +1143,190 @@ class PLCMQTTPublisherOptimized:
             if self.total_read_count > 0:
                 change_rate = (self.data_change_count / self.total_read_count) * 100
                 logger.info(f"  变化率: {change_rate:.2f}%")
+            dropped = get_dropped_count()
+            if dropped:
+                logger.warning(f"  日志队列已满丢弃: {dropped} 条")
+            if self.publish_manager:
+                logger.info(f"  发布管理统计: {self.publish_manager.get_stats()}")
+            if self.broker_group:
+                logger.info(f"  附加服务器分发统计: {self.broker_group.get_stats()}")
+            if self.watchdog:
+                logger.info(f"  扫描周期统计: {self.watchdog.get_status()}")
+            if self.latency_tracker:
+                logger.info(f"  端到端延迟统计（毫秒）: {self.latency_tracker.get_report()}")
+            self.close_storage()
+    
+    def collect_and_publish_adaptive(self, poll_config=None):
+        """自适应版本：按标签组变化率调整扫描周期，只在数据变化时发布"""
+        poll_config = poll_config or ADAPTIVE_POLL_CONFIG
+        poller = AdaptivePoller.from_config(poll_config)
+        logger.info(f"开始自适应数据采集和发布，周期范围: "
+                    f"{poller.min_interval}-{poller.max_interval}秒")
+        logger.info(f"标签组: {', '.join(poller.groups)}")
+        logger.info("按 Ctrl+C 停止")
+        
+        self.running = True
+        collect_count = 0
+        current_values = {}
+        
+        try:
+            while self.running:
+                now = time.monotonic()
+                due = poller.due_groups(now)
+                if self.watchdog:
+                    # 首次扫描没有计划时刻（next_due 为 0），不计抖动
+                    self.watchdog.start_scan(min(group.next_due for group in due) if due else None, now)
+                self.apply_pending_config(adaptive=True)
+                self.profiler.tick()
+                scan_logger.begin_scan()
+                self.service_failover()
+                self.service_publish_manager()
+                self.service_latency_report()
+                # 各标签组的读取合计为读取阶段（解码在 read_tags 中完成）
+                self.scan_stamps = AcquisitionStamps() if self.latency_tracker and due else None
+                for group in due:
+                    values = self.read_tags(group.tags)
+                    # 首次读取不算变化，与 has_data_changed 的约定一致
+                    changed = any(
+                        tag in current_values and current_values[tag] != value
+                        for tag, value in values.items()
+                    )
+                    current_values.update(values)
+                    poller.record_scan(group.name, changed, now)
+                if self.scan_stamps:
+                    self.scan_stamps.end_read()
+                    self.scan_stamps.mark('decoded')
+                self.total_read_count += 1
+                
+                data = {
+                    'timestamp': self.format_timestamp(),
+                    'device_id': f'PLC_DB{self.read_plan.db_number}',
+                    'data': dict(current_values)
+                }
+                with self.profiler.stage('change_detection'):
+                    self.process_tag_changes(data)
+                    changed = self.has_data_changed(data)
+                
+                if changed:
+                    if self.publish_data(data):
+                        self.data_change_count += 1
+                        collect_count += 1
+                        logger.info("数据变化 #%d - 发布成功", self.data_change_count)
+                        if scan_logger.enabled:
+                            scan_logger.info("  标签组状态: %s", poller.get_status())
+                    else:
+                        logger.warning("数据变化但发布失败")
+                elif self.total_read_count % 10 == 0:
+                    logger.info("数据未变化 - 总读取: %d, 变化发布: %d, 标签组状态: %s",
+                                self.total_read_count, self.data_change_count, poller.get_status())
+                
+                if self.watchdog:
+                    # 每次扫描需在最短周期内完成，关键标签组才能保持其周期
+                    self.finish_scan(poller.min_interval, poller)
+                time.sleep(poller.time_until_next())
+                
+        except KeyboardInterrupt:
+            logger.info("用户中断数据采集")
+        except Exception as e:
+            logger.error(f"数据采集过程中发生错误: {e}")
+        finally:
+            self.running = False
+            logger.info(f"采集结束统计:")
+            logger.info(f"  总扫描次数: {self.total_read_count}")
+            logger.info(f"  数据变化次数: {self.data_change_count}")
+            logger.info(f"  发布成功次数: {collect_count}")
+            logger.info(f"  标签组状态: {poller.get_status()}")
+            if self.publish_manager:
+                logger.info(f"  发布管理统计: {self.publish_manager.get_stats()}")
+            if self.broker_group:
+                logger.info(f"  附加服务器分发统计: {self.broker_group.get_stats()}")
+            if self.watchdog:
+                logger.info(f"  扫描周期统计: {self.watchdog.get_status()}")
+            if self.latency_tracker:
+                logger.info(f"  端到端延迟统计（毫秒）: {self.latency_tracker.get_report()}")
+            self.close_storage()
     
     def stop_collection(self):
         """停止数据采集"""
         self.running = False
+        if self.burst_capture:
+            self.burst_capture.stop()
+            self.burst_capture = None
+        if self.config_watcher:
+            self.config_watcher.stop()
+            self.config_watcher = None
+        self.profiler.stop()
+        if self.health_monitor:
+            self.health_monitor.stop()
+        if self.broker_group:
+            self.broker_group.stop()
+        if self.block_reader:
+            self.block_reader.disconnect()
         logger.info("正在停止数据采集...")
 
+def prepare_connections(publisher):
+    """按配置启用需在连接之前设置的功能（冗余端点、遗嘱消息）"""
+    # 启用冗余端点和故障切换
+    if FAILOVER_CONFIG.get('enabled'):
+        publisher.setup_failover()
+    
+    # 启用出生/死亡证书（遗嘱消息需在连接之前注册）
+    if STATE_SESSION_CONFIG.get('enabled'):
+        publisher.setup_state_session()
+
+def enable_features(publisher):
+    """按配置启用各可选功能（需在PLC和MQTT连接之后调用）"""
+    # 启用发布管理（需在发布任何数据之前）
+    if PUBLISH_CONFIG.get('enabled'):
+        publisher.setup_publish_manager()
+    
+    # 启用按标签发布
+    if TAG_TOPICS_CONFIG.get('enabled'):
+        publisher.setup_tag_topics()
+    
+    # 启动附加MQTT服务器分发
+    if BROKER_GROUP_CONFIG.get('enabled'):
+        publisher.start_broker_group()
+    
+    # 允许通过信号开启性能分析
+    publisher.profiler.install_signal_handler(PROFILING_CONFIG.get('signal'))
+    
+    # 启用配置热加载
+    if RUNTIME_CONFIG.get('enabled'):
+        publisher.start_config_watcher()
+    
+    # 启用计算标签
+    if COMPUTED_TAGS_CONFIG.get('enabled'):
+        publisher.setup_computed_tags()
+    
+    # 启用报警规则引擎
+    if ALARM_RULES_CONFIG.get('enabled'):
+        publisher.setup_rule_engine()
+    
+    # 启动触发录波
+    if BURST_CAPTURE_CONFIG.get('enabled'):
+        publisher.start_burst_capture()
+    
+    # 启用大数据块快照
+    if LARGE_BLOCK_CONFIG.get('enabled'):
+        publisher.setup_block_reader()
+    
+    # 启用历史数据压缩归档
+    if HISTORIAN_CONFIG.get('enabled'):
+        publisher.setup_historian()
+    
+    # 启用 SQLite 本地存储
+    if SQLITE_SINK_CONFIG.get('enabled'):
+        publisher.setup_sqlite_sink()
+    
+    # 启用扫描周期看门狗
+    if SCAN_WATCHDOG_CONFIG.get('enabled'):
+        publisher.setup_watchdog()
+    
+    # 启用端到端延迟跟踪
+    if LATENCY_CONFIG.get('enabled'):
+        publisher.setup_latency_tracking()
+
 def main():
     """主函数"""
     print("=" * 80)
@@ -405,18 +1339,29 @@ def main():
     publisher = PLCMQTTPublisherOptimized("172.16.10.66")
     
     try:
-        # 连接到PLC
-        if not publisher.connect_plc():
+        # 按配置启用需在连接之前设置的功能
+        prepare_connections(publisher)
+        
+        # 并行连接PLC和MQTT
+        plc_ok, mqtt_ok = publisher.connect_parallel()
+        if not plc_ok:
             print("无法连接到PLC，程序退出")
             return
-        
-        # 连接到MQTT
-        if not publisher.connect_mqtt():
+        if not mqtt_ok:
             print("无法连接到MQTT服务器，程序退出")
             return
         
-        # 询问采集参数
-        interval = int(input("请输入采集间隔（秒，默认2）: ").strip() or "2")
+        # 按配置启用各可选功能
+        enable_features(publisher)
+        
+        if ADAPTIVE_POLL_CONFIG.get('enabled'):
+            print(f"\n开始自适应数据采集和发布...")
+            print(f"周期范围: {ADAPTIVE_POLL_CONFIG['min_interval']}-{ADAPTIVE_POLL_CONFIG['max_interval']}秒")
+            publisher.collect_and_publish_adaptive()
+            return
+        
+        # 询问采集参数（非交互运行时使用环境变量或默认值）
+        interval = prompt_float("请输入采集间隔（秒，默认2）: ", 2, 'PLC_SCAN_INTERVAL')
         
         print(f"\n开始优化数据采集和发布...")
         print(f"PLC IP: 172.16.10.66")
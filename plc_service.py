@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PLC采集服务入口
+用于 systemd、容器和看门狗重启等无人值守场景：参数来自命令行、环境变量和
+SERVICE_CONFIG，不等待键盘输入；先解析参数并开始DNS预解析，再导入 snap7/paho，
+PLC和MQTT并行连接，尽快开始扫描
+"""
+
+import os
+import sys
+import time
+import signal
+import logging
+import argparse
+
+from config import SERVICE_CONFIG, PLC_CONFIG, ADAPTIVE_POLL_CONFIG
+
+# 以本模块导入时刻近似进程启动时刻，用于统计启动耗时
+_STARTED = time.monotonic()
+
+logger = logging.getLogger(__name__)
+
+MODES = ('auto', 'fixed', 'adaptive')
+
+
+def build_arg_parser():
+    """命令行参数（未指定时依次使用环境变量和 SERVICE_CONFIG）"""
+    parser = argparse.ArgumentParser(description="PLC数据采集服务（无人值守模式）")
+    parser.add_argument('--plc-ip', help="PLC的IP地址（环境变量 PLC_IP）")
+    parser.add_argument('--broker', help="MQTT服务器（环境变量 MQTT_BROKER）")
+    parser.add_argument('--port', type=int, help="MQTT端口（环境变量 MQTT_PORT）")
+    parser.add_argument('--mode', choices=MODES, help="采集模式（环境变量 PLC_SERVICE_MODE）")
+    parser.add_argument('--interval', type=float, help="固定周期模式的采集间隔，秒（环境变量 PLC_SCAN_INTERVAL）")
+    parser.add_argument('--connect-timeout', type=float, help="并行连接的最长等待时间，秒")
+    parser.add_argument('--log-file', default='plc_mqtt_publisher_optimized.log', help="日志文件")
+    parser.add_argument('--log-level', help="日志级别（环境变量 PLC_LOG_LEVEL）")
+    return parser
+
+
+def load_options(argv=None):
+    """合并命令行参数、环境变量和 SERVICE_CONFIG，配置无效时退出"""
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+
+    def pick(arg_value, env_var, default):
+        if arg_value is not None:
+            return arg_value
+        value = os.getenv(env_var, '').strip() if env_var else ''
+        return value if value else default
+
+    try:
+        args.plc_ip = pick(args.plc_ip, 'PLC_IP', PLC_CONFIG['ip_address'])
+        args.broker = pick(args.broker, 'MQTT_BROKER', None)
+        port = pick(args.port, 'MQTT_PORT', None)
+        args.port = int(port) if port is not None else None
+        args.mode = pick(args.mode, 'PLC_SERVICE_MODE', SERVICE_CONFIG.get('mode', 'auto'))
+        args.interval = float(pick(args.interval, 'PLC_SCAN_INTERVAL', SERVICE_CONFIG.get('interval_seconds', 2)))
+        args.connect_timeout = float(pick(args.connect_timeout, None, SERVICE_CONFIG.get('connect_timeout', 10.0)))
+        args.log_level = str(pick(args.log_level, 'PLC_LOG_LEVEL', 'INFO')).upper()
+    except ValueError as e:
+        parser.error(f"参数无效: {e}")
+    if args.mode not in MODES:
+        parser.error(f"采集模式无效: {args.mode}（可选 {', '.join(MODES)}）")
+    if args.interval <= 0:
+        parser.error(f"采集间隔无效: {args.interval}")
+    if args.mode == 'auto':
+        args.mode = 'adaptive' if ADAPTIVE_POLL_CONFIG.get('enabled') else 'fixed'
+    return args
+
+
+def main(argv=None):
+    """服务主函数，返回进程退出码"""
+    options = load_options(argv)
+
+    # 日志先于 snap7/paho 导入配置好，发布器模块中的 setup_logging 随后为空操作
+    from async_logging import setup_logging
+    setup_logging(options.log_file, level=getattr(logging, options.log_level, logging.INFO))
+
+    # 已知MQTT服务器时先在后台预解析，与下面的模块导入并行
+    from dns_cache import get_dns_cache
+    if options.broker:
+        get_dns_cache().prefetch(options.broker)
+
+    # 延迟导入（包含 snap7、paho 和各功能模块）
+    from plc_mqtt_publisher_optimized import PLCMQTTPublisherOptimized, prepare_connections, enable_features
+    logger.info(f"模块导入完成，耗时 {(time.monotonic() - _STARTED) * 1000:.0f} ms")
+
+    publisher = PLCMQTTPublisherOptimized(options.plc_ip)
+
+    # systemd/容器停止时发送 SIGTERM，按正常流程退出采集循环并断开连接
+    def handle_term(signum, frame):
+        logger.info(f"收到信号 {signum}，正在停止服务")
+        publisher.stop_collection()
+
+    signal.signal(signal.SIGTERM, handle_term)
+
+    try:
+        # 冗余端点、遗嘱消息等需在连接之前设置
+        # （启用故障切换时在配置的冗余端点间竞速连接，忽略 --plc-ip/--broker）
+        prepare_connections(publisher)
+
+        plc_ok, mqtt_ok = publisher.connect_parallel(
+            options.connect_timeout, broker=options.broker, port=options.port)
+        if not plc_ok or not mqtt_ok:
+            logger.error(f"连接失败（PLC: {plc_ok}, MQTT: {mqtt_ok}），服务退出")
+            return 1
+
+        enable_features(publisher)
+        logger.info(f"PLC: {publisher.plc_ip}，采集模式: {options.mode}，"
+                    f"从启动到开始扫描耗时 {(time.monotonic() - _STARTED) * 1000:.0f} ms")
+
+        if options.mode == 'adaptive':
+            publisher.collect_and_publish_adaptive()
+        else:
+            publisher.collect_and_publish_optimized(options.interval)
+        return 0
+
+    except Exception as e:
+        logger.error(f"服务运行时发生错误: {e}")
+        return 1
+    finally:
+        publisher.stop_collection()
+        publisher.disconnect_mqtt()
+        publisher.disconnect_plc()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+扫描阶段性能分析
+在读取、解码、变化检测、序列化、发布各阶段埋点计时，默认关闭时几乎没有开销；
+可通过MQTT命令或信号临时开启 cProfile 或采样分析，到时自动停止并把结果写入文件
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import logging
+import cProfile
+import pstats
+import threading
+from collections import Counter
+from datetime import datetime
+
+from config import PROFILING_CONFIG
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ('cprofile', 'sampling', 'stages')
+
+
+class _NullStage:
+    """分析关闭时使用的空计时器"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_STAGE = _NullStage()
+
+
+class _StageTimer:
+    """分析开启时的阶段计时器"""
+
+    __slots__ = ('stats', 'name', 'start')
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        record = self.stats.get(self.name)
+        if record is None:
+            self.stats[self.name] = [1, elapsed, elapsed]
+        else:
+            record[0] += 1
+            record[1] += elapsed
+            if elapsed > record[2]:
+                record[2] = elapsed
+        return False
+
+
+class ScanProfiler:
+    """扫描阶段性能分析器
+
+    采集线程每次扫描开始时调用 tick()，分析会话只在采集线程中启动和停止；
+    request() 可以在任意线程（MQTT回调、信号处理）中调用
+    """
+
+    def __init__(self, output_dir='profiles', default_seconds=30, max_seconds=600,
+                 sample_interval=0.005):
+        self.output_dir = output_dir
+        self.default_seconds = default_seconds
+        self.max_seconds = max_seconds
+        self.sample_interval = sample_interval
+        self.enabled = False
+        self.stats = {}
+        self.pending = None
+        self.mode = None
+        self.deadline = 0.0
+        self.started_at = None
+        self.profile = None
+        self.sampler = None
+        self.samples = None
+
+    @classmethod
+    def from_config(cls, config=None):
+        """根据 PROFILING_CONFIG 创建分析器"""
+        config = config or PROFILING_CONFIG
+        return cls(
+            output_dir=config.get('output_dir', 'profiles'),
+            default_seconds=config.get('default_seconds', 30),
+            max_seconds=config.get('max_seconds', 600),
+            sample_interval=config.get('sample_interval', 0.005),
+        )
+
+    def stage(self, name):
+        """返回阶段计时上下文，分析关闭时返回共享的空对象"""
+        if not self.enabled:
+            return NULL_STAGE
+        return _StageTimer(self.stats, name)
+
+    def request(self, mode='cprofile', seconds=None):
+        """请求开启一次分析，实际在下一次扫描开始时生效"""
+        if mode not in PROFILE_MODES:
+            logger.warning(f"未知的分析模式: {mode}")
+            return False
+        seconds = min(float(seconds or self.default_seconds), self.max_seconds)
+        self.pending = (mode, seconds)
+        logger.info(f"已请求性能分析: {mode}, {seconds}秒")
+        return True
+
+    def install_signal_handler(self, signal_name='SIGUSR1'):
+        """安装信号处理：收到信号时开启默认时长的 cProfile 分析"""
+        signum = getattr(signal, signal_name or '', None)
+        if signum is None:
+            logger.info(f"当前平台不支持信号 {signal_name}，仅可通过MQTT命令开启分析")
+            return False
+        signal.signal(signum, lambda num, frame: self.request('cprofile'))
+        logger.info(f"发送 {signal_name} 信号可开启 cProfile 分析")
+        return True
+
+    def tick(self):
+        """在采集线程中每次扫描开始时调用，处理分析会话的启动和到期"""
+        if self.pending is not None:
+            mode, seconds = self.pending
+            self.pending = None
+            if self.mode is not None:
+                self._finish()
+            self._start(mode, seconds)
+        elif self.mode is not None and time.monotonic() >= self.deadline:
+            self._finish()
+
+    def stop(self):
+        """立即结束正在进行的分析并保存结果"""
+        if self.mode is not None:
+            self._finish()
+
+    def _start(self, mode, seconds):
+        self.mode = mode
+        self.deadline = time.monotonic() + seconds
+        self.started_at = datetime.now()
+        self.stats = {}
+        self.enabled = True
+
+        if mode == 'cprofile':
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        elif mode == 'sampling':
+            self.samples = Counter()
+            self.sampler = threading.Thread(
+                target=self._sample_loop, args=(threading.get_ident(),),
+                name='profile-sampler', daemon=True
+            )
+            self.sampler.start()
+        logger.info(f"性能分析已开启: {mode}, {seconds}秒")
+
+    def _sample_loop(self, thread_id):
+        """采样线程：定期记录采集线程的调用栈"""
+        while self.mode == 'sampling':
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.samples[';'.join(reversed(stack))] += 1
+            time.sleep(self.sample_interval)
+
+    def _finish(self):
+        mode = self.mode
+        self.mode = None
+        self.enabled = False
+
+        if self.profile is not None:
+            self.profile.disable()
+        if self.sampler is not None:
+            self.sampler.join(timeout=1)
+
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            prefix = os.path.join(
+                self.output_dir, f"{mode}_{self.started_at.strftime('%Y%m%d_%H%M%S')}"
+            )
+            files = [self._write_stage_stats(prefix + '_stages.json')]
+            if self.profile is not None:
+                files.extend(self._write_cprofile(prefix))
+            if self.samples is not None:
+                files.append(self._write_samples(prefix + '_samples.txt'))
+            logger.info(f"性能分析结束，结果已保存: {', '.join(files)}")
+        except Exception as e:
+            logger.error(f"保存性能分析结果时发生错误: {e}")
+        finally:
+            self.profile = None
+            self.sampler = None
+            self.samples = None
+
+    def _write_stage_stats(self, filename):
+        summary = {
+            name: {
+                'count': count,
+                'total_ms': round(total * 1000, 3),
+                'avg_ms': round(total * 1000 / count, 3),
+                'max_ms': round(maximum * 1000, 3),
+            }
+            for name, (count, total, maximum) in self.stats.items()
+        }
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        return filename
+
+    def _write_cprofile(self, prefix):
+        # .prof 可用 snakeviz 等工具查看，.txt 为按累计时间排序的文本摘要
+        prof_file = prefix + '.prof'
+        text_file = prefix + '.txt'
+        self.profile.dump_stats(prof_file)
+        with open(text_file, 'w', encoding='utf-8') as f:
+            stats = pstats.Stats(self.profile, stream=f)
+            stats.sort_stats('cumulative').print_stats(50)
+        return [prof_file, text_file]
+
+    def _write_samples(self, filename):
+        # 折叠栈格式，可直接用 flamegraph.pl 生成火焰图
+        with open(filename, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return filename
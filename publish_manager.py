@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MQTT发布管理
+跟踪 QoS 1 消息的在途状态（mid -> 发送时间），限制在途窗口大小，
+统计 发布 -> PUBACK 延迟；已交给 paho 的消息由 paho 负责重连后重发，
+只有 paho 拒收或断线时未交出的消息写入离线缓存，连接恢复后再补发，内存占用始终有上限
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+
+import paho.mqtt.client as mqtt
+
+logger = logging.getLogger(__name__)
+
+
+class InflightMessage:
+    """一条在途消息"""
+
+    __slots__ = ('topic', 'payload', 'qos', 'retain', 'spool', 'sent_at', 'timed_out')
+
+    def __init__(self, topic, payload, qos, retain, spool=True):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.spool = spool
+        self.sent_at = 0.0
+        self.timed_out = False
+
+
+class PublishManager:
+    """MQTT发布管理器"""
+
+    def __init__(self, client, max_inflight=20, max_queued=100, ack_timeout=10.0,
+                 block_timeout=1.0, spool_file='mqtt_spool.jsonl', spool_max_bytes=50 * 1024 * 1024,
+                 replay_batch=50, is_connected=None):
+        self.client = client
+        self.max_inflight = max_inflight
+        self.ack_timeout = ack_timeout
+        self.block_timeout = block_timeout
+        self.spool_file = spool_file
+        self.spool_max_bytes = spool_max_bytes
+        self.replay_batch = replay_batch
+        self.is_connected = is_connected or (lambda: True)
+
+        self.inflight = {}
+        # PUBACK 可能先于 publish() 返回到达：mid -> 确认时刻（早于本次发送的记录属于复用该ID的旧消息）
+        self.early_acks = {}
+        # 注意：paho 在持有内部锁时调用 on_publish，而 client.publish() 也需要该锁，
+        # 因此调用 client.publish() 时不能持有本锁，否则会互相等待
+        self.condition = threading.Condition()
+        self.spool_lock = threading.Lock()
+        # 离线缓存读取位置（字节偏移），补发时只读取下一批，不重写整个文件；
+        # 偏移保存在游标文件中，重启后不重复补发
+        self.cursor_file = spool_file + '.offset'
+        self.spool_offset = self._load_offset()
+        self.latencies = deque(maxlen=1000)
+
+        self.stats = {
+            'published': 0,   # 已发送
+            'acked': 0,       # 已收到PUBACK
+            'timed_out': 0,   # 超时未确认（仍由 paho 负责重发）
+            'spooled': 0,     # 写入离线缓存
+            'replayed': 0,    # 从离线缓存补发
+            'dropped': 0,     # 离线缓存已满丢弃
+            'discarded': 0,   # 不写入离线缓存的消息未能发出
+            'blocked': 0,     # 在途窗口已满导致等待
+        }
+
+        # 同时限制 paho 内部的在途和排队消息数量
+        client.max_inflight_messages_set(max_inflight)
+        client.max_queued_messages_set(max_queued)
+
+    @classmethod
+    def from_config(cls, client, config, is_connected=None):
+        """根据 PUBLISH_CONFIG 创建发布管理器"""
+        options = {key: value for key, value in config.items() if key != 'enabled'}
+        return cls(client, is_connected=is_connected, **options)
+
+    def publish(self, topic, payload, qos=1, retain=False, spool=True):
+        """发布一条消息，返回是否已交给 paho
+
+        未交出的 QoS 1 消息会写入离线缓存；spool 为 False 时直接丢弃（补发已无意义的消息，
+        如带序号的增量消息，稍后补发会与新序号冲突）
+        """
+        return self.publish_tracked(topic, payload, qos, retain, spool) is not None
+
+    def publish_tracked(self, topic, payload, qos=1, retain=False, spool=True):
+        """发布一条消息，返回该消息的ID，未交给 paho 时返回 None"""
+        message = InflightMessage(topic, payload, qos, retain, spool)
+        if qos == 0:
+            return self._send(message)
+
+        if not self.is_connected():
+            self._spool(message)
+            return None
+
+        # 背压：在途窗口已满时阻塞发布方，直到收到PUBACK或超时；
+        # 在 paho 网络线程中（如命令处理回调）不能等待，否则 PUBACK 无法处理
+        if len(self.inflight) >= self.max_inflight:
+            self.stats['blocked'] += 1
+            self.check_timeouts()
+            has_room = False
+            if not self._on_network_thread():
+                with self.condition:
+                    has_room = self.condition.wait_for(
+                        lambda: len(self.inflight) < self.max_inflight, self.block_timeout)
+            if not has_room:
+                logger.warning(f"在途消息已达上限 {self.max_inflight}，消息写入离线缓存")
+                self._spool(message)
+                return None
+        return self._send(message)
+
+    def _on_network_thread(self):
+        thread = getattr(self.client, '_thread', None)
+        return thread is not None and thread is threading.current_thread()
+
+    def _send(self, message):
+        sent_at = time.monotonic()
+        try:
+            result = self.client.publish(message.topic, message.payload,
+                                         qos=message.qos, retain=message.retain)
+        except Exception as e:
+            logger.error(f"发布MQTT数据时发生错误 ({message.topic}): {e}")
+            result = None
+
+        if result is None:
+            if message.qos > 0:
+                self._spool(message)
+            return None
+        if result.rc != mqtt.MQTT_ERR_SUCCESS:
+            if result.rc == mqtt.MQTT_ERR_NO_CONN and message.qos > 0:
+                # paho 已保留该消息，连接恢复后自行发送，不写入离线缓存（否则会重复）
+                logger.warning(f"MQTT未连接，消息 {result.mid} 由 paho 在重连后发送 ({message.topic})")
+            else:
+                logger.error(f"MQTT发布失败 ({message.topic})，错误码: {result.rc}")
+                if message.qos > 0:
+                    self._spool(message)
+                return None
+
+        message.sent_at = sent_at
+        with self.condition:
+            self.stats['published'] += 1
+            if message.qos > 0:
+                acked_at = self.early_acks.pop(result.mid, None)
+                if acked_at is not None and acked_at >= sent_at:
+                    # PUBACK 已先于 publish() 返回到达
+                    self._record_ack(message, acked_at)
+                else:
+                    self.inflight[result.mid] = message
+        return result.mid
+
+    def on_publish(self, mid):
+        """PUBACK 回调（在 paho 网络线程中调用）"""
+        now = time.monotonic()
+        with self.condition:
+            message = self.inflight.pop(mid, None)
+            if message is None:
+                # 也可能是 QoS 0 消息的回调，过期的记录按时刻排除
+                if len(self.early_acks) >= self.max_inflight * 4:
+                    self.early_acks.clear()
+                self.early_acks[mid] = now
+                return
+            self._record_ack(message, now)
+            self.condition.notify_all()
+
+    def _record_ack(self, message, acked_at):
+        self.stats['acked'] += 1
+        self.latencies.append(acked_at - message.sent_at)
+
+    def check_timeouts(self):
+        """记录超时未确认的消息
+
+        已交给 paho 的 QoS 1 消息由 paho 保留，重连后以原消息ID重发，这里不重发也不写入离线缓存，
+        否则服务器会收到重复消息；消息仍占用在途窗口，直到收到 PUBACK
+        """
+        now = time.monotonic()
+        expired = []
+        with self.condition:
+            for mid, message in self.inflight.items():
+                if not message.timed_out and now - message.sent_at >= self.ack_timeout:
+                    message.timed_out = True
+                    expired.append(mid)
+            self.stats['timed_out'] += len(expired)
+        if expired:
+            logger.warning(f"{len(expired)} 条消息超过 {self.ack_timeout} 秒未确认（消息ID: "
+                           f"{', '.join(map(str, expired[:10]))}），等待 paho 重发")
+
+    def service(self):
+        """每次扫描调用一次：处理超时并在连接正常时补发离线缓存"""
+        self.check_timeouts()
+        if (self.is_connected() and len(self.inflight) < self.max_inflight
+                and self._spool_size() > self.spool_offset):
+            self.replay_spool()
+
+    def _spool_size(self):
+        try:
+            return os.path.getsize(self.spool_file)
+        except OSError:
+            return 0
+
+    def _load_offset(self):
+        try:
+            with open(self.cursor_file, 'r', encoding='utf-8') as f:
+                offset = int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+        # 缓存文件已被删除或替换时从头开始
+        return offset if 0 <= offset <= self._spool_size() else 0
+
+    def _save_offset(self):
+        try:
+            with open(self.cursor_file, 'w', encoding='utf-8') as f:
+                f.write(str(self.spool_offset))
+        except OSError as e:
+            logger.error(f"保存离线缓存读取位置时发生错误: {e}")
+
+    def _reset_spool(self):
+        """缓存已全部补发：删除缓存文件和游标文件"""
+        for path in (self.spool_file, self.cursor_file):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.spool_offset = 0
+
+    def _compact_spool(self):
+        """已补发部分超过未补发部分时，只保留未补发部分（按字节摊销为线性开销）"""
+        tmp_file = self.spool_file + '.tmp'
+        with open(self.spool_file, 'rb') as src, open(tmp_file, 'wb') as dst:
+            src.seek(self.spool_offset)
+            while True:
+                chunk = src.read(1024 * 1024)
+                if not chunk:
+                    break
+                dst.write(chunk)
+        os.replace(tmp_file, self.spool_file)
+        self.spool_offset = 0
+
+    def _spool(self, message):
+        """写入离线缓存文件"""
+        if not message.spool:
+            self.stats['discarded'] += 1
+            return
+        # 只按未补发部分计算上限，已补发部分会在补发过程中清理
+        if self._spool_size() - self.spool_offset >= self.spool_max_bytes:
+            self.stats['dropped'] += 1
+            logger.error(f"离线缓存已满，丢弃消息 ({message.topic})")
+            return
+        payload = message.payload
+        if isinstance(payload, bytes):
+            payload = payload.decode('utf-8', errors='replace')
+        record = {'topic': message.topic, 'payload': payload, 'qos': message.qos, 'retain': message.retain}
+        try:
+            with self.spool_lock, open(self.spool_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self.stats['spooled'] += 1
+        except OSError as e:
+            self.stats['dropped'] += 1
+            logger.error(f"写入离线缓存时发生错误: {e}")
+
+    def replay_spool(self):
+        """从离线缓存补发一批消息，未补发的保留在缓存中
+
+        从读取位置起只读取一批，先推进读取位置再发送，补发失败的消息会重新追加到缓存末尾；
+        读到文件末尾时删除缓存文件
+        """
+        room = min(self.replay_batch, self.max_inflight - len(self.inflight))
+        batch = []
+        with self.spool_lock:
+            try:
+                with open(self.spool_file, 'rb') as f:
+                    f.seek(self.spool_offset)
+                    while len(batch) < room:
+                        line = f.readline()
+                        if not line:
+                            break
+                        batch.append(line)
+                    self.spool_offset = f.tell()
+                    remaining = os.fstat(f.fileno()).st_size - self.spool_offset
+            except OSError:
+                return 0
+
+            try:
+                if remaining <= 0:
+                    self._reset_spool()
+                else:
+                    if self.spool_offset >= remaining:
+                        self._compact_spool()
+                    self._save_offset()
+            except OSError as e:
+                logger.error(f"整理离线缓存时发生错误: {e}")
+
+        replayed = 0
+        for line in batch:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            message = InflightMessage(record['topic'], record['payload'],
+                                      record.get('qos', 1), record.get('retain', False))
+            if self._send(message) is not None:
+                replayed += 1
+        self.stats['replayed'] += replayed
+        if replayed:
+            logger.info(f"已从离线缓存补发 {replayed} 条消息，剩余 {max(remaining, 0)} 字节")
+        return replayed
+
+    def get_stats(self):
+        """返回发布统计和 PUBACK 延迟（毫秒）"""
+        with self.condition:
+            stats = dict(self.stats)
+            stats['inflight'] = len(self.inflight)
+            latencies = sorted(self.latencies)
+        if latencies:
+            stats['ack_latency_ms'] = {
+                'p50': round(latencies[len(latencies) // 2] * 1000, 2),
+                'p95': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 2),
+                'max': round(latencies[-1] * 1000, 2),
+            }
+        return stats
@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+读取计划
+将标签配置编译为一次连续块读取加一组预先生成的解码函数，
+解码结果保持与原有发布数据相同的结构。
+支持常用的 S7 基本类型、数组（数值数组按一个 struct 格式整体解码）和
+按偏移描述的 UDT 结构（展开为 "实例.成员" 形式的标签）。
+每个计划持有两块预分配的读取缓冲区交替使用（当前扫描和上次扫描），
+稳态下读取不再分配新的缓冲区，比较两块缓冲区即可判断原始数据是否变化
+"""
+
+import ctypes
+import struct
+import logging
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+# 数据类型: (字节数, struct 格式字符)，字节数为 None 表示由标签参数决定，
+# 格式字符为 None 的类型由专用解码函数处理
+TYPE_LAYOUTS = {
+    'BOOL': (1, None),
+    'BYTE': (1, 'B'),
+    'CHAR': (1, None),
+    'SINT': (1, 'b'),
+    'USINT': (1, 'B'),
+    'WORD': (2, 'H'),
+    'INT': (2, 'h'),
+    'UINT': (2, 'H'),
+    'DATE': (2, None),             # 1990-01-01 起的天数
+    'DWORD': (4, 'I'),
+    'DINT': (4, 'i'),
+    'UDINT': (4, 'I'),
+    'REAL': (4, 'f'),
+    'TIME': (4, 'i'),              # 毫秒
+    'TIME_OF_DAY': (4, 'I'),       # 当天零点起的毫秒数
+    'LWORD': (8, 'Q'),
+    'LINT': (8, 'q'),
+    'ULINT': (8, 'Q'),
+    'LREAL': (8, 'd'),
+    'DATE_AND_TIME': (8, None),    # BCD 编码的日期时间
+    'DTL': (12, None),
+    'STRING': (None, None),
+    'WSTRING': (None, None),
+}
+
+# 类型别名
+TYPE_ALIASES = {'DT': 'DATE_AND_TIME', 'TOD': 'TIME_OF_DAY'}
+
+# 解码结果为浮点数的类型
+FLOAT_TYPES = frozenset({'REAL', 'LREAL'})
+
+# STRING/WSTRING 的最大长度
+MAX_STRING_LENGTH = {'STRING': 254, 'WSTRING': 16382}
+
+# UDT 最大嵌套层数（防止循环引用）
+MAX_UDT_DEPTH = 8
+
+_DATE_EPOCH_ORDINAL = 726468   # date(1990, 1, 1).toordinal()
+_DTL = struct.Struct('>HBBBBBBI')
+_WORD = struct.Struct('>H')
+
+
+class TagSpec:
+    """单个标签的地址和类型定义（array 大于 0 时为数组）"""
+
+    __slots__ = ('name', 'type', 'address', 'bit', 'length', 'group', 'deadband', 'array')
+
+    def __init__(self, name, type, address, bit=0, length=0, group=None, deadband=0, array=0):
+        self.name = name
+        self.type = type
+        self.address = address
+        self.bit = bit
+        self.length = length
+        self.group = group
+        self.deadband = deadband
+        self.array = array
+
+    @property
+    def element_size(self):
+        if self.type == 'STRING':
+            return self.length + 2
+        if self.type == 'WSTRING':
+            return self.length * 2 + 4
+        return TYPE_LAYOUTS[self.type][0]
+
+    @property
+    def stride(self):
+        """数组元素间距（字符串元素从偶数地址开始）"""
+        size = self.element_size
+        if self.type in MAX_STRING_LENGTH:
+            return size + (size & 1)
+        return size
+
+    @property
+    def size(self):
+        if not self.array:
+            return self.element_size
+        if self.type == 'BOOL':
+            return (self.bit + self.array + 7) // 8
+        return self.stride * (self.array - 1) + self.element_size
+
+    def key(self):
+        """用于判断两次配置中同名标签的定义是否一致"""
+        return (self.type, self.address, self.bit, self.length, self.group, self.deadband, self.array)
+
+
+def normalize_type(value):
+    """类型名转为大写并解析别名"""
+    tag_type = str(value).upper()
+    return TYPE_ALIASES.get(tag_type, tag_type)
+
+
+def parse_tag_config(items, udts=None):
+    """将标签配置列表展开并校验为 TagSpec 列表，配置错误时抛出 ValueError
+
+    udts 为 {UDT名: [成员配置]}，成员配置与标签配置相同，但用相对 UDT 起始地址的 offset
+    代替 address；UDT 类型的标签展开为 "实例.成员"（数组为 "实例[i].成员"）
+    """
+    udts = {normalize_type(name): members for name, members in (udts or {}).items()}
+    tags = []
+    for index, item in enumerate(items):
+        try:
+            name = item['name']
+            tag_type = normalize_type(item['type'])
+            address = int(item['address'])
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"第 {index + 1} 个标签配置无效: {item} ({e})")
+
+        if address < 0:
+            raise ValueError(f"标签 {name} 的地址无效: {address}")
+        _add_tags(tags, item, name, tag_type, address, item.get('group'), udts, 0)
+
+    names = [tag.name for tag in tags]
+    duplicates = {name for name in names if names.count(name) > 1}
+    if duplicates:
+        raise ValueError(f"标签名称重复: {', '.join(sorted(duplicates))}")
+    return tags
+
+
+def _add_tags(tags, item, name, tag_type, address, group, udts, depth):
+    """校验一项标签（或 UDT 成员）配置并追加到 tags"""
+    try:
+        array = int(item.get('array', 0))
+        bit = int(item.get('bit', 0))
+        length = int(item.get('length', 0))
+        deadband = float(item.get('deadband', 0))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"标签 {name} 的配置无效: {item} ({e})")
+    if array < 0:
+        raise ValueError(f"标签 {name} 的数组长度无效: {array}")
+
+    if tag_type in udts:
+        if depth >= MAX_UDT_DEPTH:
+            raise ValueError(f"UDT {tag_type} 嵌套层数过多（可能存在循环引用）")
+        if not array:
+            _add_udt(tags, name, tag_type, address, group, udts, depth)
+            return
+        stride = udt_size(udts, tag_type)
+        for i in range(array):
+            _add_udt(tags, f"{name}[{i}]", tag_type, address + i * stride, group, udts, depth)
+        return
+
+    if tag_type not in TYPE_LAYOUTS:
+        raise ValueError(f"标签 {name} 的数据类型不支持: {tag_type}")
+
+    if tag_type == 'BOOL':
+        count = int(item.get('count', 0))
+        if count > 0:
+            # 连续位展开为 name1..nameN
+            for i in range(count):
+                tags.append(TagSpec(f"{name}{i + 1}", 'BOOL', address + i // 8, i % 8, group=group))
+            return
+        if not 0 <= bit <= 7:
+            raise ValueError(f"标签 {name} 的位号无效: {bit}")
+        tags.append(TagSpec(name, 'BOOL', address, bit, group=group, array=array))
+    elif tag_type in MAX_STRING_LENGTH:
+        if not 0 < length <= MAX_STRING_LENGTH[tag_type]:
+            raise ValueError(f"标签 {name} 的字符串长度无效: {length}")
+        tags.append(TagSpec(name, tag_type, address, length=length, group=group, array=array))
+    else:
+        if deadband and (array or TYPE_LAYOUTS[tag_type][1] is None):
+            raise ValueError(f"标签 {name} 的类型不支持死区: {tag_type}{'数组' if array else ''}")
+        tags.append(TagSpec(name, tag_type, address, group=group, deadband=deadband, array=array))
+
+
+def _add_udt(tags, name, udt_name, address, group, udts, depth):
+    for member in udts[udt_name]:
+        try:
+            member_name = member['name']
+            member_type = normalize_type(member['type'])
+            offset = int(member['offset'])
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"UDT {udt_name} 的成员配置无效: {member} ({e})")
+        _add_tags(tags, member, f"{name}.{member_name}", member_type, address + offset, group, udts, depth + 1)
+
+
+def udt_size(udts, udt_name, depth=0):
+    """UDT 占用的字节数（按偶数字节对齐，用作 UDT 数组的元素间距）"""
+    if depth >= MAX_UDT_DEPTH:
+        raise ValueError(f"UDT {udt_name} 嵌套层数过多（可能存在循环引用）")
+    size = 0
+    for member in udts[udt_name]:
+        member_type = normalize_type(member['type'])
+        array = int(member.get('array', 0))
+        if member_type in udts:
+            member_size = udt_size(udts, member_type, depth + 1) * max(array, 1)
+        elif member_type == 'BOOL' and int(member.get('count', 0)) > 0:
+            member_size = (int(member['count']) + 7) // 8
+        elif member_type in TYPE_LAYOUTS:
+            member_size = TagSpec('', member_type, 0, int(member.get('bit', 0)),
+                                  int(member.get('length', 0)), array=array).size
+        else:
+            raise ValueError(f"UDT {udt_name} 的成员类型不支持: {member_type}")
+        size = max(size, int(member['offset']) + member_size)
+    return size + (size & 1)
+
+
+def _bcd(value):
+    return (value >> 4) * 10 + (value & 0x0F)
+
+
+def make_element_decoder(tag, offset):
+    """为标签的单个元素生成解码函数 decode(buf)"""
+    tag_type = tag.type
+    if tag_type == 'BOOL':
+        mask = 1 << tag.bit
+        return lambda buf: bool(buf[offset] & mask)
+
+    if tag_type == 'STRING':
+        length = tag.length
+
+        def decode_string(buf):
+            # 西门子字符串格式：第一个字节是最大长度，第二个字节是实际长度
+            actual_length = buf[offset + 1]
+            if 0 < actual_length <= length:
+                # buf 为 memoryview 时切片不复制数据
+                return str(buf[offset + 2:offset + 2 + actual_length], 'utf-8', 'ignore')
+            return ""
+        return decode_string
+
+    if tag_type == 'WSTRING':
+        length = tag.length
+
+        def decode_wstring(buf):
+            # 最大长度和实际长度各占一个字，之后为 UTF-16 字符
+            actual_length = _WORD.unpack_from(buf, offset + 2)[0]
+            if 0 < actual_length <= length:
+                return str(buf[offset + 4:offset + 4 + actual_length * 2], 'utf-16-be', 'ignore')
+            return ""
+        return decode_wstring
+
+    if tag_type == 'CHAR':
+        return lambda buf: chr(buf[offset])
+
+    if tag_type == 'DATE':
+        def decode_date(buf):
+            days = _WORD.unpack_from(buf, offset)[0]
+            return date.fromordinal(_DATE_EPOCH_ORDINAL + days).isoformat()
+        return decode_date
+
+    if tag_type == 'DTL':
+        def decode_dtl(buf):
+            year, month, day, _, hour, minute, second, nanosecond = _DTL.unpack_from(buf, offset)
+            return (f"{year:04d}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}:{second:02d}"
+                    f".{nanosecond // 1000000:03d}")
+        return decode_dtl
+
+    if tag_type == 'DATE_AND_TIME':
+        def decode_date_and_time(buf):
+            year = _bcd(buf[offset])
+            year += 1900 if year >= 90 else 2000
+            millisecond = _bcd(buf[offset + 6]) * 10 + (buf[offset + 7] >> 4)
+            return (f"{year:04d}-{_bcd(buf[offset + 1]):02d}-{_bcd(buf[offset + 2]):02d} "
+                    f"{_bcd(buf[offset + 3]):02d}:{_bcd(buf[offset + 4]):02d}:{_bcd(buf[offset + 5]):02d}"
+                    f".{millisecond:03d}")
+        return decode_date_and_time
+
+    unpack_from = struct.Struct('>' + TYPE_LAYOUTS[tag_type][1]).unpack_from
+    return lambda buf: unpack_from(buf, offset)[0]
+
+
+def make_decoder(tag, offset):
+    """为标签生成解码函数 decode(buf)，offset 为标签在读取块中的偏移；数组解码为列表"""
+    count = tag.array
+    if not count:
+        return make_element_decoder(tag, offset)
+
+    if tag.type == 'BOOL':
+        positions = [(offset + (tag.bit + i) // 8, 1 << ((tag.bit + i) % 8)) for i in range(count)]
+        return lambda buf: [bool(buf[index] & mask) for index, mask in positions]
+
+    if tag.type == 'CHAR':
+        # 字符数组按字符串解码，去掉末尾的空字符
+        return lambda buf: str(buf[offset:offset + count], 'latin-1').rstrip('\x00')
+
+    code = TYPE_LAYOUTS[tag.type][1]
+    if code is not None:
+        # 数值数组整体解码，一次 struct 调用
+        unpack_from = struct.Struct(f'>{count}{code}').unpack_from
+        return lambda buf: list(unpack_from(buf, offset))
+
+    stride = tag.stride
+    decoders = [make_element_decoder(tag, offset + i * stride) for i in range(count)]
+    return lambda buf: [decode(buf) for decode in decoders]
+
+
+class ReadBuffer:
+    """预分配的读取缓冲区，snap7 直接写入其中"""
+
+    __slots__ = ('data', 'view', '_native')
+
+    def __init__(self, size):
+        self.data = bytearray(size)
+        self.view = memoryview(self.data)
+        # 与 data 共享内存的 ctypes 数组，供 Cli_DBRead 直接写入
+        self._native = (ctypes.c_ubyte * size).from_buffer(self.data)
+
+    def read(self, client, db_number, start):
+        """读取 [start, start + 缓冲区大小) 到缓冲区，失败时抛出异常（缓冲区内容不确定）"""
+        db_read_into(client, db_number, start, self._native, self.view)
+
+
+def native_client(client):
+    """返回 snap7 客户端底层的 (动态库, 客户端句柄)，不支持直接调用时返回 (None, None)
+
+    python-snap7 2.x 为 _lib/_s7_client，1.x 为 _library/_pointer
+    """
+    for library_attr, pointer_attr in (('_lib', '_s7_client'), ('_library', '_pointer')):
+        library = getattr(client, library_attr, None)
+        pointer = getattr(client, pointer_attr, None)
+        if library is not None and pointer is not None and hasattr(library, 'Cli_DBRead'):
+            return library, pointer
+    return None, None
+
+
+def db_read_into(client, db_number, start, native, view):
+    """读取 [start, start + len(view)) 写入 view，native 为与 view 共享内存的 ctypes 数组"""
+    size = len(view)
+    library, pointer = native_client(client)
+    if library is not None:
+        # python-snap7 的 db_read 每次分配新的 ctypes 数组和 bytearray，这里直接调用底层库
+        code = library.Cli_DBRead(pointer, db_number, start, size, ctypes.byref(native))
+        if code != 0:
+            raise IOError(f"读取数据块失败，错误码: {code:#x}")
+        return
+    data = client.db_read(db_number, start, size)
+    if len(data) < size:
+        raise IOError(f"读取数据长度不足: {len(data)}/{size}")
+    view[:] = memoryview(data)[:size]
+
+
+class ReadPlan:
+    """编译后的读取计划：一次读取 [start, start + size) 并解码全部标签"""
+
+    def __init__(self, db_number, tags):
+        if not tags:
+            raise ValueError("读取计划中没有标签")
+        self.db_number = db_number
+        self.tags = list(tags)
+        self.by_name = {tag.name: tag for tag in self.tags}
+        self.start = min(tag.address for tag in self.tags)
+        self.size = max(tag.address + tag.size for tag in self.tags) - self.start
+        self.decoders = [
+            (tag.name, tag.group, make_decoder(tag, tag.address - self.start))
+            for tag in self.tags
+        ]
+        self.deadband_tags = [tag for tag in self.tags if tag.deadband > 0]
+        self._subsets = {}
+        # 双缓冲：buffers[current] 为最近一次读取，另一块为上一次读取
+        self.buffers = (ReadBuffer(self.size), ReadBuffer(self.size))
+        self.current = 0
+        self.valid = 0     # 连续成功读取的缓冲区数量（0-2）
+
+    @classmethod
+    def from_config(cls, config):
+        """根据 TAG_CONFIG 格式的配置编译读取计划"""
+        return cls(int(config.get('db_number', 9000)), parse_tag_config(config['tags'], config.get('udts')))
+
+    def read(self, client):
+        """执行一次块读取并返回解码后的数据"""
+        return self.decode(self.read_raw(client))
+
+    def read_raw(self, client):
+        """执行一次块读取，返回原始数据（缓冲区的 memoryview，两次读取后会被覆盖）"""
+        target = self.buffers[1 - self.current]
+        try:
+            target.read(client, self.db_number, self.start)
+        except Exception:
+            self.valid = 0
+            raise
+        self.current = 1 - self.current
+        self.valid = min(self.valid + 1, 2)
+        return target.view
+
+    def raw_unchanged(self):
+        """最近两次读取都成功且原始数据完全相同"""
+        return self.valid == 2 and self.buffers[0].data == self.buffers[1].data
+
+    def decode(self, buf):
+        """解码读取块，返回与发布数据 data 字段相同结构的字典"""
+        data = {}
+        for name, group, decode in self.decoders:
+            if group is None:
+                data[name] = decode(buf)
+            else:
+                bucket = data.get(group)
+                if bucket is None:
+                    bucket = data[group] = {}
+                bucket[name] = decode(buf)
+        return data
+
+    def subset(self, keys):
+        """返回只包含指定键（标签名或分组名）的子计划，结果会被缓存"""
+        keys = tuple(keys)
+        plan = self._subsets.get(keys)
+        if plan is None:
+            tags = [tag for tag in self.tags if tag.name in keys or tag.group in keys]
+            plan = self._subsets[keys] = ReadPlan(self.db_number, tags)
+        return plan
+
+    def apply_deadband(self, data, state):
+        """死区处理：变化量不超过死区时沿用上次上报值，state 保存各标签上次上报值"""
+        for tag in self.deadband_tags:
+            bucket = data if tag.group is None else data.get(tag.group, {})
+            value = bucket.get(tag.name)
+            if value is None:
+                continue
+            last = state.get(tag.name)
+            if last is not None and abs(value - last) <= tag.deadband:
+                bucket[tag.name] = last
+            else:
+                state[tag.name] = value
+        return data
+
+    def unchanged_tags(self, other):
+        """返回与另一个计划相比定义未变化的标签名集合"""
+        if other is None or other.db_number != self.db_number:
+            return set()
+        return {
+            name for name, tag in self.by_name.items()
+            if name in other.by_name and other.by_name[name].key() == tag.key()
+        }
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量报警规则引擎
+规则表达式启动时编译一次，并建立 标签 -> 规则 依赖索引；
+每次扫描只重新计算输入发生变化的规则，报警按 正常/激活/已确认/已清除 状态机流转
+"""
+
+import time
+import logging
+import threading
+from datetime import datetime
+
+from tag_expression import compile_expression
+
+logger = logging.getLogger(__name__)
+
+# 报警状态
+STATE_NORMAL = 'normal'      # 正常
+STATE_ACTIVE = 'active'      # 激活，未确认
+STATE_ACKED = 'acked'        # 激活，已确认
+STATE_CLEARED = 'cleared'    # 条件已消失，未确认
+
+
+class AlarmRule:
+    """单条报警规则及其状态"""
+
+    __slots__ = ('name', 'expression', 'evaluate', 'dependencies', 'delay',
+                 'severity', 'message', 'state', 'condition', 'pending_since')
+
+    def __init__(self, name, expression, delay=0, severity='warning', message=''):
+        self.name = name
+        self.expression = expression
+        self.evaluate, self.dependencies = compile_expression(expression)
+        self.delay = delay
+        self.severity = severity
+        self.message = message or expression
+        self.state = STATE_NORMAL
+        self.condition = False
+        self.pending_since = None
+
+
+class RuleEngine:
+    """增量报警规则引擎"""
+
+    def __init__(self, rules=()):
+        self.rules = {}
+        self.index = {}       # 标签名 -> 依赖该标签的规则列表
+        self.pending = {}     # 等待延时确认的规则
+        self.lock = threading.Lock()
+        for rule in rules:
+            self.add_rule(rule)
+
+    @classmethod
+    def from_config(cls, config):
+        """根据 ALARM_RULES_CONFIG 创建规则引擎"""
+        rules = [
+            AlarmRule(
+                item['name'],
+                item['expression'],
+                delay=item.get('delay', 0),
+                severity=item.get('severity', 'warning'),
+                message=item.get('message', ''),
+            )
+            for item in config.get('rules', [])
+        ]
+        return cls(rules)
+
+    def add_rule(self, rule):
+        """注册规则并更新依赖索引"""
+        if rule.name in self.rules:
+            raise ValueError(f"报警规则重复: {rule.name}")
+        self.rules[rule.name] = rule
+        for tag in rule.dependencies:
+            self.index.setdefault(tag, []).append(rule)
+
+    def evaluate(self, values, changed_tags=None, now=None):
+        """根据变化的标签重新计算相关规则，返回产生的报警事件列表
+
+        changed_tags 为 None 时计算全部规则（用于首次扫描）
+        """
+        if now is None:
+            now = time.monotonic()
+
+        if changed_tags is None:
+            candidates = set(self.rules.values())
+        else:
+            candidates = set()
+            index = self.index
+            for tag in changed_tags:
+                rules = index.get(tag)
+                if rules:
+                    candidates.update(rules)
+
+        events = []
+        with self.lock:
+            for rule in candidates:
+                try:
+                    rule.condition = bool(rule.evaluate(values))
+                except (KeyError, TypeError, ZeroDivisionError) as e:
+                    # 输入缺失或读取失败时保持原状态
+                    logger.debug(f"报警规则 {rule.name} 计算失败: {e}")
+                    continue
+
+                if rule.condition:
+                    if rule.state in (STATE_ACTIVE, STATE_ACKED) or rule.name in self.pending:
+                        continue
+                    if rule.delay > 0:
+                        rule.pending_since = now
+                        self.pending[rule.name] = rule
+                    else:
+                        self._activate(rule, values, events)
+                else:
+                    self.pending.pop(rule.name, None)
+                    rule.pending_since = None
+                    self._clear(rule, values, events)
+
+            # 条件持续满足的延时规则，即使输入未变化也需要按时间检查
+            for rule in list(self.pending.values()):
+                if now - rule.pending_since >= rule.delay:
+                    del self.pending[rule.name]
+                    rule.pending_since = None
+                    self._activate(rule, values, events)
+
+        return events
+
+    def acknowledge(self, name):
+        """确认报警，返回确认事件（无需确认时返回 None）"""
+        with self.lock:
+            rule = self.rules.get(name)
+            if rule is None:
+                logger.warning(f"确认报警失败，规则不存在: {name}")
+                return None
+            if rule.state == STATE_ACTIVE:
+                return self._transition(rule, STATE_ACKED, 'ack')
+            if rule.state == STATE_CLEARED:
+                return self._transition(rule, STATE_NORMAL, 'ack')
+            return None
+
+    def _activate(self, rule, values, events):
+        if rule.state in (STATE_NORMAL, STATE_CLEARED):
+            events.append(self._transition(rule, STATE_ACTIVE, 'active', values))
+
+    def _clear(self, rule, values, events):
+        if rule.state == STATE_ACTIVE:
+            events.append(self._transition(rule, STATE_CLEARED, 'cleared', values))
+        elif rule.state == STATE_ACKED:
+            events.append(self._transition(rule, STATE_NORMAL, 'cleared', values))
+
+    def _transition(self, rule, new_state, event, values=None):
+        rule.state = new_state
+        record = {
+            'alarm': rule.name,
+            'event': event,
+            'state': new_state,
+            'severity': rule.severity,
+            'message': rule.message,
+            'expression': rule.expression,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        if values is not None:
+            record['values'] = {tag: values.get(tag) for tag in sorted(rule.dependencies)}
+        return record
+
+    def get_active_alarms(self):
+        """返回当前非正常状态的报警"""
+        with self.lock:
+            return {
+                name: rule.state for name, rule in self.rules.items()
+                if rule.state != STATE_NORMAL
+            }
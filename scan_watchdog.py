@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+扫描周期看门狗
+记录每次扫描的耗时（与扫描周期比较）和启动抖动（实际启动时刻与计划时刻之差），
+最近窗口内超时比例达到阈值时判定为过载，按策略逐级降载：
+暂停非关键的数据去向、延长非关键标签组的周期、停止低优先级标签组；
+连续若干次扫描按时完成后逐级恢复。关键标签组不受降载影响
+"""
+
+import time
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# 降载动作（按 policy 中的顺序逐级启用）
+ACTIONS = ('pause_sinks', 'slow_groups', 'drop_groups')
+
+
+class ScanWatchdog:
+    """扫描周期看门狗和降载策略"""
+
+    def __init__(self, window=50, overrun_ratio=0.2, escalate_scans=10, recover_scans=30,
+                 policy=ACTIONS, sinks=(), slow_factor=3.0, critical_groups=(), low_priority_groups=()):
+        unknown = [action for action in policy if action not in ACTIONS]
+        if unknown:
+            raise ValueError(f"未知的降载动作: {', '.join(unknown)}（可选 {', '.join(ACTIONS)}）")
+        self.window = window
+        self.overrun_ratio = overrun_ratio
+        self.escalate_scans = escalate_scans
+        self.recover_scans = recover_scans
+        self.policy = list(policy)
+        self.sinks = frozenset(sinks)
+        self.slow_factor = max(1.0, slow_factor)
+        self.critical_groups = frozenset(critical_groups)
+        self.low_priority_groups = frozenset(low_priority_groups) - self.critical_groups
+
+        self.history = deque(maxlen=window)   # 最近各次扫描是否超时
+        self.level = 0                        # 当前降载级别（启用 policy 中的前 level 个动作）
+        self.overloaded = False
+        self.scans_at_level = 0
+        self.on_time_scans = 0                # 连续按时完成的扫描次数
+        self.scan_started = None
+        self.last_jitter = 0.0
+        self.stats = {
+            'scans': 0,
+            'overruns': 0,
+            'max_duration_ms': 0.0,
+            'max_jitter_ms': 0.0,
+            'escalations': 0,
+            'recoveries': 0,
+        }
+        self._duration_sum = 0.0
+        self._jitter_sum = 0.0
+
+    @classmethod
+    def from_config(cls, config):
+        """根据 SCAN_WATCHDOG_CONFIG 创建"""
+        return cls(window=config.get('window', 50), overrun_ratio=config.get('overrun_ratio', 0.2),
+                   escalate_scans=config.get('escalate_scans', 10),
+                   recover_scans=config.get('recover_scans', 30),
+                   policy=config.get('policy', ACTIONS), sinks=config.get('sinks', ()),
+                   slow_factor=config.get('slow_factor', 3.0),
+                   critical_groups=config.get('critical_groups', ()),
+                   low_priority_groups=config.get('low_priority_groups', ()))
+
+    def restrict_policy(self, allowed):
+        """只保留 allowed 中的降载动作（如没有按组调度时组级动作无效），返回被移除的动作"""
+        removed = [action for action in self.policy if action not in allowed]
+        if removed:
+            self.policy = [action for action in self.policy if action in allowed]
+            self.level = min(self.level, len(self.policy))
+        return removed
+
+    @property
+    def actions(self):
+        """当前启用的降载动作"""
+        return self.policy[:self.level]
+
+    def sink_paused(self, name):
+        """数据去向是否因降载暂停"""
+        return 'pause_sinks' in self.actions and name in self.sinks
+
+    def group_scale(self, name):
+        """标签组周期的放大倍数（关键组始终为 1）"""
+        if name in self.critical_groups or 'slow_groups' not in self.actions:
+            return 1.0
+        return self.slow_factor
+
+    def group_dropped(self, name):
+        """标签组是否因降载停止扫描"""
+        return 'drop_groups' in self.actions and name in self.low_priority_groups
+
+    def start_scan(self, scheduled=None, now=None):
+        """扫描开始；scheduled 为计划启动时刻（monotonic），用于计算启动抖动"""
+        now = time.monotonic() if now is None else now
+        self.scan_started = now
+        if scheduled:
+            jitter = max(0.0, now - scheduled)
+            self.last_jitter = jitter
+            self._jitter_sum += jitter
+            jitter_ms = round(jitter * 1000, 2)
+            if jitter_ms > self.stats['max_jitter_ms']:
+                self.stats['max_jitter_ms'] = jitter_ms
+
+    def end_scan(self, deadline, now=None):
+        """扫描结束，deadline 为本次扫描允许的耗时（秒）
+
+        过载状态或降载级别变化时返回状态（用于发布），否则返回 None
+        """
+        if self.scan_started is None:
+            return None
+        now = time.monotonic() if now is None else now
+        duration = now - self.scan_started
+        self.scan_started = None
+        overrun = duration > deadline
+
+        self.stats['scans'] += 1
+        self._duration_sum += duration
+        duration_ms = round(duration * 1000, 2)
+        if duration_ms > self.stats['max_duration_ms']:
+            self.stats['max_duration_ms'] = duration_ms
+        if overrun:
+            self.stats['overruns'] += 1
+            self.on_time_scans = 0
+        else:
+            self.on_time_scans += 1
+        self.history.append(overrun)
+        self.scans_at_level += 1
+
+        previous = (self.overloaded, self.level)
+        ratio = sum(self.history) / len(self.history)
+        # 窗口至少积累 escalate_scans 次扫描后才判定（启动时或刚调整级别后保持原状态）
+        if len(self.history) >= min(self.escalate_scans, self.window):
+            self.overloaded = ratio >= self.overrun_ratio
+        if self.overloaded and self.scans_at_level >= self.escalate_scans and self.level < len(self.policy):
+            observed = len(self.history)
+            self._set_level(self.level + 1)
+            self.stats['escalations'] += 1
+            logger.warning(f"扫描持续超时（最近 {observed} 次中 {ratio:.0%}），"
+                           f"降载级别升至 {self.level}: {', '.join(self.actions)}")
+        elif self.level > 0 and self.on_time_scans >= self.recover_scans:
+            self._set_level(self.level - 1)
+            self.stats['recoveries'] += 1
+            logger.info(f"扫描已连续 {self.recover_scans} 次按时完成，降载级别降至 {self.level}")
+
+        if (self.overloaded, self.level) != previous:
+            return self.get_status()
+        return None
+
+    def _set_level(self, level):
+        self.level = level
+        self.scans_at_level = 0
+        self.on_time_scans = 0
+        # 新级别的效果需要重新观察
+        self.history.clear()
+
+    def get_status(self):
+        scans = self.stats['scans']
+        status = dict(self.stats)
+        status.update({
+            'overloaded': self.overloaded,
+            'level': self.level,
+            'actions': self.actions,
+            'overrun_ratio': round(sum(self.history) / len(self.history), 3) if self.history else 0.0,
+            'avg_duration_ms': round(self._duration_sum / scans * 1000, 2) if scans else 0.0,
+            'avg_jitter_ms': round(self._jitter_sum / scans * 1000, 2) if scans else 0.0,
+            'timestamp': int(time.time() * 1000),
+        })
+        return status
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共享内存环形缓冲区
+单写单读（一个工作进程写、发布进程读）的变长消息队列，基于 multiprocessing.shared_memory
+"""
+
+import struct
+from multiprocessing import shared_memory
+
+# 头部: 写位置、读位置（均为单调递增的字节计数）
+HEADER = struct.Struct('<QQ')
+POSITION = struct.Struct('<Q')
+LENGTH = struct.Struct('<I')
+WRAP_MARKER = 0xFFFFFFFF
+
+
+class SharedRingBuffer:
+    """共享内存环形缓冲区"""
+
+    def __init__(self, name=None, size=1024 * 1024, create=False):
+        if create:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=HEADER.size + size)
+            HEADER.pack_into(self.shm.buf, 0, 0, 0)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.buf = self.shm.buf
+        self.capacity = self.shm.size - HEADER.size
+        self.dropped = 0
+        self._next_read = None
+
+    def _positions(self):
+        return HEADER.unpack_from(self.buf, 0)
+
+    def put(self, data):
+        """写入一条消息，缓冲区已满时丢弃并返回 False（写端不阻塞）"""
+        need = LENGTH.size + len(data)
+        if need > self.capacity // 2:
+            raise ValueError(f"消息过大: {len(data)} 字节")
+
+        write_pos, read_pos = self._positions()
+        free = self.capacity - (write_pos - read_pos)
+        offset = write_pos % self.capacity
+        tail = self.capacity - offset
+
+        if tail < need:
+            # 尾部空间不足，跳到缓冲区开头
+            if free < tail + need:
+                self.dropped += 1
+                return False
+            if tail >= LENGTH.size:
+                LENGTH.pack_into(self.buf, HEADER.size + offset, WRAP_MARKER)
+            write_pos += tail
+            offset = 0
+        elif free < need:
+            self.dropped += 1
+            return False
+
+        start = HEADER.size + offset
+        LENGTH.pack_into(self.buf, start, len(data))
+        self.buf[start + LENGTH.size:start + need] = data
+        # 数据写完后再更新写位置，读端不会看到写了一半的消息
+        POSITION.pack_into(self.buf, 0, write_pos + need)
+        return True
+
+    def get(self):
+        """读取一条消息，没有消息时返回 None"""
+        data = self.peek()
+        if data is not None:
+            self.advance()
+        return data
+
+    def peek(self):
+        """读取下一条消息但不移出（发布成功后再调用 advance），没有消息时返回 None"""
+        write_pos, read_pos = self._positions()
+        if read_pos == write_pos:
+            return None
+
+        offset = read_pos % self.capacity
+        tail = self.capacity - offset
+        if tail < LENGTH.size or LENGTH.unpack_from(self.buf, HEADER.size + offset)[0] == WRAP_MARKER:
+            read_pos += tail
+            offset = 0
+
+        start = HEADER.size + offset
+        length = LENGTH.unpack_from(self.buf, start)[0]
+        self._next_read = read_pos + LENGTH.size + length
+        return bytes(self.buf[start + LENGTH.size:start + LENGTH.size + length])
+
+    def advance(self):
+        """移出 peek 读到的消息"""
+        POSITION.pack_into(self.buf, POSITION.size, self._next_read)
+
+    def close(self):
+        """关闭当前进程中的映射"""
+        self.buf = None
+        self.shm.close()
+
+    def unlink(self):
+        """释放共享内存（由创建者调用）"""
+        self.shm.unlink()
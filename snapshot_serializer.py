@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+快照序列化
+针对固定结构的快照消息预编译 JSON 片段：键名片段预先生成，未变化的标签值和
+分组（如 32 个布尔量）复用上次的编码结果，输出与 json.dumps(data, ensure_ascii=False)
+逐字节一致；结构不符合预期时退回 json.dumps。快照键之后的附加顶层键（如采集时间戳）按 json.dumps 编码追加
+"""
+
+import json
+import time
+import logging
+from operator import getitem
+from json.encoder import encode_basestring
+
+from read_plan import TYPE_LAYOUTS, FLOAT_TYPES
+
+logger = logging.getLogger(__name__)
+
+# 快照消息的顶层键顺序
+SNAPSHOT_KEYS = ('timestamp', 'device_id', 'data')
+
+# 解码结果为精确值（bool/int/str 及其列表）的标签类型，只有全部由这些类型组成的分组才缓存编码结果；
+# 浮点数存在 0.0 == -0.0 但编码不同的情况
+EXACT_TAG_TYPES = frozenset(TYPE_LAYOUTS) - FLOAT_TYPES
+
+_INFINITY = float('inf')
+
+
+def _encode_float(value):
+    # 与 json 模块对 NaN/Infinity 的处理一致
+    if value != value:
+        return 'NaN'
+    if value == _INFINITY:
+        return 'Infinity'
+    if value == -_INFINITY:
+        return '-Infinity'
+    return float.__repr__(value)
+
+
+# 按精确类型选择编码函数（子类等其他类型交给 json.dumps）
+_ENCODERS = {
+    str: encode_basestring,
+    bool: lambda value: 'true' if value else 'false',
+    int: int.__repr__,
+    float: _encode_float,
+    type(None): lambda value: 'null',
+}
+
+# 值相等即编码相同的类型，可复用上次编码（浮点数和容器类型每次重新编码）
+_REUSABLE_TYPES = frozenset({str, bool, int, type(None)})
+
+
+def encode_value(value):
+    """按 json.dumps(ensure_ascii=False) 的规则编码单个值"""
+    encoder = _ENCODERS.get(type(value))
+    if encoder is None:
+        return json.dumps(value, ensure_ascii=False)
+    return encoder(value)
+
+
+class TimestampFormatter:
+    """按秒缓存的时间戳格式化，同一秒内的多次扫描复用同一字符串"""
+
+    def __init__(self, fmt='%Y-%m-%d %H:%M:%S'):
+        self.fmt = fmt
+        self._second = None
+        self._text = ''
+
+    def __call__(self, now=None):
+        second = int(time.time() if now is None else now)
+        if second != self._second:
+            self._text = time.strftime(self.fmt, time.localtime(second))
+            self._second = second
+        return self._text
+
+
+class _Slot:
+    """模板中的一个值位置，保存上次的值和编码结果"""
+
+    __slots__ = ('index', 'cached_group', 'bool_group', 'last', 'last_type', 'encoded')
+
+    def __init__(self, index, cached_group, bool_group):
+        self.index = index
+        self.cached_group = cached_group
+        self.bool_group = bool_group
+        self.last = self.last_type = self.encoded = None
+
+
+class _Template:
+    """一种 data 键顺序对应的预编译模板：静态片段固定，值位置每次扫描填充"""
+
+    __slots__ = ('parts', 'slots')
+
+    def __init__(self, keys, cached_groups, bool_groups):
+        # parts: ['{"timestamp": ', ts, ', "device_id": ', id, ', "data": {"k1": ', v1, ', "k2": ', v2, ..., '}}']
+        self.parts = ['{"timestamp": ', None, ', "device_id": ', None]
+        self.slots = []
+        prefix = ', "data": {'
+        for key in keys:
+            self.parts.append(prefix + encode_basestring(key) + ': ')
+            self.slots.append(_Slot(len(self.parts), key in cached_groups, key in bool_groups))
+            self.parts.append(None)
+            prefix = ', '
+        if not keys:
+            self.parts.append(prefix)
+        self.parts.append('}}')
+
+
+class SnapshotSerializer:
+    """按读取计划预编译的快照序列化器"""
+
+    def __init__(self, cached_groups=(), bool_groups=(), max_templates=16):
+        # 只缓存由读取计划解码得到的精确值分组：同一标签的值类型固定，
+        # 不会出现 True/1/1.0 相等但编码不同的情况
+        self.cached_groups = frozenset(cached_groups)
+        # 全部为布尔量的分组：每个标签预先生成 "name": false / "name": true 两个片段
+        self.bool_groups = frozenset(bool_groups) & self.cached_groups
+        self.max_templates = max_templates
+        self._templates = {}
+        self._bool_fragments = {}
+        self._timestamp = (None, '')
+        self._device_id = (None, '')
+        self.stats = {'fast': 0, 'fallback': 0}
+
+    @classmethod
+    def from_plan(cls, plan):
+        """根据读取计划创建序列化器（配置热切换后需重新创建）"""
+        groups = {tag.group for tag in plan.tags if tag.group is not None}
+        inexact = {tag.group for tag in plan.tags if tag.type not in EXACT_TAG_TYPES}
+        not_bool = {tag.group for tag in plan.tags if tag.type != 'BOOL' or tag.array}
+        return cls(groups - inexact, groups - not_bool)
+
+    def dumps(self, data):
+        """序列化快照消息，结果与 json.dumps(data, ensure_ascii=False) 一致"""
+        if type(data) is not dict or tuple(data)[:len(SNAPSHOT_KEYS)] != SNAPSHOT_KEYS:
+            return self._fallback(data)
+        if len(data) > len(SNAPSHOT_KEYS):
+            extra = [(key, value) for key, value in data.items() if key not in SNAPSHOT_KEYS]
+            if not all(type(key) is str for key, _ in extra):
+                return self._fallback(data)
+        else:
+            extra = None
+        timestamp = data['timestamp']
+        device_id = data['device_id']
+        section = data['data']
+        if type(timestamp) is not str or type(device_id) is not str or type(section) is not dict:
+            return self._fallback(data)
+
+        keys = tuple(section)
+        template = self._templates.get(keys)
+        if template is None:
+            if not all(type(key) is str for key in keys):
+                return self._fallback(data)
+            if len(self._templates) >= self.max_templates:
+                self._templates.clear()
+            template = self._templates[keys] = _Template(keys, self.cached_groups, self.bool_groups)
+
+        parts = template.parts
+        # 时间戳同一秒内不变，设备ID基本不变，均复用上次编码
+        if timestamp != self._timestamp[0]:
+            self._timestamp = (timestamp, encode_basestring(timestamp))
+        parts[1] = self._timestamp[1]
+        if device_id != self._device_id[0]:
+            self._device_id = (device_id, encode_basestring(device_id))
+        parts[3] = self._device_id[1]
+
+        for slot, value in zip(template.slots, section.values()):
+            value_type = type(value)
+            if slot.cached_group and value_type is dict:
+                # 分组（如布尔量）与上次内容相同时复用编码；分组由读取计划按固定标签顺序
+                # 解码生成，内容相同即键顺序相同。保存副本，避免调用方原地修改后误判
+                if value != slot.last:
+                    slot.last = dict(value)
+                    if slot.bool_group:
+                        slot.encoded = self._encode_bool_group(value)
+                    else:
+                        slot.encoded = json.dumps(value, ensure_ascii=False)
+            elif value_type is not slot.last_type or value_type not in _REUSABLE_TYPES or value != slot.last:
+                slot.last = value
+                slot.last_type = value_type
+                encoder = _ENCODERS.get(value_type)
+                slot.encoded = encoder(value) if encoder else json.dumps(value, ensure_ascii=False)
+            parts[slot.index] = slot.encoded
+
+        self.stats['fast'] += 1
+        if extra:
+            # 最后一个片段以外层对象的 "}" 结尾，附加键插在其前
+            return ''.join(parts)[:-1] + ''.join(
+                ', ' + encode_basestring(key) + ': ' + json.dumps(value, ensure_ascii=False)
+                for key, value in extra) + '}'
+        return ''.join(parts)
+
+    def _encode_bool_group(self, group):
+        keys = tuple(group)
+        fragments = self._bool_fragments.get(keys)
+        if fragments is None:
+            if len(self._bool_fragments) >= self.max_templates:
+                self._bool_fragments.clear()
+            fragments = self._bool_fragments[keys] = [
+                (encode_basestring(key) + ': false', encode_basestring(key) + ': true') for key in keys
+            ]
+        # 布尔值直接作为下标选择片段（True -> 1, False -> 0）
+        return '{' + ', '.join(map(getitem, fragments, group.values())) + '}'
+
+    def _fallback(self, data):
+        self.stats['fallback'] += 1
+        return json.dumps(data, ensure_ascii=False)
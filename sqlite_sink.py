@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQLite 本地存储
+采集数据按标签变化（samples 表，(tag, ts) 索引）或整次快照（snapshots 表）写入本地 SQLite，
+数据库使用 WAL 模式，读取和写入互不阻塞，可直接用 sqlite3 命令行做即席查询。
+写入由后台线程按条数或时间批量提交事务，超过保留期的数据在后台分批删除
+"""
+
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import deque
+
+from tag_utils import flatten_data
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS samples (ts REAL NOT NULL, tag TEXT NOT NULL, value)",
+    "CREATE INDEX IF NOT EXISTS idx_samples_tag_ts ON samples (tag, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_samples_ts ON samples (ts)",
+    "CREATE TABLE IF NOT EXISTS snapshots (ts REAL NOT NULL, device_id TEXT, payload TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_snapshots_ts ON snapshots (ts)",
+)
+
+INSERT_SAMPLE = "INSERT INTO samples (ts, tag, value) VALUES (?, ?, ?)"
+INSERT_SNAPSHOT = "INSERT INTO snapshots (ts, device_id, payload) VALUES (?, ?, ?)"
+
+# 写入方式
+MODES = ('changes', 'snapshot', 'both')
+
+# 每次清理删除的最多行数（分批删除，避免长时间占用写锁）
+PRUNE_CHUNK = 10000
+
+
+def encode_sample(value):
+    """SQLite 不支持的类型（数组、结构）以JSON文本保存"""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+class SQLiteSink:
+    """SQLite 批量写入（后台线程持有写连接）"""
+
+    def __init__(self, path, mode='changes', batch_size=1000, batch_interval=1.0,
+                 retention_days=30, prune_interval=3600, queue_size=100000):
+        if mode not in MODES:
+            raise ValueError(f"SQLite 写入方式不支持: {mode}（可选 {', '.join(MODES)}）")
+        self.path = path
+        self.mode = mode
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.retention_days = retention_days
+        self.prune_interval = prune_interval
+
+        self.samples = deque()
+        self.snapshots = deque()
+        self.queue_size = queue_size
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.stats = {
+            'samples': 0,      # 已写入的标签行
+            'snapshots': 0,    # 已写入的快照
+            'batches': 0,      # 已提交的事务
+            'dropped': 0,      # 队列已满丢弃的行
+            'pruned': 0,       # 清理删除的行
+            'errors': 0,
+            'max_commit_ms': 0.0,
+        }
+
+    @classmethod
+    def from_config(cls, config):
+        """根据 SQLITE_SINK_CONFIG 创建"""
+        return cls(config.get('path', 'plc_data.db'), mode=config.get('mode', 'changes'),
+                   batch_size=config.get('batch_size', 1000), batch_interval=config.get('batch_interval', 1.0),
+                   retention_days=config.get('retention_days', 30),
+                   prune_interval=config.get('prune_interval', 3600),
+                   queue_size=config.get('queue_size', 100000))
+
+    def connect(self):
+        """打开数据库连接（WAL 模式）并创建表和索引"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL 模式下 NORMAL 只在检查点时同步，断电最多丢失最近的事务，不会损坏数据库
+        conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            conn.execute(statement)
+        conn.commit()
+        return conn
+
+    def start(self):
+        # 在调用线程中先建表，路径或权限错误立即报告
+        self.connect().close()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='sqlite-sink', daemon=True)
+        self.thread.start()
+        logger.info(f"SQLite 存储已启动: {self.path}（{self.mode}，每批 {self.batch_size} 行或 {self.batch_interval} 秒）")
+
+    def stop(self, timeout=10.0):
+        """写入队列中剩余的数据后停止"""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def record(self, data, values=None, changed=None, now=None):
+        """记录一次采集：changes 方式写入 changed 中的标签（None 表示全部标签），
+        snapshot 方式写入整次快照"""
+        now = time.time() if now is None else now
+        with self.condition:
+            if self.mode != 'snapshot':
+                if values is None:
+                    values = flatten_data(data)
+                names = values if changed is None else changed
+                rows = [(now, name, encode_sample(values[name])) for name in names if name in values]
+                overflow = len(self.samples) + len(rows) - self.queue_size
+                if overflow > 0:
+                    # 写入跟不上时丢弃最旧的行
+                    for _ in range(min(overflow, len(self.samples))):
+                        self.samples.popleft()
+                    self.stats['dropped'] += overflow
+                self.samples.extend(rows)
+            if self.mode != 'changes':
+                self.snapshots.append((now, data.get('device_id'), json.dumps(data.get('data', {}), ensure_ascii=False)))
+            if len(self.samples) + len(self.snapshots) >= self.batch_size:
+                self.condition.notify()
+
+    def _run(self):
+        conn = self.connect()
+        last_prune = 0.0
+        try:
+            while True:
+                with self.condition:
+                    self.condition.wait_for(
+                        lambda: not self.running or len(self.samples) + len(self.snapshots) >= self.batch_size,
+                        self.batch_interval)
+                    samples, self.samples = self.samples, deque()
+                    snapshots, self.snapshots = self.snapshots, deque()
+                    running = self.running
+                if samples or snapshots:
+                    self._commit(conn, samples, snapshots)
+                if not running:
+                    return
+                if self.retention_days and time.monotonic() - last_prune >= self.prune_interval:
+                    last_prune = time.monotonic()
+                    self.prune(conn)
+        finally:
+            conn.close()
+
+    def _commit(self, conn, samples, snapshots):
+        started = time.monotonic()
+        try:
+            # 一个事务写入整批数据，语句由 sqlite3 模块预编译缓存
+            with conn:
+                if samples:
+                    conn.executemany(INSERT_SAMPLE, samples)
+                if snapshots:
+                    conn.executemany(INSERT_SNAPSHOT, snapshots)
+        except sqlite3.Error as e:
+            self.stats['errors'] += 1
+            logger.error(f"SQLite 写入失败（{len(samples)} 行，{len(snapshots)} 个快照）: {e}")
+            return
+        self.stats['samples'] += len(samples)
+        self.stats['snapshots'] += len(snapshots)
+        self.stats['batches'] += 1
+        elapsed = (time.monotonic() - started) * 1000
+        if elapsed > self.stats['max_commit_ms']:
+            self.stats['max_commit_ms'] = round(elapsed, 2)
+
+    def prune(self, conn):
+        """分批删除超过保留期的数据"""
+        cutoff = time.time() - self.retention_days * 86400
+        total = 0
+        try:
+            for table in ('samples', 'snapshots'):
+                while True:
+                    with conn:
+                        deleted = conn.execute(
+                            f"DELETE FROM {table} WHERE rowid IN "
+                            f"(SELECT rowid FROM {table} WHERE ts < ? LIMIT {PRUNE_CHUNK})", (cutoff,)).rowcount
+                    total += deleted
+                    if deleted < PRUNE_CHUNK:
+                        break
+        except sqlite3.Error as e:
+            self.stats['errors'] += 1
+            logger.error(f"SQLite 清理过期数据失败: {e}")
+        if total:
+            self.stats['pruned'] += total
+            logger.info(f"SQLite 已清理 {total} 行超过 {self.retention_days} 天的数据")
+        return total
+
+    def query(self, tag, start, end, limit=None):
+        """查询标签在 [start, end] 内的记录 [(时间, 值)]（使用独立的只读连接）"""
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=30)
+        try:
+            sql = "SELECT ts, value FROM samples WHERE tag = ? AND ts BETWEEN ? AND ? ORDER BY ts"
+            params = [tag, start, end]
+            if limit:
+                sql += " LIMIT ?"
+                params.append(int(limit))
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def get_stats(self):
+        with self.condition:
+            stats = dict(self.stats)
+            stats['queued'] = len(self.samples) + len(self.snapshots)
+        return stats
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+有状态会话（出生/死亡证书和序号）
+每次连接MQTT后先发布出生消息（全部标签的元数据和当前值，seq 为 0），之后每条增量消息
+的 seq 依次加 1；连接时通过遗嘱消息注册死亡证书。订阅方发现 seq 不连续、
+收到死亡证书或 bdSeq 变化时，即知道丢失了消息，可发送 rebirth 命令请求新的完整快照
+"""
+
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class StateSession:
+    """出生/死亡证书和增量序号管理"""
+
+    def __init__(self, publish, topic, qos=1, delta_only=False):
+        # publish(topic, payload, qos, retain) 由发布器提供，返回是否已发出；
+        # 未发出的消息不能稍后补发，否则会以已被复用的序号到达订阅方
+        self.publish = publish
+        self.topic = topic.rstrip('/')
+        self.qos = qos
+        self.delta_only = delta_only
+        self.birth_topic = f"{self.topic}/birth"
+        self.death_topic = f"{self.topic}/death"
+        self.delta_topic = f"{self.topic}/delta"
+
+        self.lock = threading.Lock()
+        self.bd_seq = 0           # 会话序号：每次（重新）连接加 1，出生和死亡证书中携带
+        self.seq = 0              # 会话内消息序号：出生消息为 0，增量消息依次加 1
+        self.birth_pending = True
+        self.last_publish_ok = False
+        self.stats = {'births': 0, 'deltas': 0, 'errors': 0}
+
+    @classmethod
+    def from_config(cls, publish, config):
+        """根据 STATE_SESSION_CONFIG 创建"""
+        return cls(publish, config['topic'], qos=config.get('qos', 1),
+                   delta_only=config.get('delta_only', False))
+
+    def death_payload(self):
+        return json.dumps({'type': 'death', 'bdSeq': self.bd_seq,
+                           'timestamp': int(time.time() * 1000)}, ensure_ascii=False)
+
+    def register_will(self, client):
+        """注册遗嘱消息（死亡证书），需在连接之前调用"""
+        client.will_set(self.death_topic, self.death_payload(), qos=self.qos, retain=False)
+
+    def next_session(self, client):
+        """连接断开：会话序号加 1，为下次连接注册新的遗嘱，并在重连后重新发布出生消息"""
+        with self.lock:
+            self.bd_seq += 1
+            self.birth_pending = True
+        try:
+            self.register_will(client)
+        except Exception as e:
+            logger.warning(f"更新遗嘱消息时发生错误: {e}")
+
+    def request_birth(self):
+        """请求在下次扫描时重新发布出生消息（rebirth）"""
+        with self.lock:
+            self.birth_pending = True
+
+    def publish_birth(self, data, values, metadata):
+        """发布出生消息：标签元数据和全部当前值，seq 归零"""
+        with self.lock:
+            self.seq = 0
+            message = {
+                'type': 'birth',
+                'bdSeq': self.bd_seq,
+                'seq': 0,
+                'timestamp': data.get('timestamp'),
+                'device_id': data.get('device_id'),
+                'metadata': metadata,
+                'values': values,
+            }
+            ok = self.publish(self.birth_topic, json.dumps(message, ensure_ascii=False), self.qos, False)
+            if ok:
+                self.birth_pending = False
+                self.stats['births'] += 1
+                logger.info(f"已发布出生消息: bdSeq={self.bd_seq}，标签 {len(values)} 个")
+            else:
+                self.stats['errors'] += 1
+            self.last_publish_ok = ok
+            return ok
+
+    def publish_changes(self, data, values, changed, metadata_provider):
+        """每次扫描调用：需要时先发布出生消息，否则发布变化标签的增量消息"""
+        if self.birth_pending or changed is None:
+            return self.publish_birth(data, values, metadata_provider())
+        if not changed:
+            return False
+
+        with self.lock:
+            seq = self.seq + 1
+            message = {
+                'type': 'delta',
+                'bdSeq': self.bd_seq,
+                'seq': seq,
+                'timestamp': data.get('timestamp'),
+                'values': {name: values[name] for name in changed if name in values},
+            }
+            ok = self.publish(self.delta_topic, json.dumps(message, ensure_ascii=False), self.qos, False)
+            # 发送失败的消息也占用序号，订阅方据序号缺口得知丢失了消息
+            self.seq = seq
+            if ok:
+                self.stats['deltas'] += 1
+            else:
+                # 本次变化已丢失，下次扫描发布完整的出生消息
+                self.birth_pending = True
+                self.stats['errors'] += 1
+            self.last_publish_ok = ok
+            return ok
+
+    def publish_death(self):
+        """正常退出前主动发布死亡证书（异常断开时由遗嘱消息发布）"""
+        return self.publish(self.death_topic, self.death_payload(), self.qos, False)
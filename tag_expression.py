@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+标签表达式编译器
+将 "int1 > 900"、"B7 AND NOT B8" 这类表达式解析一次，编译为闭包，
+求值时只做函数调用，不再解析字符串，也不使用 eval
+"""
+
+import re
+import operator
+
+TOKEN_PATTERN = re.compile(r"""
+    \s*(?:
+        (?P<number>\d+\.\d*|\.\d+|\d+)
+      | (?P<string>'[^']*'|"[^"]*")
+      | (?P<op>>=|<=|==|!=|&&|\|\||[-+*/%<>!(),])
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*|\[\d+\])*)
+    )""", re.VERBOSE)
+
+KEYWORDS = {'AND': '&&', 'OR': '||', 'NOT': '!'}
+CONSTANTS = {'TRUE': True, 'FALSE': False}
+
+COMPARE_OPS = {
+    '>': operator.gt, '>=': operator.ge, '<': operator.lt,
+    '<=': operator.le, '==': operator.eq, '!=': operator.ne,
+}
+SUM_OPS = {'+': operator.add, '-': operator.sub}
+TERM_OPS = {'*': operator.mul, '/': operator.truediv, '%': operator.mod}
+
+DEFAULT_FUNCTIONS = {
+    'abs': abs,
+    'min': min,
+    'max': max,
+    'round': round,
+}
+
+
+class ExpressionError(ValueError):
+    """表达式语法错误"""
+
+
+def tokenize(text):
+    """将表达式拆分为 (类型, 值) 序列"""
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = TOKEN_PATTERN.match(text, pos)
+        if not match:
+            raise ExpressionError(f"无法识别的字符: {text[pos:]!r}")
+        pos = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'name':
+            upper = value.upper()
+            if upper in KEYWORDS:
+                kind, value = 'op', KEYWORDS[upper]
+            elif upper in CONSTANTS:
+                kind, value = 'const', CONSTANTS[upper]
+        elif kind == 'number':
+            value = float(value) if '.' in value else int(value)
+            kind = 'const'
+        elif kind == 'string':
+            value = value[1:-1]
+            kind = 'const'
+        tokens.append((kind, value))
+    return tokens
+
+
+class _Parser:
+    """递归下降解析器，直接生成闭包"""
+
+    def __init__(self, text, functions, factories=None):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.pos = 0
+        self.functions = functions
+        self.factories = factories or {}
+        self.dependencies = set()
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return (None, None)
+
+    def accept(self, *ops):
+        kind, value = self.peek()
+        if kind == 'op' and value in ops:
+            self.pos += 1
+            return value
+        return None
+
+    def expect(self, op):
+        if not self.accept(op):
+            raise ExpressionError(f"表达式 {self.text!r} 缺少 {op!r}")
+
+    def parse(self):
+        node = self.parse_or()
+        if self.pos != len(self.tokens):
+            raise ExpressionError(f"表达式 {self.text!r} 存在多余内容: {self.peek()[1]!r}")
+        return node
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self.accept('||'):
+            left, right = node, self.parse_and()
+            node = lambda v, l=left, r=right: bool(l(v)) or bool(r(v))
+        return node
+
+    def parse_and(self):
+        node = self.parse_not()
+        while self.accept('&&'):
+            left, right = node, self.parse_not()
+            node = lambda v, l=left, r=right: bool(l(v)) and bool(r(v))
+        return node
+
+    def parse_not(self):
+        if self.accept('!'):
+            inner = self.parse_not()
+            return lambda v, i=inner: not i(v)
+        return self.parse_compare()
+
+    def parse_compare(self):
+        node = self.parse_sum()
+        op = self.accept(*COMPARE_OPS)
+        if op:
+            left, right, func = node, self.parse_sum(), COMPARE_OPS[op]
+            node = lambda v, l=left, r=right, f=func: f(l(v), r(v))
+        return node
+
+    def parse_sum(self):
+        node = self.parse_term()
+        while True:
+            op = self.accept(*SUM_OPS)
+            if not op:
+                return node
+            left, right, func = node, self.parse_term(), SUM_OPS[op]
+            node = lambda v, l=left, r=right, f=func: f(l(v), r(v))
+
+    def parse_term(self):
+        node = self.parse_unary()
+        while True:
+            op = self.accept(*TERM_OPS)
+            if not op:
+                return node
+            left, right, func = node, self.parse_unary(), TERM_OPS[op]
+            node = lambda v, l=left, r=right, f=func: f(l(v), r(v))
+
+    def parse_unary(self):
+        if self.accept('-'):
+            inner = self.parse_unary()
+            return lambda v, i=inner: -i(v)
+        return self.parse_atom()
+
+    def parse_atom(self):
+        if self.accept('('):
+            node = self.parse_or()
+            self.expect(')')
+            return node
+
+        kind, value = self.peek()
+        if kind == 'const':
+            self.pos += 1
+            return lambda v, c=value: c
+        if kind == 'name':
+            self.pos += 1
+            if self.accept('('):
+                return self.parse_call(value)
+            self.dependencies.add(value)
+            return lambda v, n=value: v[n]
+        raise ExpressionError(f"表达式 {self.text!r} 语法错误，位置 {self.pos}")
+
+    def parse_call(self, name):
+        if name not in self.functions and name not in self.factories:
+            raise ExpressionError(f"表达式 {self.text!r} 使用了未知函数: {name}")
+        args = []
+        if not self.accept(')'):
+            args.append(self.parse_or())
+            while self.accept(','):
+                args.append(self.parse_or())
+            self.expect(')')
+        if name in self.factories:
+            # 有状态函数：每个调用位置创建独立的实例
+            func = self.factories[name]()
+        else:
+            func = self.functions[name]
+        args = tuple(args)
+        return lambda v, f=func, a=args: f(*[arg(v) for arg in a])
+
+
+def compile_expression(text, functions=None, factories=None):
+    """编译表达式，返回 (求值函数, 依赖的标签名集合)
+
+    求值函数的参数为扁平的 标签名 -> 值 映射；factories 为有状态函数的工厂
+    （名称 -> 无参构造函数），表达式中每个调用位置各自持有一个实例
+    """
+    table = dict(DEFAULT_FUNCTIONS)
+    if functions:
+        table.update(functions)
+    parser = _Parser(text, table, factories)
+    return parser.parse(), frozenset(parser.dependencies)
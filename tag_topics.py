@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按标签发布（统一命名空间）
+每个标签发布到独立的保留消息主题，如 <prefix>/DB9000/int1、<prefix>/DB9000/booleans/B1，
+只发布变化的标签；主题按标签预先生成，别名表（短ID -> 标签路径）以保留消息发布，
+只关心少数标签的订阅方无需下载和解析整个快照
+"""
+
+import json
+import logging
+
+from snapshot_serializer import encode_value
+
+logger = logging.getLogger(__name__)
+
+# 别名表主题（相对设备主题）
+ALIAS_TABLE_SUFFIX = '$aliases'
+
+_ALIAS_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def make_alias(index):
+    """序号转为短别名（36进制）"""
+    alias = ''
+    while True:
+        index, digit = divmod(index, 36)
+        alias = _ALIAS_DIGITS[digit] + alias
+        if index == 0:
+            return alias
+
+
+class TagTopicPublisher:
+    """按标签发布到主题树"""
+
+    def __init__(self, publish, prefix, device, use_aliases=False, qos=0, retain=True, include_computed=True):
+        # publish(topic, payload, qos, retain) 由发布器提供
+        self.publish = publish
+        self.base = '/'.join(part.strip('/') for part in (prefix, device) if part and part.strip('/'))
+        self.use_aliases = use_aliases
+        self.qos = qos
+        self.retain = retain
+        self.include_computed = include_computed
+
+        self.paths = {}       # 标签名 -> 相对路径（如 booleans/B1）
+        self.topics = {}      # 标签名 -> 完整主题（只生成一次）
+        self.aliases = {}     # 标签名 -> 短别名（配置热切换后保持不变，删除的标签也不复用其别名）
+        self.next_alias = 0
+        self.stale_topics = {}  # 标签名 -> 热切换前的主题，确认新标签表后清除已删除标签的保留消息
+        self.alias_table_dirty = False
+        self.full_pending = True
+        self.stats = {'published': 0, 'errors': 0}
+
+    @classmethod
+    def from_config(cls, publish, config, device):
+        """根据 TAG_TOPICS_CONFIG 创建（device 为配置留空时使用的设备段）"""
+        return cls(publish, config.get('prefix', ''), config.get('device') or device,
+                   use_aliases=config.get('use_aliases', False), qos=config.get('qos', 0),
+                   retain=config.get('retain', True), include_computed=config.get('include_computed', True))
+
+    @property
+    def alias_topic(self):
+        return f"{self.base}/{ALIAS_TABLE_SUFFIX}"
+
+    def reset(self):
+        """标签定义变化后（如配置热切换）清空缓存，下次发布全部标签和新的别名表
+
+        别名保持不变；下次发布时新标签表中已不存在（或主题已变化）的旧主题发布空的保留消息，
+        由MQTT服务器删除其保留值
+        """
+        self.stale_topics.update(self.topics)
+        self.paths.clear()
+        self.topics.clear()
+        self.alias_table_dirty = True
+        self.full_pending = True
+
+    def request_full_publish(self):
+        """下次扫描发布全部标签（如MQTT重连后刷新保留消息）"""
+        self.full_pending = True
+
+    def _register(self, section):
+        """从快照结构中登记新出现的标签路径、主题和别名"""
+        for key, value in section.items():
+            if isinstance(value, dict):
+                if key == 'computed' and not self.include_computed:
+                    continue
+                for name in value:
+                    self._add_tag(name, f"{key}/{name}")
+            else:
+                self._add_tag(key, key)
+
+    def _add_tag(self, name, path):
+        if name in self.paths:
+            return
+        alias = self.aliases.get(name)
+        if alias is None:
+            alias = make_alias(self.next_alias)
+            self.next_alias += 1
+        self.paths[name] = path
+        self.aliases[name] = alias
+        self.topics[name] = f"{self.base}/{alias if self.use_aliases else path}"
+        self.alias_table_dirty = True
+
+    def publish_changes(self, data, values, changed):
+        """发布变化的标签（changed 为 None 表示首次扫描，发布全部标签），返回发布数量"""
+        full = changed is None or self.full_pending
+        if not full and not changed:
+            return 0
+        if full or any(name not in self.paths for name in changed):
+            self._register(data.get('data', {}))
+        if full and self.stale_topics:
+            self._clear_stale()
+        if self.alias_table_dirty:
+            self.publish_alias_table()
+
+        names = self.paths if full else changed
+        self.full_pending = False
+        published = 0
+        for name in names:
+            topic = self.topics.get(name)
+            if topic is None or name not in values:
+                continue
+            if self.publish(topic, encode_value(values[name]), self.qos, self.retain):
+                published += 1
+            else:
+                self.stats['errors'] += 1
+        self.stats['published'] += published
+        return published
+
+    def _clear_stale(self):
+        """向已删除标签的旧主题发布空的保留消息；发布失败的在下次全部发布时重试"""
+        current = set(self.topics.values())
+        cleared = 0
+        for name, topic in list(self.stale_topics.items()):
+            if topic not in current and self.retain:
+                if not self.publish(topic, b'', self.qos, True):
+                    self.stats['errors'] += 1
+                    continue
+                cleared += 1
+            del self.stale_topics[name]
+        if cleared:
+            logger.info(f"已清除 {cleared} 个已删除标签的保留消息")
+
+    def publish_alias_table(self):
+        """以保留消息发布别名表: {"base": ..., "tags": {别名: 路径}}"""
+        table = {
+            'base': self.base,
+            'use_aliases': self.use_aliases,
+            'tags': {self.aliases[name]: path for name, path in self.paths.items()},
+        }
+        if self.publish(self.alias_topic, json.dumps(table, ensure_ascii=False), 1, True):
+            self.alias_table_dirty = False
+            logger.info(f"已发布标签别名表: {self.alias_topic}（{len(self.paths)} 个标签）")
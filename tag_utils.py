@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+标签数据工具
+在嵌套的发布数据格式和扁平的 标签名 -> 值 映射之间转换，并计算变化集合
+"""
+
+
+def flatten_data(data):
+    """将发布数据展开为扁平映射，如 {'B1': True, 'string': '', 'dint1': 0, ...}"""
+    values = {}
+    for key, value in data.get('data', {}).items():
+        if isinstance(value, dict):
+            values.update(value)
+        else:
+            values[key] = value
+    return values
+
+
+def diff_values(previous, current):
+    """返回取值不同（或新出现）的标签名集合"""
+    return {
+        tag for tag, value in current.items()
+        if tag not in previous or previous[tag] != value
+    }
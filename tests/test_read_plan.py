@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""读取计划：直接调用 snap7 底层库读取到预分配缓冲区"""
+
+import os
+import sys
+import ctypes
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from read_plan import ReadBuffer, native_client
+
+
+class FakeLibrary:
+    """模拟 snap7 动态库，Cli_DBRead 把 DB 内容写入调用方的缓冲区"""
+
+    def __init__(self, content):
+        self.content = content
+        self.calls = []
+
+    def Cli_DBRead(self, pointer, db_number, start, size, data):
+        self.calls.append((pointer, db_number, start, size))
+        target = data._obj
+        for i in range(size):
+            target[i] = self.content[start + i]
+        return 0
+
+
+class FakeClient:
+    """只提供底层库时可读取；db_read 被调用说明没有走直接读取"""
+
+    def __init__(self, library_attr, pointer_attr, content):
+        self.library = FakeLibrary(content)
+        setattr(self, library_attr, self.library)
+        setattr(self, pointer_attr, ctypes.c_void_p(1))
+        self.db_read_calls = 0
+
+    def db_read(self, db_number, start, size):
+        self.db_read_calls += 1
+        return bytearray(self.library.content[start:start + size])
+
+
+class DirectReadTest(unittest.TestCase):
+
+    content = bytes(range(64))
+
+    def check_direct_read(self, library_attr, pointer_attr):
+        client = FakeClient(library_attr, pointer_attr, self.content)
+        buffer = ReadBuffer(8)
+        buffer.read(client, 9000, 10)
+        self.assertEqual(bytes(buffer.data), self.content[10:18])
+        self.assertEqual(client.db_read_calls, 0)
+        self.assertEqual(client.library.calls, [(getattr(client, pointer_attr), 9000, 10, 8)])
+
+    def test_snap7_2x_uses_direct_read(self):
+        self.check_direct_read('_lib', '_s7_client')
+
+    def test_snap7_1x_uses_direct_read(self):
+        self.check_direct_read('_library', '_pointer')
+
+    def test_falls_back_to_db_read(self):
+        client = FakeClient('other', 'handle', self.content)
+        self.assertEqual(native_client(client), (None, None))
+        buffer = ReadBuffer(4)
+        buffer.read(client, 9000, 2)
+        self.assertEqual(bytes(buffer.data), self.content[2:6])
+        self.assertEqual(client.db_read_calls, 1)
+
+    def test_error_code_raises(self):
+        client = FakeClient('_lib', '_s7_client', self.content)
+        client.library.Cli_DBRead = lambda *args: 0x00A00000
+        with self.assertRaises(IOError):
+            ReadBuffer(4).read(client, 9000, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()